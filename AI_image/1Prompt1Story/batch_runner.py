@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量故事任务
+从 JSONL 读取故事任务，在所有任务间对相同的帧请求去重，
+用同一个已加载的管线批量生成唯一帧，再分发到各故事的输出目录
+"""
+
+import argparse
+import functools
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from frame_sinks import AsyncFrameWriter
+from story_generator import StoryGenerator
+from story_manifest import MANIFEST_NAME, FrameManifest
+
+
+@dataclass
+class StorySpec:
+    """单个故事任务"""
+    name: str
+    id_prompt: str
+    frame_list: List[str]
+    window_len: int = 3
+    seed: int = 42
+    save_dir: Optional[str] = None
+
+
+@dataclass
+class FrameJob:
+    """去重后的唯一帧及其全部输出位置"""
+    prompt: str
+    negative_prompt: str
+    seed: int
+    # (故事序号, 帧序号, 清单记录)
+    targets: List[Tuple[int, int, dict]] = field(default_factory=list)
+
+
+def load_specs(path: str, output_root: str = "./output/batch") -> List[StorySpec]:
+    """
+    读取故事任务 JSONL
+
+    每行一个任务，包含 id_prompt、frame_list，可选 name、window_len、seed、save_dir；
+    未指定 save_dir 时输出到 output_root/<name>。
+
+    Args:
+        path: 任务文件路径
+        output_root: 默认输出根目录
+
+    Returns:
+        故事任务列表
+    """
+    specs = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            if 'id_prompt' not in data or 'frame_list' not in data:
+                raise ValueError(f"第 {line_no} 行缺少 id_prompt 或 frame_list")
+            name = data.get('name', f"story_{len(specs):04d}")
+            specs.append(StorySpec(
+                name=name,
+                id_prompt=data['id_prompt'],
+                frame_list=data['frame_list'],
+                window_len=data.get('window_len', 3),
+                seed=data.get('seed', 42),
+                save_dir=data.get('save_dir') or os.path.join(output_root, name)
+            ))
+    return specs
+
+
+class BatchStoryRunner:
+    """批量故事执行器"""
+
+    def __init__(self, generator: StoryGenerator, batch_size: int = 4,
+                 image_format: str = "png", resume: bool = True):
+        """
+        初始化执行器
+
+        Args:
+            generator: 已加载模型的故事生成器
+            batch_size: 每次管线调用生成的帧数
+            image_format: 单帧保存格式
+            resume: 是否跳过各故事帧清单中已完成的帧
+        """
+        self.generator = generator
+        self.batch_size = max(1, batch_size)
+        self.image_format = image_format
+        self.resume = resume
+
+    def plan(self, specs: List[StorySpec], writer: AsyncFrameWriter,
+             manifests: List[FrameManifest]) -> Tuple[List[FrameJob], dict]:
+        """
+        规划所有故事的帧并去重
+
+        最终提示词、负向提示词和种子都相同的帧只生成一次；
+        已在清单中完成且校验通过的输出位置不再计入。
+
+        Returns:
+            (唯一帧列表, 统计信息)
+        """
+        jobs: "OrderedDict[tuple, FrameJob]" = OrderedDict()
+        requested = 0
+        completed = 0
+
+        for story, spec in enumerate(specs):
+            windows = self.generator.plan_windows(spec.id_prompt, spec.frame_list, spec.window_len)
+            for idx, window in enumerate(windows):
+                requested += 1
+                seed = spec.seed + idx
+                full_prompt = f"{spec.id_prompt} {' '.join(window)}"
+                path = writer.frame_path(spec.save_dir, idx)
+                key = self.generator.frame_key(full_prompt, seed, path)
+
+                if self.resume and manifests[story].is_complete(idx, key):
+                    completed += 1
+                    continue
+
+                prompt, negative_prompt = self.generator.window_prompts(spec.id_prompt, window)
+                job = jobs.setdefault((prompt, negative_prompt, seed),
+                                      FrameJob(prompt, negative_prompt, seed))
+                job.targets.append((story, idx, {
+                    'frame': idx,
+                    'key': key,
+                    'window': list(window),
+                    'full_prompt': full_prompt,
+                    'seed': seed,
+                    'path': path
+                }))
+
+        stats = {
+            'stories': len(specs),
+            'requested_frames': requested,
+            'completed_frames': completed,
+            'unique_frames': len(jobs)
+        }
+        return list(jobs.values()), stats
+
+    def run(self, specs: List[StorySpec]) -> dict:
+        """
+        执行全部故事任务
+
+        Args:
+            specs: 故事任务列表
+
+        Returns:
+            统计信息（请求帧数、唯一帧数、批次数、耗时等）
+        """
+        start = time.perf_counter()
+        manifests = []
+        for spec in specs:
+            os.makedirs(spec.save_dir, exist_ok=True)
+            manifests.append(FrameManifest(os.path.join(spec.save_dir, MANIFEST_NAME)))
+
+        writer = AsyncFrameWriter(image_format=self.image_format)
+        try:
+            with writer:
+                jobs, stats = self.plan(specs, writer, manifests)
+                print(f"{stats['stories']} 个故事共 {stats['requested_frames']} 帧, "
+                      f"已完成 {stats['completed_frames']} 帧, "
+                      f"去重后需生成 {stats['unique_frames']} 帧")
+
+                if self.generator.memory_profile.free_text_encoder:
+                    self.generator.prepare_prompts(text for job in jobs
+                                                   for text in (job.prompt, job.negative_prompt))
+
+                batches = [jobs[i:i + self.batch_size] for i in range(0, len(jobs), self.batch_size)]
+                for count, batch in enumerate(batches, 1):
+                    print(f"生成第 {count}/{len(batches)} 批 ({len(batch)} 帧)...")
+                    batch_start = time.perf_counter()
+                    images = self.generator.generate_batch(
+                        [(job.prompt, job.negative_prompt, job.seed) for job in batch]
+                    )
+                    render_seconds = (time.perf_counter() - batch_start) / len(batch)
+
+                    # 分发到各故事目录，图像写盘后即可释放
+                    for job, image in zip(batch, images):
+                        for story, idx, record in job.targets:
+                            writer.raise_if_failed()
+                            record = dict(record, render_seconds=render_seconds)
+                            writer.submit(image, record['path'], on_done=functools.partial(
+                                manifests[story].append_written, record))
+        finally:
+            for manifest in manifests:
+                manifest.close()
+
+        stats['batches'] = len(batches)
+        stats['written_frames'] = writer.close()['written']
+        stats['seconds'] = time.perf_counter() - start
+        return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量故事任务")
+    parser.add_argument("specs", help="故事任务 JSONL 文件")
+    parser.add_argument("--output-root", default="./output/batch")
+    parser.add_argument("--model", default="runwayml/stable-diffusion-v1-5")
+    parser.add_argument("--backend", default="diffusers")
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--image-format", default="png", choices=list(AsyncFrameWriter.FORMATS))
+    parser.add_argument("--cache-dir", default=None)
+    parser.add_argument("--no-resume", action="store_true")
+    args = parser.parse_args()
+
+    specs = load_specs(args.specs, args.output_root)
+
+    generator = StoryGenerator(args.model, cache_dir=args.cache_dir)
+    if not generator.load_model(backend=args.backend):
+        return
+
+    runner = BatchStoryRunner(generator, batch_size=args.batch_size,
+                              image_format=args.image_format, resume=not args.no_resume)
+    stats = runner.run(specs)
+
+    print(f"\n批量任务完成: {stats['stories']} 个故事, 请求 {stats['requested_frames']} 帧, "
+          f"实际生成 {stats['unique_frames']} 帧 ({stats['batches']} 批), "
+          f"写出 {stats['written_frames']} 帧, 耗时 {stats['seconds']:.2f} 秒")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+编排开销基准测试
+用替身扩散管线（不需要模型权重）运行 10 到 10000 帧的故事，
+测量窗口规划、提示词组装、保存、联系表和视频等编排环节的耗时和内存
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+import tracemalloc
+from typing import List
+
+from story_generator import StoryGenerator
+from story_generator_demo import StoryGeneratorDemo
+from story_trace import peak_rss_mb
+
+
+DEFAULT_SIZES = [10, 100, 1000, 10000]
+CASES = ["demo", "stub", "stub_stream"]
+
+BASE_PROMPTS = [
+    "在森林中骑马前行",
+    "发现一座古老的城堡",
+    "进入城堡探索",
+    "遇到神秘的魔法师",
+    "与魔法师交谈",
+    "获得神秘的魔法剑",
+    "离开城堡继续冒险",
+    "在夕阳下骑马回家"
+]
+
+
+def make_frame_prompts(n_frames: int) -> List[str]:
+    """构造 n_frames 个互不相同的帧提示词"""
+    return [f"{BASE_PROMPTS[i % len(BASE_PROMPTS)]} 第{i}幕" for i in range(n_frames)]
+
+
+def _run_case(case: str, n_frames: int, options: dict, results):
+    """子进程：运行一个用例，输出写入临时目录"""
+    if options['tracemalloc']:
+        tracemalloc.start()
+
+    id_prompt = "一个勇敢的年轻骑士"
+    frame_prompts = make_frame_prompts(n_frames)
+    row = {'case': case, 'frames': n_frames}
+
+    with tempfile.TemporaryDirectory() as save_dir, \
+            open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        if case == "demo":
+            generator = StoryGeneratorDemo()
+            generator.movement_gen_story_slide_windows(id_prompt, frame_prompts, 3, 42,
+                                                       save_dir=save_dir)
+        else:
+            generator = StoryGenerator("stub")
+            generator.load_model(backend="stub", step_latency=options['step_latency'],
+                                 width=options['size'], height=options['size'])
+
+            plan_start = time.perf_counter()
+            generator.plan_windows(id_prompt, frame_prompts, 3)
+            row['plan_seconds'] = time.perf_counter() - plan_start
+
+            sheet_path = os.path.join(save_dir, "story_combined.png")
+            thumb_size = (options['thumb'], options['thumb'])
+            story_kwargs = dict(
+                save_dir=save_dir,
+                video_path=os.path.join(save_dir, "story_video.mp4"),
+                num_inference_steps=options['steps'],
+                trace_path=os.path.join(save_dir, "trace.jsonl")
+            )
+
+            if case == "stub_stream":
+                # 保存、视频、联系表都消费同一帧流，不保留已生成的帧
+                for _ in generator.iter_story_frames(id_prompt, frame_prompts, 3, 42,
+                                                     contact_sheet_path=sheet_path,
+                                                     thumb_size=thumb_size, **story_kwargs):
+                    pass
+                row['combine_seconds'] = 0.0
+            else:
+                images = generator.movement_gen_story_slide_windows(id_prompt, frame_prompts, 3, 42,
+                                                                    **story_kwargs)
+
+                combine_start = time.perf_counter()
+                generator.combine_story(images, sheet_path, thumb_size=thumb_size)
+                row['combine_seconds'] = time.perf_counter() - combine_start
+            row['stages'] = {name: stage['total_seconds'] for name, stage
+                             in generator.last_trace_summary['stages'].items()}
+        row['seconds'] = time.perf_counter() - start
+
+    row['ms_per_frame'] = row['seconds'] * 1000 / n_frames
+    row['peak_rss_mb'] = peak_rss_mb()
+    if options['tracemalloc']:
+        row['python_peak_mb'] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+    results.put(row)
+
+
+def benchmark_orchestration(cases: List[str], sizes: List[int], size: int = 64,
+                            thumb: int = 16, steps: int = 20, step_latency: float = 0.0,
+                            trace_memory: bool = False) -> List[dict]:
+    """
+    在独立进程中依次运行各用例和帧数
+
+    Args:
+        cases: 用例，demo（StoryGeneratorDemo）/ stub（StoryGenerator + 替身管线，返回帧列表后合成联系表）/
+            stub_stream（同 stub，但保存、视频、联系表都消费 iter_story_frames 的帧流）
+        sizes: 故事帧数列表
+        size: 替身管线输出的图像边长
+        thumb: 联系表缩略图边长
+        steps: 推理步数（替身管线每步调用一次回调）
+        step_latency: 替身管线每步的模拟耗时（秒），0 表示只测编排
+        trace_memory: 是否用 tracemalloc 统计 Python 分配峰值（会拖慢计时）
+
+    Returns:
+        各用例的测试结果
+    """
+    options = {'size': size, 'thumb': thumb, 'steps': steps,
+               'step_latency': step_latency, 'tracemalloc': trace_memory}
+    context = multiprocessing.get_context("spawn")
+    rows = []
+    for case in cases:
+        for n_frames in sizes:
+            print(f"测试用例: {case} ({n_frames} 帧)")
+            results = context.Queue()
+            process = context.Process(target=_run_case, args=(case, n_frames, options, results))
+            process.start()
+            process.join()
+            rows.append(results.get() if not results.empty()
+                        else {'case': case, 'frames': n_frames,
+                              'error': f"进程退出码 {process.exitcode}"})
+    return rows
+
+
+def print_report(rows: List[dict]):
+    """打印结果表格"""
+    print(f"\n{'用例':<12}{'帧数':>8}{'总耗时(秒)':>12}{'毫秒/帧':>10}{'峰值内存(MB)':>14}")
+    for row in rows:
+        if 'error' in row:
+            print(f"{row['case']:<12}{row['frames']:>8}  {row['error']}")
+            continue
+        line = (f"{row['case']:<12}{row['frames']:>8}{row['seconds']:>12.2f}"
+                f"{row['ms_per_frame']:>10.3f}{row['peak_rss_mb']:>14.0f}")
+        if 'python_peak_mb' in row:
+            line += f"  (Python 分配峰值 {row['python_peak_mb']:.1f} MB)"
+        print(line)
+
+        if 'stages' in row:
+            stages = dict(row['stages'], plan=row['plan_seconds'], combine=row['combine_seconds'])
+            breakdown = ", ".join(f"{name} {seconds:.2f}s" for name, seconds
+                                  in sorted(stages.items(), key=lambda item: -item[1]))
+            print(f"{'':<12}{'':>8}  {breakdown}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="编排开销基准测试（替身扩散管线）")
+    parser.add_argument("--cases", nargs="+", default=CASES, choices=CASES)
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES)
+    parser.add_argument("--image-size", type=int, default=64)
+    parser.add_argument("--thumb", type=int, default=16)
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--step-latency", type=float, default=0.0)
+    parser.add_argument("--tracemalloc", action="store_true")
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    rows = benchmark_orchestration(args.cases, args.sizes, args.image_size, args.thumb,
+                                   args.steps, args.step_latency, args.tracemalloc)
+    print_report(rows)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CPU推理配置与内存配置基准测试
+每组配置在独立进程中加载模型并生成若干帧，报告每帧耗时、加载后和整体的峰值内存
+"""
+
+import argparse
+import json
+import multiprocessing
+import time
+from typing import List, Optional
+
+from story_generator import CPU_PROFILES, MEMORY_PROFILES, StoryGenerator
+from story_trace import peak_rss_mb
+
+
+def _run_profile(model_name: str, profile: str, memory_profile: str, frames: int, steps: int,
+                 size: Optional[int], results):
+    """子进程：按配置加载模型，预热一帧后计时生成"""
+    generator = StoryGenerator(model_name)
+    generator.width = generator.height = size
+    row = {'profile': profile, 'memory_profile': memory_profile}
+    
+    start = time.perf_counter()
+    if not generator.load_model(cpu_profile=profile, memory_profile=memory_profile):
+        results.put(dict(row, error="模型加载失败"))
+        return
+    load_seconds = time.perf_counter() - start
+    load_peak_rss_mb = peak_rss_mb()
+    
+    prompt = "一个勇敢的年轻骑士 在森林中骑马前行"
+    # 与故事生成一样先编码全部提示词，free_text_encoder 配置随后释放文本编码器
+    generator.prepare_prompts([prompt, ""])
+    
+    # 预热（含 torch.compile 编译）
+    start = time.perf_counter()
+    generator.generate_frame(prompt, seed=0, num_inference_steps=steps)
+    warmup_seconds = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    for i in range(frames):
+        generator.generate_frame(prompt, seed=i + 1, num_inference_steps=steps)
+    elapsed = time.perf_counter() - start
+    
+    results.put(dict(
+        row,
+        load_seconds=load_seconds,
+        warmup_seconds=warmup_seconds,
+        seconds_per_frame=elapsed / frames,
+        load_peak_rss_mb=load_peak_rss_mb,
+        peak_rss_mb=peak_rss_mb()
+    ))
+
+
+def benchmark_profiles(model_name: str, profiles: List[str], frames: int = 3,
+                       steps: int = 20, memory_profiles: List[str] = ("default",),
+                       size: Optional[int] = None) -> List[dict]:
+    """
+    依次在独立进程中测试各配置组合，避免峰值内存和编译缓存互相影响
+    
+    Args:
+        model_name: 使用的扩散模型名称
+        profiles: 要测试的CPU推理配置名称
+        frames: 每个配置计时生成的帧数
+        steps: 推理步数
+        memory_profiles: 要测试的内存配置名称，与CPU推理配置两两组合
+        size: 生成图像的边长，为 None 时使用模型默认分辨率
+        
+    Returns:
+        各配置的测试结果
+    """
+    context = multiprocessing.get_context("spawn")
+    rows = []
+    for memory_profile in memory_profiles:
+        for profile in profiles:
+            print(f"测试配置: {profile} / {memory_profile}")
+            results = context.Queue()
+            process = context.Process(target=_run_profile,
+                                      args=(model_name, profile, memory_profile, frames, steps,
+                                            size, results))
+            process.start()
+            process.join()
+            rows.append(results.get() if not results.empty()
+                        else {'profile': profile, 'memory_profile': memory_profile,
+                              'error': f"进程退出码 {process.exitcode}"})
+    return rows
+
+
+def print_report(rows: List[dict]):
+    """打印结果表格"""
+    print(f"\n{'配置':<16}{'内存配置':<20}{'秒/帧':>10}{'加载后内存(MB)':>16}{'峰值内存(MB)':>16}"
+          f"{'加载(秒)':>12}{'预热(秒)':>12}")
+    for row in rows:
+        if 'error' in row:
+            print(f"{row['profile']:<16}{row['memory_profile']:<20}{row['error']}")
+            continue
+        print(f"{row['profile']:<16}{row['memory_profile']:<20}{row['seconds_per_frame']:>10.2f}"
+              f"{row['load_peak_rss_mb']:>16.0f}{row['peak_rss_mb']:>16.0f}"
+              f"{row['load_seconds']:>12.1f}{row['warmup_seconds']:>12.1f}")
+    
+    valid = [row for row in rows if 'error' not in row]
+    if valid:
+        best = min(valid, key=lambda row: row['seconds_per_frame'])
+        print(f"\n最快配置: {best['profile']} / {best['memory_profile']} "
+              f"({best['seconds_per_frame']:.2f} 秒/帧)")
+        smallest = min(valid, key=lambda row: row['peak_rss_mb'])
+        print(f"峰值内存最低: {smallest['profile']} / {smallest['memory_profile']} "
+              f"({smallest['peak_rss_mb']:.0f} MB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU推理配置与内存配置基准测试")
+    parser.add_argument("--model", default="runwayml/stable-diffusion-v1-5")
+    parser.add_argument("--profiles", nargs="+", default=list(CPU_PROFILES),
+                        choices=list(CPU_PROFILES))
+    parser.add_argument("--memory-profiles", nargs="+", default=["default"],
+                        choices=list(MEMORY_PROFILES))
+    parser.add_argument("--frames", type=int, default=3)
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--size", type=int, default=None)
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+    
+    rows = benchmark_profiles(args.model, args.profiles, args.frames, args.steps,
+                              args.memory_profiles, args.size)
+    print_report(rows)
+    
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
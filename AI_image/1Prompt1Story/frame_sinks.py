@@ -0,0 +1,505 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+帧输出组件
+后台线程池编码并写入帧图像，生成循环无需等待图像压缩和磁盘写入；
+视频帧直接从内存流式编码，无需回读磁盘；
+联系表按行条带合成，支持缩略图、磁盘映射输出和多分辨率金字塔
+"""
+
+import io
+import math
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from typing import Callable, List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+from PIL import Image
+
+
+class FrameWriteError(RuntimeError):
+    """帧写入失败"""
+
+
+@dataclass
+class WriterStats:
+    """写入统计信息"""
+    submitted: int = 0
+    written: int = 0
+    failed: int = 0
+    bytes_written: int = 0
+    encode_seconds: float = 0.0
+    blocked_seconds: float = 0.0
+    max_pending: int = 0
+
+
+class AsyncFrameWriter:
+    """异步帧写入器：有界队列 + 线程池"""
+
+    FORMATS = {
+        "png": ".png",
+        "webp": ".webp",
+        "raw": ".npy",
+    }
+
+    def __init__(self,
+                 image_format: str = "png",
+                 compress_level: int = 6,
+                 max_workers: int = 2,
+                 max_pending: int = 8,
+                 webp_quality: int = 90):
+        """
+        初始化写入器
+
+        Args:
+            image_format: 输出格式，png / webp / raw（未压缩的 .npy 数组）
+            compress_level: 压缩级别，PNG 为 0-9，WebP 为编码方法 0-6
+            max_workers: 编码写入线程数
+            max_pending: 队列中最多等待写入的帧数，队列满时 submit 阻塞（背压）
+            webp_quality: WebP 质量 (0-100)
+        """
+        if image_format not in self.FORMATS:
+            raise ValueError(f"不支持的图像格式: {image_format}")
+
+        self.image_format = image_format
+        self.compress_level = compress_level
+        self.webp_quality = webp_quality
+        self.max_pending = max_pending
+
+        self.stats = WriterStats()
+        self.errors: List[FrameWriteError] = []
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="frame-writer")
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._closed = False
+
+    @property
+    def extension(self) -> str:
+        """输出文件扩展名"""
+        return self.FORMATS[self.image_format]
+
+    def frame_path(self, save_dir: str, idx: int) -> str:
+        """返回第 idx 帧的输出路径"""
+        return os.path.join(save_dir, f"frame_{idx:03d}{self.extension}")
+
+    def encode(self, image: Image.Image) -> bytes:
+        """按配置的格式编码图像"""
+        buffer = io.BytesIO()
+        if self.image_format == "png":
+            image.save(buffer, format="PNG", compress_level=self.compress_level)
+        elif self.image_format == "webp":
+            image.save(buffer, format="WEBP", quality=self.webp_quality,
+                       method=min(self.compress_level, 6))
+        else:
+            np.save(buffer, np.asarray(image))
+        return buffer.getvalue()
+
+    def submit(self, image: Image.Image, path: str,
+               on_done: Optional[Callable[[str, bytes], None]] = None) -> Future:
+        """
+        提交一帧写入任务
+
+        队列已满时阻塞直到有空位，阻塞时间计入 blocked_seconds。
+
+        Args:
+            image: 待写入的图像
+            path: 输出路径
+            on_done: 写入成功后在写入线程中调用，参数为 (路径, 编码后的字节)
+
+        Returns:
+            写入任务的 Future
+        """
+        if self._closed:
+            raise FrameWriteError("写入器已关闭")
+
+        start = time.perf_counter()
+        self._slots.acquire()
+        blocked = time.perf_counter() - start
+
+        with self._lock:
+            self.stats.submitted += 1
+            self.stats.blocked_seconds += blocked
+            self._pending += 1
+            self.stats.max_pending = max(self.stats.max_pending, self._pending)
+
+        future = self._executor.submit(self._write, image, path, on_done)
+        future.add_done_callback(self._release)
+        return future
+
+    def _write(self, image: Image.Image, path: str,
+               on_done: Optional[Callable[[str, bytes], None]]):
+        """在写入线程中编码并写入一帧"""
+        try:
+            start = time.perf_counter()
+            data = self.encode(image)
+            with open(path, 'wb') as f:
+                f.write(data)
+            elapsed = time.perf_counter() - start
+
+            if on_done is not None:
+                on_done(path, data)
+        except Exception as e:
+            with self._lock:
+                self.stats.failed += 1
+                self.errors.append(FrameWriteError(f"写入 {path} 失败: {e}"))
+            return
+
+        with self._lock:
+            self.stats.written += 1
+            self.stats.bytes_written += len(data)
+            self.stats.encode_seconds += elapsed
+
+    def _release(self, future: Future):
+        """写入完成后释放队列空位"""
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def raise_if_failed(self):
+        """若已有写入失败，抛出第一个错误"""
+        with self._lock:
+            if self.errors:
+                raise self.errors[0]
+
+    def close(self, raise_errors: bool = True) -> dict:
+        """
+        等待所有写入完成并关闭线程池
+
+        Args:
+            raise_errors: 存在写入失败时是否抛出 FrameWriteError
+
+        Returns:
+            写入统计信息
+        """
+        if not self._closed:
+            self._closed = True
+            self._executor.shutdown(wait=True)
+
+        if raise_errors:
+            self.raise_if_failed()
+
+        return asdict(self.stats)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # 已有异常时不再用写入错误覆盖它
+        self.close(raise_errors=exc_type is None)
+        return False
+
+
+def decode_frame(data: bytes, path: str) -> Image.Image:
+    """
+    解码 AsyncFrameWriter 写出的单帧文件
+
+    Args:
+        data: 文件字节
+        path: 文件路径（按扩展名区分 .npy 原始数组和图像格式）
+
+    Returns:
+        帧图像
+    """
+    if path.endswith(".npy"):
+        return Image.fromarray(np.load(io.BytesIO(data)))
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    return image
+
+
+class VideoSink:
+    """流式视频写入器：逐帧接收 PIL / NumPy 帧并增量编码"""
+
+    def __init__(self, output_path: str, fps: int = 2, fourcc: str = "mp4v"):
+        """
+        初始化视频写入器（首帧到达时按其尺寸打开编码器）
+
+        Args:
+            output_path: 输出视频路径
+            fps: 帧率
+            fourcc: 编码器四字符码
+        """
+        self.output_path = output_path
+        self.fps = fps
+        self.fourcc = fourcc
+        self.frames_written = 0
+
+        self._video = None
+        self._bgr = None
+
+    def _open(self, width: int, height: int):
+        """按首帧尺寸打开视频编码器并分配复用的 BGR 缓冲区"""
+        fourcc = cv2.VideoWriter_fourcc(*self.fourcc)
+        self._video = cv2.VideoWriter(self.output_path, fourcc, self.fps, (width, height))
+        if not self._video.isOpened():
+            raise IOError(f"无法创建视频文件: {self.output_path}")
+        self._bgr = np.empty((height, width, 3), dtype=np.uint8)
+
+    def write(self, frame: Union[Image.Image, np.ndarray], bgr: bool = False):
+        """
+        写入一帧
+
+        RGB 帧转换到复用的 BGR 缓冲区后直接送入编码器，不为每帧分配新数组。
+
+        Args:
+            frame: PIL 图像或 HxWx3 的 uint8 数组
+            bgr: 数组是否已是 BGR 通道顺序（如 cv2.imread 的结果）
+        """
+        if isinstance(frame, Image.Image):
+            if frame.mode != 'RGB':
+                frame = frame.convert('RGB')
+            frame = np.asarray(frame)
+
+        height, width = frame.shape[:2]
+        if self._video is None:
+            self._open(width, height)
+        elif frame.shape != self._bgr.shape:
+            raise ValueError(f"帧尺寸不一致: {frame.shape} != {self._bgr.shape}")
+
+        if bgr:
+            self._video.write(frame)
+        else:
+            cv2.cvtColor(frame, cv2.COLOR_RGB2BGR, dst=self._bgr)
+            self._video.write(self._bgr)
+
+        self.frames_written += 1
+
+    def close(self) -> str:
+        """结束编码并返回视频路径"""
+        if self._video is not None:
+            self._video.release()
+            self._video = None
+        return self.output_path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+def grid_shape(n_frames: int, cols: Optional[int] = None) -> Tuple[int, int]:
+    """
+    计算联系表网格布局
+
+    Args:
+        n_frames: 帧数
+        cols: 列数，默认取 ceil(sqrt(n))
+
+    Returns:
+        (行数, 列数)
+    """
+    cols = cols or int(math.ceil(math.sqrt(n_frames)))
+    rows = int(math.ceil(n_frames / cols))
+    return rows, cols
+
+
+class ContactSheetCompositor:
+    """联系表合成器：逐帧写入当前行条带，行写满后输出到各金字塔层"""
+
+    BACKINGS = ("memory", "disk")
+
+    def __init__(self,
+                 n_frames: int,
+                 output_path: str,
+                 cols: Optional[int] = None,
+                 thumb_size: Optional[Tuple[int, int]] = None,
+                 pyramid_levels: int = 0,
+                 backing: str = "memory",
+                 max_png_pixels: int = 64 * 1024 * 1024,
+                 background: int = 255):
+        """
+        初始化合成器（画布在首帧到达、确定格子尺寸后分配）
+
+        Args:
+            n_frames: 总帧数
+            output_path: 输出图像路径
+            cols: 列数，默认取 ceil(sqrt(n))
+            thumb_size: 缩略图尺寸 (宽, 高)，为 None 时使用原始帧尺寸
+            pyramid_levels: 额外生成的金字塔层数，第 k 层边长缩小 2^k 倍
+            backing: memory 为内存画布；disk 只在内存中保留一行条带，
+                逐行写入 .npy 文件，内存占用与画布大小无关
+            max_png_pixels: disk 模式下像素数不超过该值的层额外导出 PNG
+            background: 空白格子的灰度值
+        """
+        if n_frames <= 0:
+            raise ValueError("图像列表为空")
+        if backing not in self.BACKINGS:
+            raise ValueError(f"不支持的画布类型: {backing}")
+
+        self.n_frames = n_frames
+        self.output_path = output_path
+        self.rows, self.cols = grid_shape(n_frames, cols)
+        self.thumb_size = thumb_size
+        self.pyramid_levels = pyramid_levels
+        self.backing = backing
+        self.max_png_pixels = max_png_pixels
+        self.background = background
+        self.outputs: List[str] = []
+
+        self._tile_size = thumb_size
+        self._shapes: List[Tuple[int, int, int]] = []
+        self._canvases: List[np.ndarray] = []
+        self._files = []
+        self._offsets: List[int] = []
+        self._strip: Optional[np.ndarray] = None
+        self._count = 0
+
+    def _level_path(self, level: int, extension: str) -> str:
+        """返回第 level 层的输出路径"""
+        stem, _ = os.path.splitext(self.output_path)
+        if level == 0 and extension != ".npy":
+            return self.output_path
+        suffix = f"_L{level}" if level else ""
+        return f"{stem}{suffix}{extension}"
+
+    def _allocate(self, tile_width: int, tile_height: int):
+        """按格子尺寸分配各层画布（disk 模式预分配 .npy 文件）"""
+        self._tile_size = (tile_width, tile_height)
+        height = self.rows * tile_height
+        width = self.cols * tile_width
+
+        for level in range(self.pyramid_levels + 1):
+            shape = (max(1, height >> level), max(1, width >> level), 3)
+            self._shapes.append(shape)
+            if self.backing == "disk":
+                path = self._level_path(level, ".npy")
+                header = np.lib.format.open_memmap(path, mode='w+', dtype=np.uint8, shape=shape)
+                self._offsets.append(header.offset)
+                del header
+                self._files.append(open(path, 'r+b'))
+                self.outputs.append(path)
+            else:
+                self._canvases.append(np.empty(shape, dtype=np.uint8))
+
+        if self.backing == "disk":
+            self._strip = np.empty((tile_height, width, 3), dtype=np.uint8)
+
+    def _start_row(self, row: int):
+        """开始新的一行：memory 模式直接使用画布切片，disk 模式复用条带缓冲区"""
+        tile_height = self._tile_size[1]
+        if self.backing == "memory":
+            self._strip = self._canvases[0][row * tile_height:(row + 1) * tile_height]
+        self._strip[:] = self.background
+
+    def _write_rows(self, level: int, y0: int, rows: np.ndarray):
+        """把完整宽度的若干行写入第 level 层"""
+        if self.backing == "memory":
+            self._canvases[level][y0:y0 + rows.shape[0]] = rows
+        else:
+            row_bytes = self._shapes[level][1] * 3
+            f = self._files[level]
+            f.seek(self._offsets[level] + y0 * row_bytes)
+            f.write(np.ascontiguousarray(rows).tobytes())
+
+    def add(self, frame: Union[Image.Image, np.ndarray]):
+        """
+        写入下一帧
+
+        Args:
+            frame: PIL 图像或 HxWx3 的 uint8 数组
+        """
+        if self._count >= self.n_frames:
+            raise ValueError(f"帧数超过预设的 {self.n_frames}")
+
+        if isinstance(frame, np.ndarray):
+            frame = Image.fromarray(frame)
+        if frame.mode != 'RGB':
+            frame = frame.convert('RGB')
+
+        if not self._shapes:
+            self._allocate(*(self._tile_size or frame.size))
+        if frame.size != self._tile_size:
+            frame = frame.resize(self._tile_size, Image.BILINEAR, reducing_gap=2.0)
+
+        tile_width = self._tile_size[0]
+        row, col = divmod(self._count, self.cols)
+        if col == 0:
+            self._start_row(row)
+
+        x0 = col * tile_width
+        self._strip[:, x0:x0 + tile_width] = np.asarray(frame)
+
+        self._count += 1
+        if col == self.cols - 1 or self._count == self.n_frames:
+            self._flush_row(row)
+
+    def _flush_row(self, row: int):
+        """一行写满后输出条带，并缩放生成该条带在各金字塔层中的对应行"""
+        tile_height = self._tile_size[1]
+        height = self._shapes[0][0]
+        y0 = row * tile_height
+        y1 = y0 + tile_height
+
+        if self.backing == "disk":
+            self._write_rows(0, y0, self._strip)
+
+        strip = None
+        for level in range(1, len(self._shapes)):
+            level_height, level_width, _ = self._shapes[level]
+            ly0 = y0 * level_height // height
+            ly1 = y1 * level_height // height
+            if ly1 <= ly0:
+                continue
+            if strip is None:
+                strip = Image.fromarray(np.ascontiguousarray(self._strip))
+            rows = np.asarray(strip.resize((level_width, ly1 - ly0), Image.BOX))
+            self._write_rows(level, ly0, rows)
+
+    def discard(self):
+        """放弃合成：关闭 disk 模式的 .npy 文件并释放画布，不保存输出（生成中断时调用）"""
+        for f in self._files:
+            f.close()
+        self._files = []
+        self._canvases = []
+        self._strip = None
+
+    def close(self) -> Optional[Image.Image]:
+        """
+        完成合成并保存输出
+
+        未写满的行以背景填充。memory 模式保存全部层的 PNG 并返回完整画布；
+        disk 模式保留 .npy 画布，仅为像素数不超过 max_png_pixels 的层导出 PNG，返回 None。
+
+        Returns:
+            合成的图像（memory 模式）
+        """
+        if not self._shapes:
+            raise ValueError("没有写入任何帧")
+
+        # 补齐剩余的空行
+        filled_rows = int(math.ceil(self._count / self.cols))
+        for row in range(filled_rows, self.rows):
+            self._start_row(row)
+            self._flush_row(row)
+
+        for f in self._files:
+            f.close()
+        self._files = []
+        self._strip = None
+
+        result = None
+        for level, shape in enumerate(self._shapes):
+            if self.backing == "memory":
+                canvas = self._canvases[level]
+            elif shape[0] * shape[1] <= self.max_png_pixels:
+                canvas = np.load(self._level_path(level, ".npy"), mmap_mode='r')
+            else:
+                continue
+
+            image = Image.fromarray(np.asarray(canvas))
+            path = self._level_path(level, ".png")
+            image.save(path)
+            self.outputs.append(path)
+            if level == 0 and self.backing == "memory":
+                result = image
+
+        return result
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+生成结果缓存
+按生成输入的哈希寻址保存帧图像，带完整性校验和按容量的LRU淘汰
+"""
+
+import hashlib
+import io
+import json
+import os
+from collections import OrderedDict
+from typing import Optional
+
+from PIL import Image
+
+
+class GenerationCache:
+    """内容寻址的生成结果缓存"""
+
+    def __init__(self, cache_dir: str = "./.story_cache", max_bytes: int = 2 * 1024 ** 3):
+        """
+        初始化缓存，扫描已有条目并按最近访问时间恢复LRU顺序
+
+        Args:
+            cache_dir: 缓存目录
+            max_bytes: 缓存总大小上限（字节）
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.corrupted = 0
+        self.evictions = 0
+
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._scan()
+        self._evict()
+
+    @staticmethod
+    def make_key(**inputs) -> str:
+        """
+        由生成输入计算缓存键
+
+        Args:
+            **inputs: 决定生成结果的全部输入（模型、提示词、种子、步数等）
+
+        Returns:
+            输入的 SHA-256 十六进制摘要
+        """
+        payload = json.dumps(inputs, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _paths(self, key: str):
+        """返回条目的图像路径和元数据路径"""
+        base = os.path.join(self.cache_dir, key[:2], key)
+        return base + ".png", base + ".json"
+
+    def _scan(self):
+        """扫描缓存目录，按修改时间从旧到新登记条目"""
+        found = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".png"):
+                    continue
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                found.append((stat.st_mtime, name[:-4], stat.st_size))
+
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    def _remove(self, key: str):
+        """删除条目文件并更新统计"""
+        size = self._entries.pop(key, 0)
+        self._total_bytes -= size
+        for path in self._paths(key):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _atomic_write(path: str, data: bytes):
+        """写入临时文件后原子替换，避免并发读到半写的文件"""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def get(self, key: str) -> Optional[Image.Image]:
+        """
+        查询缓存
+
+        读取时校验图像字节的 SHA-256，不一致的条目视为损坏并删除。
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            缓存的图像，未命中或校验失败时返回 None
+        """
+        image_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(image_path, 'rb') as f:
+                data = f.read()
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        if hashlib.sha256(data).hexdigest() != meta.get('sha256'):
+            self.corrupted += 1
+            self.misses += 1
+            self._remove(key)
+            return None
+
+        image = Image.open(io.BytesIO(data))
+        image.load()
+
+        # 更新访问时间，重启后仍能恢复LRU顺序
+        os.utime(image_path)
+        if key not in self._entries:
+            self._entries[key] = len(data)
+            self._total_bytes += len(data)
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return image
+
+    def put(self, key: str, image: Image.Image):
+        """
+        写入缓存，超出容量时淘汰最久未使用的条目
+
+        Args:
+            key: 缓存键
+            image: 生成的图像
+        """
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG", compress_level=1)
+        data = buffer.getvalue()
+
+        meta = {'sha256': hashlib.sha256(data).hexdigest(), 'size': len(data)}
+
+        image_path, meta_path = self._paths(key)
+        os.makedirs(os.path.dirname(image_path), exist_ok=True)
+        self._atomic_write(image_path, data)
+        self._atomic_write(meta_path, json.dumps(meta).encode('utf-8'))
+
+        self._total_bytes += len(data) - self._entries.get(key, 0)
+        self._entries[key] = len(data)
+        self._entries.move_to_end(key)
+        self._evict()
+
+    def _evict(self):
+        """淘汰最久未使用的条目直到总大小不超过上限（至少保留最新的一条）"""
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        """返回缓存统计信息"""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self._total_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'corrupted': self.corrupted,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+扩散后端
+StoryGenerator 通过后端注册表加载管线；除 diffusers 外提供一个不需要权重的替身管线，
+按种子和提示词确定性地生成合成图像，用于在没有模型的环境中测量编排开销
+"""
+
+import hashlib
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import numpy as np
+import torch
+from PIL import Image
+
+
+@dataclass
+class DiffusionBackend:
+    """
+    扩散后端：加载主管线，由主管线得到共享权重的图生图管线，
+    以及（可选）单独加载某个组件并返回装上该组件的管线，供顺序加载和释放后重新加载使用
+    """
+    load: Callable[..., Any]
+    img2img: Callable[[Any], Any]
+    load_component: Optional[Callable[..., Any]] = None
+
+
+@dataclass
+class StubPipelineOutput:
+    """替身管线的输出，与 diffusers 管线输出同样通过 images 访问"""
+    images: Union[List[Image.Image], np.ndarray]
+
+
+class StubDiffusionPipeline:
+    """
+    替身扩散管线
+
+    不加载权重，按生成器种子和提示词嵌入确定性地生成色块图像；
+    每个去噪步骤可配置模拟耗时（与批大小无关），并像真实管线一样调用逐步回调。
+    同时支持以 image/strength 传入初始图像（续写模式）。
+    """
+
+    tokenizer = None
+    dtype = torch.float32
+
+    def __init__(self, step_latency: float = 0.0, width: int = 512, height: int = 512,
+                 embed_dim: int = 8, max_tokens: int = 77):
+        """
+        初始化替身管线
+
+        Args:
+            step_latency: 每个去噪步骤的模拟耗时（秒）
+            width: 默认图像宽度
+            height: 默认图像高度
+            embed_dim: 提示词嵌入维度
+            max_tokens: 提示词嵌入长度
+        """
+        self.step_latency = step_latency
+        self.width = width
+        self.height = height
+        self.embed_dim = embed_dim
+        self.max_tokens = max_tokens
+        self.scheduler = None
+        self.components: Dict[str, Any] = {}
+        self.calls = 0
+
+    def to(self, device):
+        return self
+
+    def encode_prompt(self, prompt: str, device=None, num_images_per_prompt: int = 1,
+                      do_classifier_free_guidance: bool = False, **kwargs):
+        """按提示词哈希生成固定的伪嵌入，返回 (prompt_embeds, None)"""
+        seed = int.from_bytes(hashlib.sha256(prompt.encode('utf-8')).digest()[:8], 'little')
+        generator = torch.Generator().manual_seed(seed)
+        embeds = torch.randn(num_images_per_prompt, self.max_tokens, self.embed_dim,
+                             generator=generator)
+        return embeds, None
+
+    @staticmethod
+    def numpy_to_pil(images: np.ndarray) -> List[Image.Image]:
+        """把 [0, 1] 的 float 数组批次转换为 PIL 图像列表"""
+        images = (images * 255).round().astype(np.uint8)
+        return [Image.fromarray(image) for image in images]
+
+    def _synthesize(self, seed: int, embeds: torch.Tensor, width: int, height: int) -> np.ndarray:
+        """由种子和嵌入生成 8x8 色块放大后的图像"""
+        embed_seed = zlib.crc32(embeds.detach().cpu().numpy().tobytes())
+        rng = np.random.default_rng([seed, embed_seed])
+        tile = rng.random((8, 8, 3), dtype=np.float32)
+        rows = np.arange(height) * 8 // height
+        cols = np.arange(width) * 8 // width
+        return tile[rows[:, None], cols[None, :]]
+
+    def __call__(self, prompt_embeds: torch.Tensor, negative_prompt_embeds=None,
+                 generator: torch.Generator = None, num_inference_steps: int = 20,
+                 width: int = None, height: int = None,
+                 image: Image.Image = None, strength: float = 1.0,
+                 output_type: str = "pil", callback_on_step_end=None, **kwargs):
+        self.calls += 1
+
+        if image is not None:
+            width, height = image.size
+            steps = max(1, int(num_inference_steps * strength))
+        else:
+            width, height = width or self.width, height or self.height
+            steps = num_inference_steps
+
+        for step in range(steps):
+            if self.step_latency:
+                time.sleep(self.step_latency)
+            if callback_on_step_end is not None:
+                callback_on_step_end(self, step, step, {})
+
+        # 批量调用时每帧各有一个生成器，与逐帧调用的结果相同
+        generators = generator if isinstance(generator, list) else [generator] * len(prompt_embeds)
+        arrays = []
+        for embeds, item_generator in zip(prompt_embeds, generators):
+            seed = item_generator.initial_seed() if item_generator is not None else 0
+            array = self._synthesize(seed, embeds, width, height)
+            if image is not None:
+                init = np.asarray(image.convert('RGB'), dtype=np.float32) / 255
+                array = (1 - strength) * init + strength * array
+            arrays.append(array)
+
+        images = np.stack(arrays)
+        if output_type == "np":
+            return StubPipelineOutput(images)
+        return StubPipelineOutput(self.numpy_to_pil(images))
+
+
+def _load_diffusers(model_name: str, torch_dtype: torch.dtype, **options):
+    from diffusers import StableDiffusionPipeline
+
+    return StableDiffusionPipeline.from_pretrained(
+        model_name,
+        torch_dtype=torch_dtype,
+        safety_checker=None,
+        **options
+    )
+
+
+def _diffusers_img2img(pipe):
+    from diffusers import StableDiffusionImg2ImgPipeline
+
+    return StableDiffusionImg2ImgPipeline(**pipe.components)
+
+
+def _load_diffusers_component(pipe, model_name: str, name: str, torch_dtype: torch.dtype,
+                              **options):
+    from diffusers import AutoencoderKL, UNet2DConditionModel
+
+    if name == "text_encoder":
+        from transformers import CLIPTextModel
+
+        # transformers 的 low_cpu_mem_usage 依赖 accelerate，文本编码器按默认方式加载
+        options = {}
+        component_class = CLIPTextModel
+    else:
+        component_class = {"unet": UNet2DConditionModel, "vae": AutoencoderKL}[name]
+
+    component = component_class.from_pretrained(model_name, subfolder=name,
+                                                torch_dtype=torch_dtype, **options)
+
+    # 管线在构造时按 UNet / VAE 配置计算缩放系数等属性，加载组件后重新组装管线
+    components = dict(pipe.components, **{name: component})
+    return type(pipe)(**components, requires_safety_checker=False)
+
+
+def _load_stub(model_name: str, torch_dtype: torch.dtype, **options):
+    return StubDiffusionPipeline(**options)
+
+
+BACKENDS: Dict[str, DiffusionBackend] = {
+    "diffusers": DiffusionBackend(load=_load_diffusers, img2img=_diffusers_img2img,
+                                  load_component=_load_diffusers_component),
+    # 替身管线自身接受 image/strength，图生图直接复用主管线
+    "stub": DiffusionBackend(load=_load_stub, img2img=lambda pipe: pipe),
+}
+
+
+def register_backend(name: str, backend: DiffusionBackend):
+    """
+    注册扩散后端
+
+    Args:
+        name: 后端名称，用于 StoryGenerator.load_model(backend=...)
+        backend: 后端定义；load(model_name, torch_dtype, **options) 返回与 diffusers
+            StableDiffusionPipeline 接口兼容的管线；load_component(pipe, model_name, name, torch_dtype, **options)
+            加载单个组件（unet / vae / text_encoder）并返回装上该组件的管线
+    """
+    BACKENDS[name] = backend
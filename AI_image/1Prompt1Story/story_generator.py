@@ -9,9 +9,24 @@ import torch
 import numpy as np
 from PIL import Image
 import cv2
-from typing import List, Tuple, Optional
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple, Optional, Union
 from dataclasses import dataclass
-import math
+from collections import OrderedDict
+import contextlib
+import functools
+import gc
+import hashlib
+import os
+import tempfile
+import time
+
+from window_planner import CircularWindows, WindowLengthPlanner
+from story_metrics import ssim
+from frame_sinks import AsyncFrameWriter, ContactSheetCompositor, VideoSink, decode_frame
+from result_cache import GenerationCache
+from story_trace import StoryTracer, print_summary
+from story_manifest import MANIFEST_NAME, FrameManifest
+from story_backends import BACKENDS
 
 
 @dataclass
@@ -25,38 +40,245 @@ class UNetController:
             self.frame_prompt_suppress = []
 
 
+@dataclass
+class CPUProfile:
+    """CPU推理配置"""
+    name: str = "default"
+    attention_slicing: bool = False
+    channels_last: bool = False
+    bf16_autocast: bool = False
+    compile_unet: bool = False
+    compile_cache_dir: Optional[str] = "./.torch_compile_cache"
+    num_threads: Optional[int] = None
+    pin_threads: bool = False
+
+
+# 预置的CPU推理配置，可用 benchmark_profiles.py 在目标机器上对比
+CPU_PROFILES = {
+    "default": CPUProfile(),
+    "sliced": CPUProfile("sliced", attention_slicing=True),
+    "channels_last": CPUProfile("channels_last", channels_last=True),
+    "bf16": CPUProfile("bf16", channels_last=True, bf16_autocast=True),
+    "compiled": CPUProfile("compiled", channels_last=True, compile_unet=True),
+    "max": CPUProfile("max", channels_last=True, bf16_autocast=True, compile_unet=True,
+                      pin_threads=True),
+}
+
+
+@dataclass
+class MemoryProfile:
+    """内存配置"""
+    name: str = "default"
+    low_cpu_mem_usage: bool = False
+    sequential_load: bool = False
+    free_text_encoder: bool = False
+    vae_tiling: bool = False
+
+
+# 预置的内存配置，可用 benchmark_profiles.py --memory-profiles 对比峰值内存
+MEMORY_PROFILES = {
+    "default": MemoryProfile(),
+    "low_cpu_mem": MemoryProfile("low_cpu_mem", low_cpu_mem_usage=True),
+    "free_text_encoder": MemoryProfile("free_text_encoder", low_cpu_mem_usage=True,
+                                       free_text_encoder=True),
+    "sequential": MemoryProfile("sequential", low_cpu_mem_usage=True,
+                                sequential_load=True, free_text_encoder=True),
+    "tiled": MemoryProfile("tiled", low_cpu_mem_usage=True, vae_tiling=True),
+    "min": MemoryProfile("min", low_cpu_mem_usage=True,
+                         sequential_load=True, free_text_encoder=True, vae_tiling=True),
+}
+
+
+# 可选采样器：名称 -> (diffusers 调度器类名, 额外配置)，default 为模型自带的调度器
+SAMPLERS = {
+    "default": None,
+    "dpmpp": ("DPMSolverMultistepScheduler", {"algorithm_type": "dpmsolver++"}),
+    "dpmpp_karras": ("DPMSolverMultistepScheduler",
+                     {"algorithm_type": "dpmsolver++", "use_karras_sigmas": True}),
+    "unipc": ("UniPCMultistepScheduler", {}),
+    "euler_a": ("EulerAncestralDiscreteScheduler", {}),
+}
+
+
+def bf16_supported() -> bool:
+    """检测当前CPU是否支持 bfloat16 加速"""
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        return False
+
+
+class PromptEmbeddingCache:
+    """
+    提示词嵌入LRU缓存，按 (模型, 文本) 缓存文本编码器输出
+    
+    缓存键为完整的最终提示词。一个故事中每个窗口的正向提示词和负向（抑制）提示词都各不相同，
+    单次生成中不会命中；CLIP 嵌入依赖上下文，身份提示词的嵌入也无法单独复用。
+    缓存在重复渲染时生效：再次生成同一故事、断点续跑、预览后 render_approved、采样器扫描，
+    以及 prepare_prompts 预先编码后的正式生成。
+    """
+    
+    def __init__(self, max_entries: int = 256):
+        """
+        初始化嵌入缓存
+        
+        Args:
+            max_entries: 最多缓存的嵌入条数，超出后淘汰最久未使用的条目
+        """
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], torch.Tensor]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key: Tuple[str, str]) -> Optional[torch.Tensor]:
+        """查询缓存，命中时将条目移到最近使用位置"""
+        embeds = self._entries.get(key)
+        if embeds is None:
+            self.misses += 1
+            return None
+        
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return embeds
+    
+    def put(self, key: Tuple[str, str], embeds: torch.Tensor):
+        """写入缓存，必要时淘汰最久未使用的条目"""
+        self._entries[key] = embeds
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def clear(self):
+        """清空缓存及统计"""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+    
+    def stats(self) -> dict:
+        """返回缓存统计信息"""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
 class StoryGenerator:
     """故事生成器主类"""
     
-    def __init__(self, model_name: str = "runwayml/stable-diffusion-v1-5"):
+    def __init__(self, model_name: str = "runwayml/stable-diffusion-v1-5",
+                 cache_dir: Optional[str] = None,
+                 cache_max_bytes: int = 2 * 1024 ** 3):
         """
         初始化故事生成器
         
         Args:
             model_name: 使用的扩散模型名称
+            cache_dir: 生成结果缓存目录，为 None 时不缓存
+            cache_max_bytes: 生成结果缓存容量上限（字节）
         """
         self.model_name = model_name
         self.pipe = None
+        self.backend = "diffusers"
         self.controller = UNetController()
+        self.embedding_cache = PromptEmbeddingCache()
+        self.window_planner = WindowLengthPlanner()
+        self.result_cache = GenerationCache(cache_dir, cache_max_bytes) if cache_dir else None
+        self.last_writer_stats = None
+        self.cpu_profile: Optional[CPUProfile] = None
+        self.memory_profile = MEMORY_PROFILES["default"]
+        self.torch_dtype: Optional[torch.dtype] = None
+        self.autocast_dtype: Optional[torch.dtype] = None
+        self.sampler = "default"
+        self.num_inference_steps = 20
+        self.width: Optional[int] = None
+        self.height: Optional[int] = None
+        self.vae_name = "default"
+        self._tiny_vaes = {}
+        self._default_scheduler = None
+        self._img2img_pipe = None
+        self._component_options = {}
+        self._pending_cpu_profile: Union[str, CPUProfile, None] = None
+        self.tracer: Optional[StoryTracer] = None
+        self.last_trace_summary = None
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
         
         print(f"使用设备: {self.device}")
         print(f"模型: {model_name}")
     
-    def load_model(self):
-        """加载扩散模型"""
+    def load_model(self, cpu_profile: Union[str, CPUProfile, None] = None,
+                   backend: str = "diffusers",
+                   memory_profile: Union[str, MemoryProfile, None] = None,
+                   **backend_options):
+        """
+        加载扩散模型
+        
+        Args:
+            cpu_profile: CPU推理配置（CPU_PROFILES 中的名称或 CPUProfile），仅在CPU上生效
+            backend: BACKENDS 中的后端名称；"stub" 为不需要权重的替身管线，用于测量编排开销
+            memory_profile: 内存配置（MEMORY_PROFILES 中的名称或 MemoryProfile）；
+                sequential_load 时先只加载文本编码器，UNet 和 VAE 在首次生成时再加载
+            **backend_options: 传给后端加载函数的参数（如替身管线的 step_latency、width、height）
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"未知的后端: {backend}，可选: {', '.join(BACKENDS)}")
+        
+        if isinstance(memory_profile, str):
+            if memory_profile not in MEMORY_PROFILES:
+                raise ValueError(f"未知的内存配置: {memory_profile}")
+            memory_profile = MEMORY_PROFILES[memory_profile]
+        memory_profile = memory_profile or MEMORY_PROFILES["default"]
+        
+        # 内存配置中的加载选项只对支持按组件加载的后端生效
+        component_options = {}
+        load_options = dict(backend_options)
+        if BACKENDS[backend].load_component is not None:
+            if memory_profile.low_cpu_mem_usage:
+                # 权重直接载入模型，不先随机初始化一份参数（safetensors 默认已按内存映射读取）
+                component_options['low_cpu_mem_usage'] = True
+            load_options.update(component_options)
+            if memory_profile.sequential_load:
+                load_options.update(unet=None, vae=None)
+        elif memory_profile.name != "default":
+            print(f"后端 {backend} 不支持内存配置，忽略: {memory_profile.name}")
+            memory_profile = MEMORY_PROFILES["default"]
+        
         try:
-            from diffusers import StableDiffusionPipeline
-            
             print("正在加载模型...")
-            self.pipe = StableDiffusionPipeline.from_pretrained(
+            self.torch_dtype = torch.float16 if self.device == "cuda" else torch.float32
+            self.pipe = BACKENDS[backend].load(
                 self.model_name,
-                torch_dtype=torch.float16 if self.device == "cuda" else torch.float32,
-                safety_checker=None
+                torch_dtype=self.torch_dtype,
+                **load_options
             )
             
+            self.backend = backend
+            self.memory_profile = memory_profile
+            self._component_options = component_options
+            self._default_scheduler = self.pipe.scheduler
+            self.sampler = "default"
+            self._img2img_pipe = None
+            self._pending_cpu_profile = None
+            
             if self.device == "cuda":
                 self.pipe = self.pipe.to(self.device)
+            elif cpu_profile is not None:
+                if memory_profile.sequential_load:
+                    # UNet / VAE 尚未加载，等加载后再应用
+                    self._pending_cpu_profile = cpu_profile
+                else:
+                    self.apply_cpu_profile(cpu_profile)
+            
+            if memory_profile.vae_tiling and getattr(self.pipe, "vae", None) is not None:
+                self.pipe.vae.enable_tiling()
+            
+            # 使用管线的真实 tokenizer 规划窗口长度
+            self.window_planner = WindowLengthPlanner(tokenizer=self.pipe.tokenizer)
             
             print("模型加载完成！")
             return True
@@ -68,10 +290,180 @@ class StoryGenerator:
             print(f"模型加载失败: {e}")
             return False
     
+    def _load_component(self, name: str):
+        """从模型目录单独加载一个管线组件"""
+        print(f"正在加载 {name}...")
+        self.pipe = BACKENDS[self.backend].load_component(
+            self.pipe, self.model_name, name, torch_dtype=self.torch_dtype, **self._component_options
+        )
+        if self.device == "cuda":
+            self.pipe = self.pipe.to(self.device)
+        # 图生图管线持有旧组件的引用，需要重新创建
+        self._img2img_pipe = None
+    
+    def ensure_components(self):
+        """顺序加载模式下，在首次生成前加载 UNet 和 VAE，并补上延后的 CPU 配置"""
+        if self.pipe is None:
+            raise ValueError("模型未加载，请先调用 load_model()")
+        
+        loaded = False
+        for name in ("unet", "vae"):
+            # 替身管线没有这些属性，getattr 默认值不为 None
+            if getattr(self.pipe, name, False) is None:
+                self._load_component(name)
+                loaded = True
+        
+        if loaded and self.memory_profile.vae_tiling:
+            self.pipe.vae.enable_tiling()
+        
+        if self._pending_cpu_profile is not None:
+            profile, self._pending_cpu_profile = self._pending_cpu_profile, None
+            self.apply_cpu_profile(profile)
+    
+    def release_text_encoder(self):
+        """
+        释放文本编码器
+        
+        在故事用到的提示词嵌入都已缓存后调用；之后遇到未缓存的提示词时会重新从磁盘加载。
+        """
+        if getattr(self.pipe, "text_encoder", None) is None:
+            return
+        
+        self.pipe.text_encoder = None
+        self._img2img_pipe = None
+        gc.collect()
+        print("文本编码器已释放")
+    
+    def prepare_prompts(self, prompts: Iterable[str]) -> bool:
+        """
+        预先编码一组提示词，内存配置开启 free_text_encoder 时随后释放文本编码器
+        
+        提示词按需逐条读取和编码，只记录不超过嵌入缓存容量的已见提示词；
+        不同提示词数量超过缓存容量时停止并保留文本编码器，避免反复重新加载。
+        
+        Args:
+            prompts: 最终的正向/负向提示词（可为生成器）
+            
+        Returns:
+            是否释放了文本编码器
+        """
+        seen = set()
+        for text in prompts:
+            if text in seen:
+                continue
+            if len(seen) >= self.embedding_cache.max_entries:
+                print(f"提示词数量超过嵌入缓存容量 ({self.embedding_cache.max_entries})，保留文本编码器")
+                return False
+            seen.add(text)
+            self.encode_prompt(text)
+        
+        if self.memory_profile.free_text_encoder:
+            self.release_text_encoder()
+            return True
+        return False
+    
+    def apply_cpu_profile(self, profile: Union[str, CPUProfile]):
+        """
+        应用CPU推理配置
+        
+        Args:
+            profile: CPU_PROFILES 中的名称或 CPUProfile
+        """
+        if isinstance(profile, str):
+            if profile not in CPU_PROFILES:
+                raise ValueError(f"未知的CPU配置: {profile}")
+            profile = CPU_PROFILES[profile]
+        
+        if profile.num_threads:
+            torch.set_num_threads(profile.num_threads)
+        
+        # 把进程绑定到固定的核心上，避免线程在核心间迁移
+        if profile.pin_threads and hasattr(os, "sched_setaffinity"):
+            cores = sorted(os.sched_getaffinity(0))
+            os.sched_setaffinity(0, cores[:torch.get_num_threads()])
+        
+        if profile.attention_slicing:
+            self.pipe.enable_attention_slicing()
+        
+        if profile.channels_last:
+            self.pipe.unet.to(memory_format=torch.channels_last)
+            self.pipe.vae.to(memory_format=torch.channels_last)
+        
+        self.autocast_dtype = None
+        if profile.bf16_autocast:
+            if bf16_supported():
+                self.autocast_dtype = torch.bfloat16
+            else:
+                print("当前CPU不支持 bfloat16，保持 float32")
+        
+        if profile.compile_unet:
+            # 编译产物缓存到磁盘，后续进程直接复用
+            if profile.compile_cache_dir:
+                import torch._inductor.config as inductor_config
+                
+                os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR",
+                                      os.path.abspath(profile.compile_cache_dir))
+                inductor_config.fx_graph_cache = True
+            self.pipe.unet = torch.compile(self.pipe.unet)
+        
+        self.cpu_profile = profile
+        print(f"CPU配置: {profile.name} (线程数 {torch.get_num_threads()})")
+    
+    def set_sampler(self, name: str, num_inference_steps: Optional[int] = None):
+        """
+        切换采样器
+        
+        多步采样器（DPM-Solver++、UniPC）通常用 8-12 步即可接近默认调度器 20 步的效果，
+        可先用 sweep_sampler_quality 在目标提示词上确认。
+        
+        Args:
+            name: SAMPLERS 中的采样器名称
+            num_inference_steps: 默认推理步数，为 None 时保持不变
+        """
+        if self.pipe is None:
+            raise ValueError("模型未加载，请先调用 load_model()")
+        if name not in SAMPLERS:
+            raise ValueError(f"未知的采样器: {name}，可选: {', '.join(SAMPLERS)}")
+        
+        spec = SAMPLERS[name]
+        if self._default_scheduler is None:
+            # 替身管线等没有调度器的后端只应用步数
+            print(f"当前管线没有调度器，忽略采样器: {name}")
+            name = "default"
+        elif spec is None:
+            self.pipe.scheduler = self._default_scheduler
+        else:
+            import diffusers
+            
+            class_name, options = spec
+            scheduler_class = getattr(diffusers, class_name)
+            self.pipe.scheduler = scheduler_class.from_config(self._default_scheduler.config,
+                                                              **options)
+        
+        self.sampler = name
+        if num_inference_steps is not None:
+            self.num_inference_steps = num_inference_steps
+    
+    def load_tokenizer(self) -> bool:
+        """只加载 tokenizer，不加载完整模型时也能按真实 token 数规划窗口"""
+        try:
+            from transformers import CLIPTokenizer
+            
+            tokenizer = CLIPTokenizer.from_pretrained(self.model_name, subfolder="tokenizer")
+        except Exception as e:
+            print(f"tokenizer 加载失败，改用估算: {e}")
+            return False
+        
+        self.window_planner = WindowLengthPlanner(tokenizer=tokenizer)
+        return True
+    
     def get_max_window_length(self, id_prompt: str, frame_prompt_list: List[str]) -> int:
         """
         计算最大窗口长度（防止提示词过长）
         
+        按 tokenizer 统计 token 数，返回在每个起始位置都不超出上限的窗口长度
+        （计入末尾再追加一次的强调词）。
+        
         Args:
             id_prompt: 身份提示词
             frame_prompt_list: 帧提示词列表
@@ -79,49 +471,112 @@ class StoryGenerator:
         Returns:
             最大可用窗口长度
         """
-        combined_prompt = id_prompt
-        max_len = 0
-        
-        for prompt in frame_prompt_list:
-            combined_prompt += ' ' + prompt
-            if len(combined_prompt.split()) >= 77:  # 标准token限制
-                break
-            max_len += 1
-        
-        return max_len
+        return self.window_planner.max_window_length(id_prompt, frame_prompt_list)
     
-    def circular_sliding_windows(self, lst: List, w: int) -> List[List]:
+    def circular_sliding_windows(self, lst: List, w: int) -> CircularWindows:
         """
         循环滑动窗口生成
         
+        返回惰性视图，窗口按下标即时构造，不复制提示词。
+        
         Args:
             lst: 输入列表
             w: 窗口大小
             
         Returns:
-            滑动窗口列表
+            滑动窗口序列（可按下标访问和迭代，每个窗口为长度 w 的序列）
+        """
+        return CircularWindows(lst, w)
+    
+    def encode_prompt(self, text: str) -> torch.Tensor:
+        """
+        编码提示词（带缓存）
+        
+        同一模型下相同文本只经过一次文本编码器，重复渲染时直接复用缓存的嵌入。
+        
+        Args:
+            text: 提示词文本
+            
+        Returns:
+            提示词嵌入
         """
-        n = len(lst)
-        if n == 0:
-            return []
+        if self.pipe is None:
+            raise ValueError("模型未加载，请先调用 load_model()")
+        
+        key = (self.model_name, text)
+        embeds = self.embedding_cache.get(key)
+        if embeds is None:
+            if getattr(self.pipe, "text_encoder", False) is None:
+                self._load_component("text_encoder")
+            with torch.no_grad():
+                embeds, _ = self.pipe.encode_prompt(
+                    text,
+                    device=self.device,
+                    num_images_per_prompt=1,
+                    do_classifier_free_guidance=False
+                )
+            self.embedding_cache.put(key, embeds)
+        
+        return embeds
+    
+    def _apply_controller(self, prompt: str, negative_prompt: str) -> Tuple[str, str]:
+        """应用控制器权重，返回最终的正向/负向提示词"""
+        if self.controller.frame_prompt_express:
+            prompt = f"{prompt} {self.controller.frame_prompt_express}"
+        
+        if self.controller.frame_prompt_suppress:
+            suppress_text = " ".join(self.controller.frame_prompt_suppress)
+            negative_prompt = f"{negative_prompt} {suppress_text}".strip()
         
-        windows = []
-        for i in range(n):
-            window = []
-            for j in range(w):
-                window.append(lst[(i + j) % n])
-            windows.append(window)
+        return prompt, negative_prompt
+    
+    def _stage(self, name: str):
+        """追踪开启时对一个阶段计时，否则不做任何事"""
+        return self.tracer.stage(name) if self.tracer is not None else contextlib.nullcontext()
+    
+    def _get_img2img_pipe(self):
+        """返回与主管线共享权重的图生图管线（首次使用时创建）"""
+        if self._img2img_pipe is None:
+            self._img2img_pipe = BACKENDS[self.backend].img2img(self.pipe)
         
-        return windows
+        # 与主管线保持同一采样器
+        self._img2img_pipe.scheduler = self.pipe.scheduler
+        return self._img2img_pipe
     
-    def generate_frame(self, prompt: str, seed: int, negative_prompt: str = "") -> Image.Image:
+    def _cache_key(self, **inputs) -> str:
+        """由模型标识和生成输入计算结果缓存键"""
+        return GenerationCache.make_key(
+            model=self.model_name,
+            backend=self.backend,
+            device=self.device,
+            dtype=str(self.torch_dtype),
+            autocast=str(self.autocast_dtype),
+            sampler=self.sampler,
+            vae=self.vae_name,
+            width=self.width,
+            height=self.height,
+            **inputs
+        )
+    
+    def generate_frame(self, prompt: str, seed: int, negative_prompt: str = "",
+                       num_inference_steps: Optional[int] = None,
+                       guidance_scale: float = 7.5,
+                       init_image: Optional[Image.Image] = None,
+                       strength: float = 0.5) -> Image.Image:
         """
         生成单帧图像
         
+        启用结果缓存时，相同输入直接返回缓存的图像，不调用管线。
+        提供 init_image 时以图生图方式从该图像加噪后去噪，只执行 num_inference_steps * strength 步。
+        
         Args:
             prompt: 正向提示词
             seed: 随机种子
             negative_prompt: 负向提示词
+            num_inference_steps: 推理步数，为 None 时使用当前采样器的默认步数
+            guidance_scale: 引导尺度
+            init_image: 初始图像（通常为上一帧），为 None 时从纯噪声生成
+            strength: 图生图加噪强度 (0-1)，越小越接近初始图像、去噪步数越少
             
         Returns:
             生成的图像
@@ -129,119 +584,760 @@ class StoryGenerator:
         if self.pipe is None:
             raise ValueError("模型未加载，请先调用 load_model()")
         
-        generator = torch.Generator(device=self.device).manual_seed(seed)
+        num_inference_steps = num_inference_steps or self.num_inference_steps
         
         # 应用控制器权重
-        if self.controller.frame_prompt_express:
-            prompt = f"{prompt} {self.controller.frame_prompt_express}"
+        prompt, negative_prompt = self._apply_controller(prompt, negative_prompt)
         
-        if self.controller.frame_prompt_suppress:
-            suppress_text = " ".join(self.controller.frame_prompt_suppress)
-            negative_prompt = f"{negative_prompt} {suppress_text}".strip()
+        cache_key = None
+        if self.result_cache is not None:
+            with self._stage("cache"):
+                cache_key = self._cache_key(
+                    prompt=prompt,
+                    negative_prompt=negative_prompt,
+                    seed=seed,
+                    num_inference_steps=num_inference_steps,
+                    guidance_scale=guidance_scale,
+                    init_image=hashlib.sha256(init_image.tobytes()).hexdigest() if init_image else None,
+                    strength=strength if init_image else None
+                )
+                cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        self.ensure_components()
+        generator = torch.Generator(device=self.device).manual_seed(seed)
+        
+        autocast = (torch.autocast("cpu", dtype=self.autocast_dtype)
+                    if self.autocast_dtype is not None else contextlib.nullcontext())
+        
+        # 直接传入缓存的提示词嵌入，跳过管线内的重复编码
+        with self._stage("text_encode"):
+            pipe_kwargs = dict(
+                prompt_embeds=self.encode_prompt(prompt),
+                negative_prompt_embeds=self.encode_prompt(negative_prompt),
+                generator=generator,
+                num_inference_steps=num_inference_steps,
+                guidance_scale=guidance_scale,
+                output_type="np"
+            )
+        
+        if init_image is None:
+            pipe = self.pipe
+            pipe_kwargs.update(width=self.width, height=self.height)
+        else:
+            pipe = self._get_img2img_pipe()
+            pipe_kwargs.update(image=init_image, strength=strength)
+        
+        if self.tracer is not None:
+            pipe_kwargs.update(self.tracer.pipeline_callback_kwargs(pipe))
         
         # 生成图像
-        result = self.pipe(
-            prompt=prompt,
-            negative_prompt=negative_prompt,
-            generator=generator,
-            num_inference_steps=20,
-            guidance_scale=7.5
-        )
+        with autocast:
+            result = pipe(**pipe_kwargs)
+        
+        if self.tracer is not None:
+            self.tracer.end_pipeline()
+        
+        with self._stage("to_pil"):
+            image = pipe.numpy_to_pil(result.images)[0]
         
-        return result.images[0]
+        if cache_key is not None:
+            with self._stage("cache"):
+                self.result_cache.put(cache_key, image)
+        
+        return image
+    
+    def generate_batch(self, requests: List[Tuple[str, str, int]],
+                       num_inference_steps: Optional[int] = None,
+                       guidance_scale: float = 7.5) -> List[Image.Image]:
+        """
+        批量生成多帧
+        
+        提示词为已应用控制器权重的最终提示词（见 window_prompts），不再经过 controller。
+        与 generate_frame 共用结果缓存，只有未命中的帧进入同一次管线调用；
+        每帧使用各自种子的随机数生成器，初始噪声与单帧生成相同。
+        
+        Args:
+            requests: (正向提示词, 负向提示词, 种子) 列表
+            num_inference_steps: 推理步数，为 None 时使用当前采样器的默认步数
+            guidance_scale: 引导强度
+            
+        Returns:
+            与 requests 顺序一致的图像列表
+        """
+        if self.pipe is None:
+            raise ValueError("模型未加载，请先调用 load_model()")
+        
+        num_inference_steps = num_inference_steps or self.num_inference_steps
+        
+        images: List[Optional[Image.Image]] = [None] * len(requests)
+        keys: List[Optional[str]] = [None] * len(requests)
+        pending = []
+        for i, (prompt, negative_prompt, seed) in enumerate(requests):
+            if self.result_cache is not None:
+                keys[i] = self._cache_key(
+                    prompt=prompt,
+                    negative_prompt=negative_prompt,
+                    seed=seed,
+                    num_inference_steps=num_inference_steps,
+                    guidance_scale=guidance_scale,
+                    init_image=None,
+                    strength=None
+                )
+                images[i] = self.result_cache.get(keys[i])
+            if images[i] is None:
+                pending.append(i)
+        
+        if pending:
+            self.ensure_components()
+            autocast = (torch.autocast("cpu", dtype=self.autocast_dtype)
+                        if self.autocast_dtype is not None else contextlib.nullcontext())
+            
+            prompt_embeds = torch.cat([self.encode_prompt(requests[i][0]) for i in pending])
+            negative_embeds = torch.cat([self.encode_prompt(requests[i][1]) for i in pending])
+            generators = [torch.Generator(device=self.device).manual_seed(requests[i][2])
+                          for i in pending]
+            
+            with autocast:
+                result = self.pipe(
+                    prompt_embeds=prompt_embeds,
+                    negative_prompt_embeds=negative_embeds,
+                    generator=generators,
+                    num_inference_steps=num_inference_steps,
+                    guidance_scale=guidance_scale,
+                    width=self.width,
+                    height=self.height,
+                    output_type="np"
+                )
+            
+            for i, image in zip(pending, self.pipe.numpy_to_pil(result.images)):
+                images[i] = image
+                if keys[i] is not None:
+                    self.result_cache.put(keys[i], image)
+        
+        return images
+    
+    def window_prompts(self, id_prompt: str, window: List[str]) -> Tuple[str, str]:
+        """
+        返回提示窗口对应的最终正向/负向提示词（与 render_window 的组合方式相同）
+        
+        Args:
+            id_prompt: 身份提示词
+            window: 提示窗口
+            
+        Returns:
+            (正向提示词, 负向提示词)
+        """
+        self.controller.frame_prompt_express = window[0]
+        self.controller.frame_prompt_suppress = window[1:]
+        return self._apply_controller(f"{id_prompt} {' '.join(window)}", "")
+    
+    def frame_key(self, full_prompt: str, seed: int, path: str,
+                  num_inference_steps: Optional[int] = None,
+                  continuation_strength: Optional[float] = None,
+                  previous_key: Optional[str] = None) -> str:
+        """
+        计算帧清单中一帧的生成输入键
+        
+        续写模式下每帧从上一帧的图像出发，需传入上一帧的键，使任一帧的输入变化让其后的所有帧失效。
+        
+        Args:
+            full_prompt: 组合提示词（身份提示词 + 窗口）
+            seed: 该帧的随机种子
+            path: 输出路径
+            num_inference_steps: 推理步数，为 None 时使用当前采样器的默认步数
+            continuation_strength: 续写模式的加噪强度
+            previous_key: 续写模式下上一帧的键（首帧为 None）
+            
+        Returns:
+            生成输入的哈希键
+        """
+        inputs = dict(prompt=full_prompt, seed=seed,
+                      num_inference_steps=num_inference_steps or self.num_inference_steps,
+                      continuation_strength=continuation_strength,
+                      path=path)
+        if continuation_strength:
+            inputs['previous_key'] = previous_key
+        return self._cache_key(**inputs)
+    
+    def plan_windows(self, id_prompt: str, frame_list: List[str], window_len: int) -> CircularWindows:
+        """
+        规划提示窗口
+        
+        Args:
+            id_prompt: 身份提示词
+            frame_list: 帧提示词列表
+            window_len: 期望的窗口长度
+            
+        Returns:
+            按帧顺序排列的提示窗口列表
+        """
+        # 计算可用窗口长度
+        max_win = self.get_max_window_length(id_prompt, frame_list)
+        window_len = max(1, min(window_len, max_win))
+        
+        print(f"使用窗口长度: {window_len} (最大可用: {max_win})")
+        
+        # 生成提示窗口
+        prompt_windows = self.circular_sliding_windows(frame_list, window_len)
+        
+        print(f"生成 {len(prompt_windows)} 个窗口")
+        
+        return prompt_windows
+    
+    def render_window(self, id_prompt: str, window: List[str], seed: int,
+                      num_inference_steps: Optional[int] = None,
+                      init_image: Optional[Image.Image] = None,
+                      strength: float = 0.5) -> Image.Image:
+        """
+        按提示窗口生成一帧
+        
+        Args:
+            id_prompt: 身份提示词
+            window: 提示窗口，首个提示词为表达提示词，其余为抑制提示词
+            seed: 该帧的随机种子
+            num_inference_steps: 推理步数，为 None 时使用当前采样器的默认步数
+            init_image: 续写模式下的初始图像（上一帧）
+            strength: 续写模式的加噪强度
+            
+        Returns:
+            生成的图像
+        """
+        # 配置提示词权重
+        self.controller.frame_prompt_express = window[0]
+        self.controller.frame_prompt_suppress = window[1:]
+        
+        # 生成组合提示词
+        full_prompt = f"{id_prompt} {' '.join(window)}"
+        
+        return self.generate_frame(full_prompt, seed, num_inference_steps=num_inference_steps,
+                                   init_image=init_image, strength=strength)
+    
+    def iter_story_frames(self,
+                          id_prompt: str,
+                          frame_list: List[str],
+                          window_len: int,
+                          seed: int,
+                          save_dir: str = "./output",
+                          image_format: str = "png",
+                          compress_level: int = 6,
+                          save_frames: bool = True,
+                          video_path: Optional[str] = None,
+                          fps: int = 2,
+                          contact_sheet_path: Optional[str] = None,
+                          thumb_size: Optional[Tuple[int, int]] = None,
+                          sheet_backing: str = "memory",
+                          num_inference_steps: Optional[int] = None,
+                          continuation_strength: Optional[float] = None,
+                          trace_path: Optional[str] = None,
+                          resume: bool = True,
+                          manifest_flush_every: int = 16
+                          ) -> Iterator[Tuple[int, Image.Image]]:
+        """
+        流式滑动窗口故事生成
+        
+        每生成一帧立即送入单帧写入器、视频编码器和联系表合成器，再产出 (帧序号, 图像)；
+        除续写模式需要的上一帧外不保留已生成的图像，内存占用与故事长度无关。
+        提前停止迭代（或调用 close）时已写出的帧和清单记录都会保留。
+        参数含义见 movement_gen_story_slide_windows。
+        
+        Returns:
+            (帧序号, 图像) 迭代器
+            
+        Raises:
+            FrameWriteError: 单帧写入失败
+        """
+        if self.pipe is None:
+            raise ValueError("模型未加载，请先调用 load_model()")
+        
+        prompt_windows = self.plan_windows(id_prompt, frame_list, window_len)
+        n_frames = len(prompt_windows)
+        
+        if self.memory_profile.free_text_encoder:
+            # 先编码整个故事的提示词再释放文本编码器，顺序加载时 UNet / VAE 在此之后才加载
+            self.prepare_prompts(text for window in prompt_windows
+                                 for text in self.window_prompts(id_prompt, window))
+        
+        os.makedirs(save_dir, exist_ok=True)
+        writer = AsyncFrameWriter(image_format=image_format, compress_level=compress_level)
+        video = VideoSink(video_path, fps=fps) if video_path else None
+        sheet = (ContactSheetCompositor(n_frames, contact_sheet_path, thumb_size=thumb_size,
+                                        backing=sheet_backing)
+                 if contact_sheet_path and n_frames else None)
+        
+        manifest = (FrameManifest(os.path.join(save_dir, MANIFEST_NAME), flush_every=manifest_flush_every)
+                    if save_frames else None)
+        self.tracer = StoryTracer(trace_path) if trace_path else None
+        
+        previous = None
+        previous_key = None
+        skipped = 0
+        finished = False
+        try:
+            with writer:
+                for idx, window in enumerate(prompt_windows):
+                    if self.tracer is not None:
+                        self.tracer.start_frame(idx)
+                    
+                    full_prompt = f"{id_prompt} {' '.join(window)}"
+                    path = writer.frame_path(save_dir, idx)
+                    # 续写模式把上一帧的键串入本帧的键，前面任一帧变化时其后的帧都重新生成
+                    key = self.frame_key(full_prompt, seed + idx, path, num_inference_steps,
+                                         continuation_strength, previous_key)
+                    previous_key = key
+                    
+                    # 清单中已完成且校验通过的帧直接从磁盘读取
+                    data = manifest.read_verified(idx, key) if manifest is not None and resume else None
+                    if data is not None:
+                        print(f"跳过第 {idx + 1}/{n_frames} 帧（已完成）")
+                        image = decode_frame(data, path)
+                        skipped += 1
+                    else:
+                        print(f"生成第 {idx + 1}/{n_frames} 帧...")
+                        start = time.perf_counter()
+                        
+                        # 生成图像
+                        init_image = previous if continuation_strength else None
+                        image = self.render_window(id_prompt, window, seed + idx, num_inference_steps,
+                                                   init_image=init_image,
+                                                   strength=continuation_strength or 0.5)
+                        
+                        record = {
+                            'frame': idx,
+                            'key': key,
+                            'window': list(window),
+                            'full_prompt': full_prompt,
+                            'seed': seed + idx,
+                            'path': path,
+                            'render_seconds': time.perf_counter() - start
+                        }
+                        
+                        # 后台保存单帧，写盘完成后在写入线程中登记清单，出现写入错误时尽早停止；
+                        # 该阶段只计提交耗时（含背压阻塞），编码写盘耗时在汇总的后台耗时中报告
+                        if save_frames:
+                            with self._stage("save_submit"):
+                                writer.raise_if_failed()
+                                writer.submit(image, path, on_done=functools.partial(
+                                    manifest.append_written, record))
+                    previous = image
+                    
+                    if video is not None:
+                        with self._stage("video"):
+                            video.write(image)
+                    
+                    if sheet is not None:
+                        with self._stage("contact_sheet"):
+                            sheet.add(image)
+                    
+                    if self.tracer is not None:
+                        self.tracer.end_frame(seed=seed + idx)
+                    
+                    yield idx, image
+            finished = True
+        finally:
+            tracer, self.tracer = self.tracer, None
+            if manifest is not None:
+                manifest.close()
+            if video is not None:
+                video.close()
+            if sheet is not None:
+                # 提前关闭或出错时放弃未完成的联系表，释放画布和 .npy 文件句柄
+                if finished:
+                    sheet.close()
+                else:
+                    sheet.discard()
+            if tracer is not None:
+                # 写入器已随 with 块退出完成全部写入，提前关闭或出错时同样写出汇总
+                tracer.add_background("save_encode_write", writer.stats.encode_seconds)
+                self.last_trace_summary = tracer.close()
+        
+        if skipped:
+            print(f"断点续跑: 跳过 {skipped} 帧")
+        
+        if tracer is not None:
+            print_summary(self.last_trace_summary)
+        
+        if video is not None:
+            print(f"视频创建完成: {video.output_path}")
+        
+        if sheet is not None:
+            print(f"联系表创建完成: {contact_sheet_path}")
+        
+        self.last_writer_stats = writer.close()
+        print(f"单帧写入: {self.last_writer_stats['written']} 帧, "
+              f"背压阻塞 {self.last_writer_stats['blocked_seconds']:.2f} 秒")
+        
+        cache_stats = self.embedding_cache.stats()
+        print(f"提示词嵌入缓存: 命中 {cache_stats['hits']} 次, "
+              f"未命中 {cache_stats['misses']} 次")
+        
+        if self.result_cache is not None:
+            result_stats = self.result_cache.stats()
+            print(f"生成结果缓存: 命中 {result_stats['hits']} 次, "
+                  f"未命中 {result_stats['misses']} 次")
     
     def movement_gen_story_slide_windows(self, 
                                        id_prompt: str, 
                                        frame_list: List[str], 
                                        window_len: int, 
                                        seed: int, 
-                                       save_dir: str = "./output") -> List[Image.Image]:
+                                       save_dir: str = "./output",
+                                       image_format: str = "png",
+                                       compress_level: int = 6,
+                                       save_frames: bool = True,
+                                       video_path: Optional[str] = None,
+                                       fps: int = 2,
+                                       on_frame: Optional[Callable[[int, Image.Image], None]] = None,
+                                       num_inference_steps: Optional[int] = None,
+                                       continuation_strength: Optional[float] = None,
+                                       trace_path: Optional[str] = None,
+                                       resume: bool = True,
+                                       manifest_flush_every: int = 16,
+                                       contact_sheet_path: Optional[str] = None,
+                                       thumb_size: Optional[Tuple[int, int]] = None,
+                                       sheet_backing: str = "memory",
+                                       keep_images: bool = True
+                                       ) -> List[Image.Image]:
         """
         核心生成逻辑：滑动窗口故事生成
         
+        单帧由后台写入器编码保存，下一帧渲染时上一帧同时在写盘；
+        写入统计（含背压阻塞时间）保存在 last_writer_stats。
+        指定 video_path 时每帧生成后直接送入视频编码器，无需回读单帧文件。
+        保存单帧时每帧写盘完成后向 save_dir/manifest.jsonl 追加一条记录（窗口、提示词、种子、
+        路径、校验和、耗时），重新运行时跳过清单中生成输入一致且文件校验通过的帧。
+        基于 iter_story_frames 实现；超长故事可设置 keep_images=False 或直接使用 iter_story_frames，
+        避免在内存中保留全部帧。
+        
         Args:
             id_prompt: 身份提示词
             frame_list: 帧提示词列表
             window_len: 窗口长度
             seed: 随机种子
             save_dir: 保存目录
+            image_format: 单帧保存格式，png / webp / raw
+            compress_level: 压缩级别
+            save_frames: 是否保存单帧文件
+            video_path: 流式输出视频路径，为 None 时不生成视频
+            fps: 视频帧率
+            on_frame: 每帧生成后的回调，参数为 (帧序号, 图像)
+            num_inference_steps: 本故事的推理步数，为 None 时使用当前采样器的默认步数
+            continuation_strength: 续写模式的加噪强度；设置后除首帧外每帧都从上一帧图生图，
+                画面更连贯且每帧只需 num_inference_steps * strength 步
+            trace_path: 逐帧阶段耗时追踪 JSONL 路径，设置后同时写出 <trace_path>.summary.json，
+                汇总保存在 last_trace_summary
+            resume: 是否根据帧清单跳过已完成的帧
+            manifest_flush_every: 帧清单每累积多少条记录写盘一次
+            contact_sheet_path: 流式合成联系表的输出路径，为 None 时不合成
+            thumb_size: 联系表缩略图尺寸 (宽, 高)
+            sheet_backing: 联系表画布类型，memory / disk
+            keep_images: 是否在返回的列表中保留全部帧
             
         Returns:
-            生成的故事图像列表
+            生成的故事图像列表（keep_images=False 时为空列表）
+            
+        Raises:
+            FrameWriteError: 单帧写入失败
+        """
+        frames = self.iter_story_frames(
+            id_prompt, frame_list, window_len, seed,
+            save_dir=save_dir,
+            image_format=image_format,
+            compress_level=compress_level,
+            save_frames=save_frames,
+            video_path=video_path,
+            fps=fps,
+            contact_sheet_path=contact_sheet_path,
+            thumb_size=thumb_size,
+            sheet_backing=sheet_backing,
+            num_inference_steps=num_inference_steps,
+            continuation_strength=continuation_strength,
+            trace_path=trace_path,
+            resume=resume,
+            manifest_flush_every=manifest_flush_every
+        )
+        
+        story_images = []
+        with contextlib.closing(frames):
+            for idx, image in frames:
+                if on_frame is not None:
+                    on_frame(idx, image)
+                if keep_images:
+                    story_images.append(image)
+        
+        return story_images
+    
+    @contextlib.contextmanager
+    def _preview_settings(self, size: int, steps: int, tiny_vae: Optional[str],
+                          cache: Optional[GenerationCache]):
+        """临时切换到预览分辨率、步数、轻量 VAE 和预览缓存，退出时恢复"""
+        self.ensure_components()
+        # 替身管线等后端没有 VAE，跳过轻量 VAE 的替换和恢复
+        vae = getattr(self.pipe, "vae", None)
+        saved = (self.width, self.height, self.num_inference_steps, self.vae_name, self.result_cache)
+        
+        self.width = self.height = size
+        self.num_inference_steps = steps
+        self.result_cache = cache
+        if tiny_vae and vae is None:
+            print(f"当前管线没有 VAE，忽略轻量 VAE: {tiny_vae}")
+        elif tiny_vae:
+            if tiny_vae not in self._tiny_vaes:
+                from diffusers import AutoencoderTiny
+                
+                self._tiny_vaes[tiny_vae] = AutoencoderTiny.from_pretrained(
+                    tiny_vae, torch_dtype=self.torch_dtype
+                ).to(self.device)
+            self.pipe.vae = self._tiny_vaes[tiny_vae]
+            self.vae_name = tiny_vae
+        
+        try:
+            yield
+        finally:
+            (self.width, self.height, self.num_inference_steps,
+             self.vae_name, self.result_cache) = saved
+            if vae is not None:
+                self.pipe.vae = vae
+    
+    def preview_story(self, id_prompt: str, frame_list: List[str], window_len: int, seed: int,
+                      save_dir: str = "./output/preview",
+                      preview_size: int = 256,
+                      preview_steps: int = 8,
+                      tiny_vae: Optional[str] = None,
+                      cache_dir: Optional[str] = "./.story_cache/preview") -> List[Image.Image]:
+        """
+        快速预览：低分辨率、低步数生成整个故事
+        
+        每帧种子与正式生成相同（seed + 帧序号），审核通过的帧可用 render_approved 以完整质量重新生成。
+        预览结果缓存在 cache_dir，重复预览同一故事不再调用管线。
+        
+        Args:
+            id_prompt: 身份提示词
+            frame_list: 帧提示词列表
+            window_len: 窗口长度
+            seed: 随机种子
+            save_dir: 预览帧保存目录（同时输出 preview_sheet.png 联系表）
+            preview_size: 预览边长（需为 8 的倍数）
+            preview_steps: 预览推理步数
+            tiny_vae: 轻量 VAE 模型名称（如 "madebyollin/taesd"），为 None 时使用模型自带 VAE
+            cache_dir: 预览缓存目录，为 None 时不缓存
+            
+        Returns:
+            预览图像列表
         """
         if self.pipe is None:
             raise ValueError("模型未加载，请先调用 load_model()")
         
-        # 计算可用窗口长度
-        max_win = self.get_max_window_length(self.controller, id_prompt, frame_list)
-        window_len = min(window_len, max_win)
-        
-        print(f"使用窗口长度: {window_len} (最大可用: {max_win})")
+        cache = GenerationCache(cache_dir) if cache_dir else None
+        with self._preview_settings(preview_size, preview_steps, tiny_vae, cache):
+            previews = self.movement_gen_story_slide_windows(
+                id_prompt, frame_list, window_len, seed, save_dir=save_dir
+            )
         
-        # 生成提示窗口
-        prompt_windows = self.circular_sliding_windows(frame_list, window_len)
+        self.combine_story(previews, os.path.join(save_dir, "preview_sheet.png"))
         
-        print(f"生成 {len(prompt_windows)} 个窗口")
+        return previews
+    
+    def render_approved(self, id_prompt: str, frame_list: List[str], window_len: int, seed: int,
+                        approved: Iterable[int],
+                        save_dir: str = "./output",
+                        image_format: str = "png") -> Dict[int, Image.Image]:
+        """
+        以完整质量重新生成审核通过的帧
         
-        story_images = []
-        for idx, window in enumerate(prompt_windows):
-            print(f"生成第 {idx + 1}/{len(prompt_windows)} 帧...")
+        Args:
+            id_prompt: 身份提示词（与预览相同）
+            frame_list: 帧提示词列表（与预览相同）
+            window_len: 窗口长度（与预览相同）
+            seed: 随机种子（与预览相同）
+            approved: 审核通过的帧序号
+            save_dir: 保存目录
+            image_format: 单帧保存格式
             
-            # 配置提示词权重
-            self.controller.frame_prompt_express = window[0]
-            self.controller.frame_prompt_suppress = window[1:]
+        Returns:
+            帧序号到完整质量图像的映射
+        """
+        if self.pipe is None:
+            raise ValueError("模型未加载，请先调用 load_model()")
+        
+        prompt_windows = self.plan_windows(id_prompt, frame_list, window_len)
+        approved = sorted(set(approved))
+        
+        os.makedirs(save_dir, exist_ok=True)
+        images = {}
+        with AsyncFrameWriter(image_format=image_format) as writer:
+            for count, idx in enumerate(approved, 1):
+                print(f"重新生成第 {idx + 1} 帧 ({count}/{len(approved)})...")
+                images[idx] = self.render_window(id_prompt, prompt_windows[idx], seed + idx)
+                writer.raise_if_failed()
+                writer.submit(images[idx], writer.frame_path(save_dir, idx))
+        
+        return images
+    
+    def compare_continuation_mode(self, id_prompt: str, frame_list: List[str],
+                                  window_len: int = 3, seed: int = 42,
+                                  strength: float = 0.5) -> dict:
+        """
+        对比独立帧模式和续写模式
+        
+        两种模式各生成一遍故事（不保存单帧、不使用结果缓存），报告吞吐量、
+        每帧平均 UNet 步数（由逐步回调统计实际执行的步数，续写模式首帧仍为完整步数），
+        以及相邻帧平均 SSIM 作为连贯性指标。
+        
+        Args:
+            id_prompt: 身份提示词
+            frame_list: 帧提示词列表
+            window_len: 窗口长度
+            seed: 随机种子
+            strength: 续写模式的加噪强度
             
-            # 生成组合提示词
-            full_prompt = f"{id_prompt} {' '.join(window)}"
+        Returns:
+            两种模式的对比结果
+        """
+        result_cache, self.result_cache = self.result_cache, None
+        report = {}
+        
+        try:
+            with tempfile.TemporaryDirectory() as trace_dir:
+                for mode, continuation in (("independent", None), ("continuation", strength)):
+                    start = time.perf_counter()
+                    images = self.movement_gen_story_slide_windows(
+                        id_prompt, frame_list, window_len, seed,
+                        save_frames=False, continuation_strength=continuation,
+                        trace_path=os.path.join(trace_dir, f"{mode}.jsonl")
+                    )
+                    seconds = time.perf_counter() - start
+                    
+                    consistency = [ssim(a, b) for a, b in zip(images, images[1:])]
+                    report[mode] = {
+                        'frames': len(images),
+                        'seconds': seconds,
+                        'frames_per_second': len(images) / seconds,
+                        'unet_steps_per_frame': self.last_trace_summary['unet_steps'] / len(images),
+                        'consistency_ssim': sum(consistency) / len(consistency) if consistency else 1.0
+                    }
+        finally:
+            self.result_cache = result_cache
+        
+        print(f"\n{'模式':<14}{'帧/秒':>8}{'步/帧':>8}{'相邻帧SSIM':>12}")
+        for mode, row in report.items():
+            print(f"{mode:<14}{row['frames_per_second']:>8.2f}{row['unet_steps_per_frame']:>8.1f}"
+                  f"{row['consistency_ssim']:>12.3f}")
+        
+        return report
+    
+    def sweep_sampler_quality(self, prompt: str, seed: int = 42,
+                              samplers: Optional[List[str]] = None,
+                              step_counts: Tuple[int, ...] = (6, 8, 10, 12, 15),
+                              reference_steps: int = 20,
+                              min_ssim: float = 0.85) -> List[dict]:
+        """
+        采样器质量/速度扫描
+        
+        以默认调度器 reference_steps 步的结果为参照，逐个生成各采样器在较少步数下的图像，
+        记录耗时和与参照图像的 SSIM。扫描期间不使用结果缓存，结束后恢复原采样器。
+        
+        Args:
+            prompt: 测试提示词
+            seed: 随机种子
+            samplers: 要测试的采样器，默认测试全部
+            step_counts: 要测试的步数
+            reference_steps: 参照图像的步数
+            min_ssim: 推荐配置需达到的最低 SSIM
             
-            # 生成图像
-            image = self.generate_frame(full_prompt, seed + idx)
-            story_images.append(image)
+        Returns:
+            扫描结果列表，每项包含 sampler、steps、seconds、speedup、ssim
+        """
+        if self.pipe is None:
+            raise ValueError("模型未加载，请先调用 load_model()")
+        
+        samplers = samplers or list(SAMPLERS)
+        previous = (self.sampler, self.num_inference_steps)
+        result_cache, self.result_cache = self.result_cache, None
+        
+        try:
+            self.set_sampler("default")
+            start = time.perf_counter()
+            reference = self.generate_frame(prompt, seed, num_inference_steps=reference_steps)
+            reference_seconds = time.perf_counter() - start
             
-            # 保存单帧
-            image.save(f"{save_dir}/frame_{idx:03d}.png")
+            rows = []
+            for name in samplers:
+                self.set_sampler(name)
+                for steps in step_counts:
+                    start = time.perf_counter()
+                    image = self.generate_frame(prompt, seed, num_inference_steps=steps)
+                    seconds = time.perf_counter() - start
+                    rows.append({
+                        'sampler': name,
+                        'steps': steps,
+                        'seconds': seconds,
+                        'speedup': reference_seconds / seconds,
+                        'ssim': ssim(reference, image)
+                    })
+        finally:
+            self.set_sampler(*previous)
+            self.result_cache = result_cache
         
-        return story_images
+        print(f"\n参照: default {reference_steps} 步, {reference_seconds:.2f} 秒")
+        print(f"{'采样器':<14}{'步数':>6}{'秒':>8}{'加速':>8}{'SSIM':>8}")
+        for row in rows:
+            print(f"{row['sampler']:<14}{row['steps']:>6}{row['seconds']:>8.2f}"
+                  f"{row['speedup']:>8.2f}{row['ssim']:>8.3f}")
+        
+        acceptable = [row for row in rows if row['ssim'] >= min_ssim]
+        if acceptable:
+            best = min(acceptable, key=lambda row: row['seconds'])
+            print(f"推荐: {best['sampler']} {best['steps']} 步 (SSIM {best['ssim']:.3f})")
+        
+        return rows
     
-    def combine_story(self, images: List[Image.Image], 
-                     output_path: str = "./output/story_combined.png") -> Image.Image:
+    def combine_story(self, images: Iterable[Image.Image], 
+                     output_path: str = "./output/story_combined.png",
+                     n_frames: Optional[int] = None,
+                     thumb_size: Optional[Tuple[int, int]] = None,
+                     pyramid_levels: int = 0,
+                     backing: str = "memory") -> Optional[Image.Image]:
         """
         合成故事图像
         
+        逐帧写入预分配的画布，输入可以是迭代器，不需要同时持有全部帧。
+        backing="disk" 时画布为磁盘映射的 .npy 文件，适合数百帧的大尺寸联系表。
+        
         Args:
-            images: 图像列表
+            images: 图像列表或迭代器
             output_path: 输出路径
+            n_frames: 帧数，images 为迭代器时必须提供
+            thumb_size: 缩略图尺寸 (宽, 高)，为 None 时使用原始尺寸
+            pyramid_levels: 额外生成的金字塔层数（story_combined_L1.png ...）
+            backing: 画布类型，memory / disk
             
         Returns:
-            合成的图像
+            合成的图像（disk 模式返回 None）
         """
-        if not images:
-            raise ValueError("图像列表为空")
-        
-        # 计算布局
-        n = len(images)
-        cols = int(math.ceil(math.sqrt(n)))
-        rows = int(math.ceil(n / cols))
+        if n_frames is None:
+            if not hasattr(images, '__len__'):
+                raise ValueError("images 为迭代器时需要提供 n_frames")
+            n_frames = len(images)
         
-        # 获取图像尺寸
-        img_width, img_height = images[0].size
+        if n_frames == 0:
+            raise ValueError("图像列表为空")
         
-        # 创建画布
-        canvas_width = cols * img_width
-        canvas_height = rows * img_height
-        canvas = Image.new('RGB', (canvas_width, canvas_height), 'white')
+        compositor = ContactSheetCompositor(
+            n_frames,
+            output_path,
+            thumb_size=thumb_size,
+            pyramid_levels=pyramid_levels,
+            backing=backing
+        )
         
         # 拼接图像
-        for idx, img in enumerate(images):
-            row = idx // cols
-            col = idx % cols
-            x = col * img_width
-            y = row * img_height
-            canvas.paste(img, (x, y))
+        for img in images:
+            compositor.add(img)
         
-        # 保存合成图像
-        canvas.save(output_path)
-        print(f"故事合成完成: {output_path}")
+        canvas = compositor.close()
+        print(f"故事合成完成: {', '.join(compositor.outputs)}")
         
         return canvas
     
@@ -262,20 +1358,36 @@ class StoryGenerator:
         if not image_paths:
             raise ValueError("图像路径列表为空")
         
-        # 读取第一张图像获取尺寸
-        first_img = cv2.imread(image_paths[0])
-        height, width, layers = first_img.shape
+        # 写入帧
+        with VideoSink(output_path, fps=fps) as video:
+            for img_path in image_paths:
+                video.write(cv2.imread(img_path), bgr=True)
         
-        # 创建视频写入器
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        video = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+        print(f"视频创建完成: {output_path}")
         
-        # 写入帧
-        for img_path in image_paths:
-            img = cv2.imread(img_path)
-            video.write(img)
+        return output_path
+    
+    def create_video_from_frames(self, frames: Iterable[Image.Image],
+                                 output_path: str = "./output/story_video.mp4",
+                                 fps: int = 2) -> str:
+        """
+        从内存中的帧流式创建视频文件
+        
+        Args:
+            frames: 帧迭代器（PIL 图像或 RGB 数组），逐帧消费
+            output_path: 输出视频路径
+            fps: 帧率
+            
+        Returns:
+            视频文件路径
+        """
+        with VideoSink(output_path, fps=fps) as video:
+            for frame in frames:
+                video.write(frame)
+        
+        if video.frames_written == 0:
+            raise ValueError("帧序列为空")
         
-        video.release()
         print(f"视频创建完成: {output_path}")
         
         return output_path
@@ -316,7 +1428,8 @@ def demo_story_generation():
             frame_list=frame_prompts,
             window_len=3,  # 3帧窗口
             seed=42,
-            save_dir="./output"
+            save_dir="./output",
+            video_path="./output/story_video.mp4"
         )
         
         # 合成故事
@@ -326,6 +1439,7 @@ def demo_story_generation():
         print("输出文件:")
         print("- 单帧图像: ./output/frame_*.png")
         print("- 合成图像: ./output/story_combined.png")
+        print("- 故事视频: ./output/story_video.mp4")
         
     except Exception as e:
         print(f"生成过程中出现错误: {e}")
@@ -6,10 +6,13 @@
 """
 
 import math
-from typing import List
+from typing import Iterator, List
 from dataclasses import dataclass
 import os
 
+from window_planner import CircularWindows, WindowLengthPlanner
+from story_manifest import MANIFEST_NAME, FrameManifest, frame_key
+
 
 @dataclass
 class UNetController:
@@ -27,11 +30,15 @@ class StoryGeneratorDemo:
     
     def __init__(self):
         self.controller = UNetController()
+        # 演示版的组合提示词不追加强调词
+        self.window_planner = WindowLengthPlanner(include_express=False)
     
     def get_max_window_length(self, id_prompt: str, frame_prompt_list: List[str]) -> int:
         """
         计算最大窗口长度（防止提示词过长）
         
+        按估算的 token 数（见 estimate_token_count）返回在每个起始位置都不超出上限的窗口长度。
+        
         Args:
             id_prompt: 身份提示词
             frame_prompt_list: 帧提示词列表
@@ -39,113 +46,110 @@ class StoryGeneratorDemo:
         Returns:
             最大可用窗口长度
         """
-        combined_prompt = id_prompt
-        max_len = 0
-        
-        for prompt in frame_prompt_list:
-            combined_prompt += ' ' + prompt
-            if len(combined_prompt.split()) >= 77:  # 标准token限制
-                break
-            max_len += 1
-        
-        return max_len
+        return self.window_planner.max_window_length(id_prompt, frame_prompt_list)
     
-    def circular_sliding_windows(self, lst: List, w: int) -> List[List]:
+    def circular_sliding_windows(self, lst: List, w: int) -> CircularWindows:
         """
         循环滑动窗口生成
         
+        返回惰性视图，窗口按下标即时构造，不复制提示词。
+        
         Args:
             lst: 输入列表
             w: 窗口大小
             
         Returns:
-            滑动窗口列表
+            滑动窗口序列（可按下标访问和迭代，每个窗口为长度 w 的序列）
         """
-        n = len(lst)
-        if n == 0:
-            return []
+        return CircularWindows(lst, w)
+    
+    def iter_story_frames(self,
+                          id_prompt: str,
+                          frame_list: List[str],
+                          window_len: int,
+                          seed: int,
+                          save_dir: str = "./output",
+                          resume: bool = True) -> Iterator[dict]:
+        """
+        流式滑动窗口故事生成（演示版）
+        
+        逐帧产出帧信息，不保留已生成的帧；参数含义见 movement_gen_story_slide_windows。
+        
+        Returns:
+            帧信息迭代器
+        """
+        # 计算可用窗口长度
+        max_win = self.get_max_window_length(id_prompt, frame_list)
+        window_len = max(1, min(window_len, max_win))
+        
+        print(f"使用窗口长度: {window_len} (最大可用: {max_win})")
+        
+        # 生成提示窗口
+        prompt_windows = self.circular_sliding_windows(frame_list, window_len)
+        
+        print(f"生成 {len(prompt_windows)} 个窗口")
         
-        windows = []
-        for i in range(n):
-            window = []
-            for j in range(w):
-                window.append(lst[(i + j) % n])
-            windows.append(window)
+        skipped = 0
+        with FrameManifest(os.path.join(save_dir, MANIFEST_NAME)) as manifest:
+            for idx, window in enumerate(prompt_windows):
+                # 配置提示词权重
+                self.controller.frame_prompt_express = window[0]
+                self.controller.frame_prompt_suppress = window[1:]
+                
+                # 生成组合提示词
+                full_prompt = f"{id_prompt} {' '.join(window)}"
+                
+                # 模拟生成结果
+                frame_info = {
+                    'frame_id': idx,
+                    'window': list(window),
+                    'express_prompt': self.controller.frame_prompt_express,
+                    'suppress_prompts': self.controller.frame_prompt_suppress,
+                    'full_prompt': full_prompt,
+                    'seed': seed + idx,
+                    'simulated_image_path': f"{save_dir}/frame_{idx:03d}.png"
+                }
+                
+                key = frame_key(prompt=full_prompt, seed=seed + idx)
+                if resume and manifest.is_complete(idx, key):
+                    skipped += 1
+                else:
+                    print(f"生成第 {idx + 1}/{len(prompt_windows)} 帧...")
+                    
+                    # 追加帧信息到清单
+                    manifest.append(dict(frame_info, frame=idx, key=key,
+                                         path=frame_info['simulated_image_path'], sha256=None))
+                
+                yield frame_info
         
-        return windows
+        if skipped:
+            print(f"断点续跑: 跳过 {skipped} 帧")
     
     def movement_gen_story_slide_windows(self, 
                                        id_prompt: str, 
                                        frame_list: List[str], 
                                        window_len: int, 
                                        seed: int, 
-                                       save_dir: str = "./output") -> List[dict]:
+                                       save_dir: str = "./output",
+                                       resume: bool = True) -> List[dict]:
         """
         核心生成逻辑：滑动窗口故事生成（演示版）
         
+        每帧信息追加到 save_dir/manifest.jsonl，重新运行时清单中输入一致的帧不再重复记录。
+        
         Args:
             id_prompt: 身份提示词
             frame_list: 帧提示词列表
             window_len: 窗口长度
             seed: 随机种子
             save_dir: 保存目录
+            resume: 是否跳过清单中已完成的帧
             
         Returns:
             生成的故事帧信息列表
         """
-        # 计算可用窗口长度
-        max_win = self.get_max_window_length(self.controller, id_prompt, frame_list)
-        window_len = min(window_len, max_win)
-        
-        print(f"使用窗口长度: {window_len} (最大可用: {max_win})")
-        
-        # 生成提示窗口
-        prompt_windows = self.circular_sliding_windows(frame_list, window_len)
-        
-        print(f"生成 {len(prompt_windows)} 个窗口")
-        
-        story_frames = []
-        for idx, window in enumerate(prompt_windows):
-            print(f"生成第 {idx + 1}/{len(prompt_windows)} 帧...")
-            
-            # 配置提示词权重
-            self.controller.frame_prompt_express = window[0]
-            self.controller.frame_prompt_suppress = window[1:]
-            
-            # 生成组合提示词
-            full_prompt = f"{id_prompt} {' '.join(window)}"
-            
-            # 模拟生成结果
-            frame_info = {
-                'frame_id': idx,
-                'window': window,
-                'express_prompt': self.controller.frame_prompt_express,
-                'suppress_prompts': self.controller.frame_prompt_suppress,
-                'full_prompt': full_prompt,
-                'seed': seed + idx,
-                'simulated_image_path': f"{save_dir}/frame_{idx:03d}.png"
-            }
-            
-            story_frames.append(frame_info)
-            
-            # 保存提示词信息到文件
-            self.save_frame_info(frame_info, save_dir, idx)
-        
-        return story_frames
-    
-    def save_frame_info(self, frame_info: dict, save_dir: str, idx: int):
-        """保存帧信息到文件"""
-        os.makedirs(save_dir, exist_ok=True)
-        
-        info_file = f"{save_dir}/frame_{idx:03d}_info.txt"
-        with open(info_file, 'w', encoding='utf-8') as f:
-            f.write(f"帧ID: {frame_info['frame_id']}\n")
-            f.write(f"窗口内容: {frame_info['window']}\n")
-            f.write(f"表达提示词: {frame_info['express_prompt']}\n")
-            f.write(f"抑制提示词: {frame_info['suppress_prompts']}\n")
-            f.write(f"完整提示词: {frame_info['full_prompt']}\n")
-            f.write(f"随机种子: {frame_info['seed']}\n")
-            f.write(f"图像路径: {frame_info['simulated_image_path']}\n")
+        return list(self.iter_story_frames(id_prompt, frame_list, window_len, seed,
+                                           save_dir=save_dir, resume=resume))
     
     def analyze_story_flow(self, story_frames: List[dict]):
         """分析故事流程"""
@@ -228,7 +232,7 @@ def demo_basic_functionality():
     print(f"\n=== 生成完成 ===")
     print(f"共生成 {len(story_frames)} 帧")
     print("输出文件:")
-    print("- 帧信息: ./output/frame_*_info.txt")
+    print("- 帧清单: ./output/manifest.jsonl")
     print("- 模拟图像路径: ./output/frame_*.png")
 
 
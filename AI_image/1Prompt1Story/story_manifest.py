@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+帧清单
+以追加写入的 JSONL 记录每帧的窗口、提示词、种子、输出路径、校验和与耗时，
+中断后重新运行时据此跳过已完成且校验通过的帧
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+
+MANIFEST_NAME = "manifest.jsonl"
+
+
+def frame_key(**inputs) -> str:
+    """
+    由一帧的生成输入计算哈希键
+
+    Args:
+        **inputs: 决定该帧结果的全部输入（提示词、种子、步数等）
+
+    Returns:
+        输入的 SHA-256 十六进制摘要
+    """
+    payload = json.dumps(inputs, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class FrameManifest:
+    """追加写入的帧清单，记录分批刷盘"""
+
+    def __init__(self, path: str, flush_every: int = 16, fsync: bool = True):
+        """
+        打开帧清单并载入已有记录
+
+        同一帧有多条记录时以最后一条为准；进程崩溃留下的半行记录会被忽略。
+
+        Args:
+            path: 清单 JSONL 路径
+            flush_every: 每累积多少条记录写盘一次
+            fsync: 写盘后是否 fsync，保证断电后已写记录不丢失
+        """
+        self.path = path
+        self.flush_every = max(1, flush_every)
+        self.fsync = fsync
+        # 打开时从已有清单载入的记录；本次运行追加的记录写盘后不再保留，内存占用不随故事长度增长
+        self.records: Dict[int, dict] = {}
+
+        self._buffer: List[str] = []
+        self._lock = threading.Lock()
+
+        self._load()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def _load(self):
+        """读取已有清单"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        self.records[int(record['frame'])] = record
+                    except (ValueError, KeyError, TypeError):
+                        continue
+        except FileNotFoundError:
+            pass
+
+    def read_verified(self, frame: int, key: str) -> Optional[bytes]:
+        """
+        读取已完成帧的输出文件
+
+        Args:
+            frame: 帧序号
+            key: 本次运行该帧生成输入的哈希键
+
+        Returns:
+            文件字节；没有记录、生成输入不一致、文件缺失或校验和不符时返回 None
+        """
+        record = self.records.get(frame)
+        if record is None or record.get('key') != key or not record.get('sha256'):
+            return None
+        try:
+            with open(record['path'], 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        return data if hashlib.sha256(data).hexdigest() == record['sha256'] else None
+
+    def is_complete(self, frame: int, key: str) -> bool:
+        """
+        判断某帧是否已完成
+
+        要求清单中有该帧的记录且生成输入的键一致；记录带校验和时输出文件还必须存在且校验通过。
+
+        Args:
+            frame: 帧序号
+            key: 本次运行该帧生成输入的哈希键
+
+        Returns:
+            是否可以跳过该帧
+        """
+        record = self.records.get(frame)
+        if record is None or record.get('key') != key:
+            return False
+        if record.get('sha256') is None:
+            # 没有输出文件的记录（如演示版）只比对生成输入
+            return True
+        return self.read_verified(frame, key) is not None
+
+    def append(self, record: dict):
+        """
+        追加一条帧记录（线程安全），累积到 flush_every 条时写盘
+
+        追加的记录只用于下次运行续跑，不加入 records。
+
+        Args:
+            record: 帧记录，至少包含 frame、key、path、sha256
+        """
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._buffer.append(line)
+            if len(self._buffer) >= self.flush_every:
+                self._flush_locked()
+
+    def append_written(self, record: dict, path: str, data: bytes):
+        """
+        补充输出文件的校验和与大小后追加记录
+
+        可直接作为 AsyncFrameWriter.submit 的 on_done 回调（配合 functools.partial 绑定 record）。
+
+        Args:
+            record: 帧记录
+            path: 输出路径
+            data: 写入的文件字节
+        """
+        self.append(dict(record, sha256=hashlib.sha256(data).hexdigest(), bytes=len(data)))
+
+    def _flush_locked(self):
+        if not self._buffer or self._file is None:
+            return
+        self._file.write("".join(self._buffer))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._buffer = []
+
+    def flush(self):
+        """立即写出缓冲的记录"""
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        """写出剩余记录并关闭文件"""
+        with self._lock:
+            self._flush_locked()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
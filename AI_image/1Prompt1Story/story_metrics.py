@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图像质量指标
+用于比较不同生成配置下的帧图像
+"""
+
+from typing import Union
+
+import numpy as np
+from PIL import Image
+
+
+def _to_gray(image: Union[Image.Image, np.ndarray]) -> np.ndarray:
+    """转换为 float64 灰度数组"""
+    if isinstance(image, np.ndarray):
+        image = Image.fromarray(image)
+    return np.asarray(image.convert('L'), dtype=np.float64)
+
+
+def _box_filter(x: np.ndarray, size: int) -> np.ndarray:
+    """用二维前缀和计算 size x size 均值滤波（边缘镜像填充）"""
+    pad = size // 2
+    x = np.pad(x, pad, mode='reflect')
+    c = np.pad(x.cumsum(axis=0).cumsum(axis=1), ((1, 0), (1, 0)))
+    total = c[size:, size:] - c[:-size, size:] - c[size:, :-size] + c[:-size, :-size]
+    return total / (size * size)
+
+
+def ssim(image_a: Union[Image.Image, np.ndarray],
+         image_b: Union[Image.Image, np.ndarray],
+         window_size: int = 7) -> float:
+    """
+    计算两张图像的结构相似度（SSIM，灰度，均值窗口）
+
+    Args:
+        image_a: 图像 A
+        image_b: 图像 B（尺寸需与 A 相同）
+        window_size: 局部窗口边长
+
+    Returns:
+        平均 SSIM，1.0 表示完全相同
+    """
+    a = _to_gray(image_a)
+    b = _to_gray(image_b)
+    if a.shape != b.shape:
+        raise ValueError(f"图像尺寸不一致: {a.shape} != {b.shape}")
+
+    c1 = (0.01 * 255) ** 2
+    c2 = (0.03 * 255) ** 2
+
+    mu_a = _box_filter(a, window_size)
+    mu_b = _box_filter(b, window_size)
+    var_a = _box_filter(a * a, window_size) - mu_a * mu_a
+    var_b = _box_filter(b * b, window_size) - mu_b * mu_b
+    cov = _box_filter(a * b, window_size) - mu_a * mu_b
+
+    ssim_map = ((2 * mu_a * mu_b + c1) * (2 * cov + c2)) / \
+               ((mu_a * mu_a + mu_b * mu_b + c1) * (var_a + var_b + c2))
+    return float(ssim_map.mean())
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多进程分片故事生成
+把滑动窗口切分给多个工作进程，每个进程持有独立的管线和线程数，结果按帧序重组
+"""
+
+import dataclasses
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple, Union
+
+import torch
+from PIL import Image
+
+from frame_sinks import AsyncFrameWriter
+from story_generator import CPU_PROFILES, CPUProfile, MemoryProfile, StoryGenerator
+
+
+# 工作进程内常驻的生成器
+_worker_generator: Optional[StoryGenerator] = None
+
+
+def _init_worker(model_name: str, cache_dir: Optional[str], num_threads: int, settings: dict):
+    """工作进程初始化：设置算子线程数，按父进程的配置加载模型并切换采样器"""
+    global _worker_generator
+    
+    torch.set_num_threads(num_threads)
+    torch.set_num_interop_threads(1)
+    
+    _worker_generator = StoryGenerator(model_name, cache_dir=cache_dir)
+    if not _worker_generator.load_model(cpu_profile=settings['cpu_profile'],
+                                        backend=settings['backend'],
+                                        memory_profile=settings['memory_profile'],
+                                        **settings['backend_options']):
+        raise RuntimeError(f"工作进程 {os.getpid()} 模型加载失败")
+    _worker_generator.set_sampler(settings['sampler'], settings['num_inference_steps'])
+
+
+def _render_shard(id_prompt: str, shard: List[Tuple[int, List[str]]],
+                  seed: int) -> List[Tuple[int, Image.Image]]:
+    """在工作进程中生成一个分片，每帧种子与串行生成相同（seed + 帧序号）"""
+    return [(idx, _worker_generator.render_window(id_prompt, window, seed + idx))
+            for idx, window in shard]
+
+
+class ShardedStoryRenderer:
+    """多进程分片渲染器"""
+    
+    def __init__(self, model_name: str = "runwayml/stable-diffusion-v1-5",
+                 num_workers: Optional[int] = None,
+                 threads_per_worker: Optional[int] = None,
+                 cache_dir: Optional[str] = None,
+                 cpu_profile: Union[str, CPUProfile, None] = None,
+                 backend: str = "diffusers",
+                 memory_profile: Union[str, MemoryProfile, None] = None,
+                 sampler: str = "default",
+                 num_inference_steps: Optional[int] = None,
+                 **backend_options):
+        """
+        初始化渲染器
+        
+        各工作进程以相同的后端、CPU 配置、内存配置和采样器加载模型，输出才与同样配置的串行生成一致。
+        
+        Args:
+            model_name: 使用的扩散模型名称
+            num_workers: 工作进程数，默认按每进程 4 个线程划分 CPU 核心
+            threads_per_worker: 每个进程的算子线程数，默认均分 CPU 核心
+            cache_dir: 生成结果缓存目录（各进程共享）
+            cpu_profile: CPU推理配置（见 StoryGenerator.load_model），线程数和绑核由分片设置决定
+            backend: BACKENDS 中的后端名称
+            memory_profile: 内存配置（见 StoryGenerator.load_model）
+            sampler: SAMPLERS 中的采样器名称
+            num_inference_steps: 推理步数，为 None 时使用默认步数
+            **backend_options: 传给后端加载函数的参数
+        """
+        cpu_count = os.cpu_count() or 1
+        self.model_name = model_name
+        self.num_workers = num_workers or max(1, cpu_count // 4)
+        self.threads_per_worker = threads_per_worker or max(1, cpu_count // self.num_workers)
+        self.cache_dir = cache_dir
+        
+        if isinstance(cpu_profile, str):
+            if cpu_profile not in CPU_PROFILES:
+                raise ValueError(f"未知的CPU配置: {cpu_profile}")
+            cpu_profile = CPU_PROFILES[cpu_profile]
+        if cpu_profile is not None:
+            # 配置中的线程数和绑核会覆盖分片的线程划分，且各进程会绑定到同一组核心
+            cpu_profile = dataclasses.replace(cpu_profile, num_threads=None, pin_threads=False)
+        
+        # 传给各工作进程的加载配置
+        self.settings = {
+            'cpu_profile': cpu_profile,
+            'backend': backend,
+            'memory_profile': memory_profile,
+            'backend_options': backend_options,
+            'sampler': sampler,
+            'num_inference_steps': num_inference_steps,
+        }
+        
+        # 父进程只加载 tokenizer 用于规划窗口
+        self.planner = StoryGenerator(model_name)
+        self.planner.load_tokenizer()
+    
+    def iter_frames(self, id_prompt: str, frame_list: List[str], window_len: int,
+                    seed: int, shard_size: Optional[int] = None) -> Iterator[Tuple[int, Image.Image]]:
+        """
+        分片生成并按帧序产出结果
+        
+        Args:
+            id_prompt: 身份提示词
+            frame_list: 帧提示词列表
+            window_len: 窗口长度
+            seed: 随机种子
+            shard_size: 每个分片的窗口数，默认把全部窗口均分给各进程
+            
+        Returns:
+            按帧序排列的 (帧序号, 图像) 迭代器
+        """
+        prompt_windows = self.planner.plan_windows(id_prompt, frame_list, window_len)
+        indexed = list(enumerate(prompt_windows))
+        shard_size = shard_size or max(1, -(-len(indexed) // self.num_workers))
+        shards = [indexed[i:i + shard_size] for i in range(0, len(indexed), shard_size)]
+        
+        print(f"分片生成: {len(shards)} 个分片, {self.num_workers} 个进程, "
+              f"每进程 {self.threads_per_worker} 个线程")
+        
+        # spawn 避免 fork 继承父进程的 OpenMP 线程状态
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=self.num_workers,
+                                 mp_context=context,
+                                 initializer=_init_worker,
+                                 initargs=(self.model_name, self.cache_dir,
+                                           self.threads_per_worker, self.settings)) as pool:
+            futures = [pool.submit(_render_shard, id_prompt, shard, seed) for shard in shards]
+            # 分片按帧序提交，依次等待即可按序产出，后续分片在此期间继续并行生成
+            for future in futures:
+                for idx, image in future.result():
+                    yield idx, image
+    
+    def render(self, id_prompt: str, frame_list: List[str], window_len: int, seed: int,
+               save_dir: str = "./output", image_format: str = "png",
+               shard_size: Optional[int] = None) -> List[Image.Image]:
+        """
+        分片生成故事并保存单帧，输出与 StoryGenerator 串行生成一致
+        
+        Args:
+            id_prompt: 身份提示词
+            frame_list: 帧提示词列表
+            window_len: 窗口长度
+            seed: 随机种子
+            save_dir: 保存目录
+            image_format: 单帧保存格式
+            shard_size: 每个分片的窗口数
+            
+        Returns:
+            按帧序排列的故事图像列表
+        """
+        os.makedirs(save_dir, exist_ok=True)
+        start = time.perf_counter()
+        
+        story_images = []
+        with AsyncFrameWriter(image_format=image_format) as writer:
+            for idx, image in self.iter_frames(id_prompt, frame_list, window_len, seed, shard_size):
+                story_images.append(image)
+                writer.raise_if_failed()
+                writer.submit(image, writer.frame_path(save_dir, idx))
+        
+        elapsed = time.perf_counter() - start
+        print(f"分片生成完成: {len(story_images)} 帧, 共 {elapsed:.2f} 秒")
+        
+        return story_images
+
+
+def demo_sharded_generation():
+    """演示多进程分片生成"""
+    print("=== 多进程分片故事生成演示 ===\n")
+    
+    renderer = ShardedStoryRenderer()
+    
+    id_prompt = "一个勇敢的年轻骑士"
+    frame_prompts = [
+        "在森林中骑马前行",
+        "发现一座古老的城堡",
+        "进入城堡探索",
+        "遇到神秘的魔法师",
+        "与魔法师交谈",
+        "获得神秘的魔法剑",
+        "离开城堡继续冒险",
+        "在夕阳下骑马回家"
+    ]
+    
+    try:
+        story_images = renderer.render(id_prompt, frame_prompts, window_len=3, seed=42,
+                                       save_dir="./output")
+        print(f"\n故事生成完成！共生成 {len(story_images)} 帧")
+    except Exception as e:
+        print(f"生成过程中出现错误: {e}")
+
+
+if __name__ == "__main__":
+    demo_sharded_generation()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+生成过程追踪
+按阶段计时（文本编码、UNet 去噪、VAE 解码、PIL 转换、保存）并采样内存，
+输出逐帧 JSONL 追踪和汇总统计
+"""
+
+import contextlib
+import inspect
+import json
+import os
+import resource
+import sys
+import time
+from typing import Dict, List, Optional
+
+import torch
+
+
+def current_rss_mb() -> Optional[float]:
+    """读取当前常驻内存（MB），仅支持 Linux"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss_mb() -> float:
+    """返回进程的峰值常驻内存（MB）"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _percentile(values: List[float], q: float) -> float:
+    """最近秩法百分位数"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))
+    return ordered[index]
+
+
+class StoryTracer:
+    """分阶段计时与内存采样"""
+
+    def __init__(self, trace_path: Optional[str] = None):
+        """
+        初始化追踪器
+
+        Args:
+            trace_path: 逐帧追踪 JSONL 输出路径，为 None 时只在内存中汇总
+        """
+        self.trace_path = trace_path
+        self.records: List[dict] = []
+
+        self._file = open(trace_path, 'w', encoding='utf-8') if trace_path else None
+        self._frame: Optional[dict] = None
+        self._frame_start = 0.0
+        self._step_times: List[float] = []
+        self._cuda = torch.cuda.is_available()
+        # 在后台线程中进行、不计入逐帧阶段的耗时（如单帧编码写盘）
+        self.background: Dict[str, float] = {}
+
+    def start_frame(self, idx: int):
+        """开始记录一帧"""
+        self._frame = {'frame': idx, 'stages': {}}
+        self._frame_start = time.perf_counter()
+        self._step_times = []
+        if self._cuda:
+            torch.cuda.reset_peak_memory_stats()
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """对一个阶段计时，同一帧内的同名阶段累加"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - start)
+
+    def add_stage(self, name: str, seconds: float):
+        """累加一帧中某阶段的耗时"""
+        if self._frame is not None:
+            stages = self._frame['stages']
+            stages[name] = stages.get(name, 0.0) + seconds
+
+    def add_background(self, name: str, seconds: float):
+        """累加后台线程中某项工作的总耗时，计入汇总的 background_seconds"""
+        self.background[name] = self.background.get(name, 0.0) + seconds
+
+    def pipeline_callback_kwargs(self, pipe) -> dict:
+        """
+        返回挂接管线逐步回调所需的参数
+
+        新版 diffusers 使用 callback_on_step_end，旧版使用 callback/callback_steps。
+        """
+        self._step_times = [time.perf_counter()]
+        parameters = inspect.signature(pipe.__call__).parameters
+
+        if 'callback_on_step_end' in parameters:
+            def on_step_end(pipeline, step, timestep, callback_kwargs):
+                self._step_times.append(time.perf_counter())
+                return callback_kwargs
+            return {'callback_on_step_end': on_step_end}
+
+        def on_step(step, timestep, latents):
+            self._step_times.append(time.perf_counter())
+        return {'callback': on_step, 'callback_steps': 1}
+
+    def end_pipeline(self):
+        """
+        管线返回后调用：管线开始到最后一步结束计为 unet，
+        最后一步结束到返回计为 vae_decode
+        """
+        now = time.perf_counter()
+        if len(self._step_times) > 1:
+            self.add_stage('unet', self._step_times[-1] - self._step_times[0])
+            self.add_stage('vae_decode', now - self._step_times[-1])
+            if self._frame is not None:
+                self._frame['step_seconds'] = [round(b - a, 6) for a, b in
+                                               zip(self._step_times, self._step_times[1:])]
+        else:
+            self.add_stage('unet', now - self._step_times[0] if self._step_times else 0.0)
+
+    def end_frame(self, **extra):
+        """结束一帧：采样内存并写出追踪记录"""
+        if self._frame is None:
+            return
+
+        record = self._frame
+        record['total_seconds'] = time.perf_counter() - self._frame_start
+        record['rss_mb'] = current_rss_mb()
+        record['peak_rss_mb'] = peak_rss_mb()
+        if self._cuda:
+            record['cuda_peak_mb'] = torch.cuda.max_memory_allocated() / (1024 * 1024)
+        record.update(extra)
+
+        self.records.append(record)
+        if self._file is not None:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+        self._frame = None
+
+    def summary(self) -> dict:
+        """
+        汇总各阶段耗时
+
+        Returns:
+            帧数、总耗时、实际执行的 UNet 步数、各阶段 total/mean/p50/p95/max/share、
+            后台耗时，以及峰值内存
+        """
+        total = sum(record['total_seconds'] for record in self.records)
+        per_stage: Dict[str, List[float]] = {}
+        for record in self.records:
+            for name, seconds in record['stages'].items():
+                per_stage.setdefault(name, []).append(seconds)
+
+        stages = {}
+        for name, values in per_stage.items():
+            stage_total = sum(values)
+            stages[name] = {
+                'total_seconds': stage_total,
+                'mean_seconds': stage_total / len(values),
+                'p50_seconds': _percentile(values, 0.50),
+                'p95_seconds': _percentile(values, 0.95),
+                'max_seconds': max(values),
+                'share': stage_total / total if total else 0.0
+            }
+
+        summary = {
+            'frames': len(self.records),
+            'total_seconds': total,
+            'unet_steps': sum(len(record.get('step_seconds', ())) for record in self.records),
+            'stages': stages,
+            'background_seconds': dict(self.background),
+            'peak_rss_mb': peak_rss_mb()
+        }
+        if self._cuda:
+            summary['cuda_peak_mb'] = max((record.get('cuda_peak_mb', 0.0)
+                                           for record in self.records), default=0.0)
+        return summary
+
+    def close(self) -> dict:
+        """关闭追踪文件，写出汇总 JSON（<trace_path>.summary.json）并返回汇总"""
+        summary = self.summary()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            with open(f"{self.trace_path}.summary.json", 'w', encoding='utf-8') as f:
+                json.dump(summary, f, ensure_ascii=False, indent=2)
+        return summary
+
+
+def print_summary(summary: dict):
+    """打印阶段耗时汇总"""
+    print(f"\n=== 阶段耗时 ({summary['frames']} 帧, 共 {summary['total_seconds']:.2f} 秒) ===")
+    print(f"{'阶段':<14}{'总计(秒)':>10}{'均值':>10}{'p95':>10}{'占比':>8}")
+    for name, row in sorted(summary['stages'].items(), key=lambda item: -item[1]['total_seconds']):
+        print(f"{name:<14}{row['total_seconds']:>10.3f}{row['mean_seconds']:>10.4f}"
+              f"{row['p95_seconds']:>10.4f}{row['share']:>8.1%}")
+    for name, seconds in summary.get('background_seconds', {}).items():
+        print(f"后台 {name}: {seconds:.3f} 秒")
+    print(f"峰值内存: {summary['peak_rss_mb']:.0f} MB")
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+常驻故事生成服务
+模型只加载一次，通过本地 HTTP 接收故事任务，排队执行并以 NDJSON 流式返回生成的帧
+"""
+
+import argparse
+import base64
+import http.client
+import io
+import json
+import queue
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator, Optional
+
+from story_generator import StoryGenerator
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# 事件流结束标记
+_END = None
+
+
+class StoryWorker:
+    """常驻生成工作器：单线程顺序执行任务队列，模型常驻内存"""
+
+    def __init__(self, model_name: str = "runwayml/stable-diffusion-v1-5",
+                 cache_dir: Optional[str] = None):
+        """
+        初始化工作器并在后台线程中加载模型
+
+        Args:
+            model_name: 使用的扩散模型名称
+            cache_dir: 生成结果缓存目录
+        """
+        self.generator = StoryGenerator(model_name, cache_dir=cache_dir)
+        self.jobs: "queue.Queue" = queue.Queue()
+        self.load_seconds: Optional[float] = None
+        self.load_error: Optional[str] = None
+        self.ready = threading.Event()
+        self.latencies = {'cold': [], 'warm': []}
+
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="story-worker", daemon=True)
+        self._thread.start()
+
+    def submit(self, job: dict) -> "queue.Queue":
+        """
+        提交故事任务
+
+        Args:
+            job: 任务参数，包含 id_prompt、frame_list、window_len、seed、save_dir，
+                可选 inline（在帧事件中附带 base64 PNG）
+
+        Returns:
+            事件队列，依次产生 frame 事件和一个 done / error 事件，最后是结束标记 None
+        """
+        events: "queue.Queue" = queue.Queue()
+        # 模型尚未加载完成时提交的任务计为冷启动任务
+        cold = not self.ready.is_set()
+        self.jobs.put((job, events, cold, time.perf_counter()))
+        return events
+
+    def _run(self):
+        """工作线程：先加载模型，再顺序执行任务"""
+        start = time.perf_counter()
+        if not self.generator.load_model():
+            self.load_error = "模型加载失败"
+        self.load_seconds = time.perf_counter() - start
+        self.ready.set()
+
+        while True:
+            job, events, cold, submitted = self.jobs.get()
+            try:
+                self._execute(job, events, cold, submitted)
+            except Exception as e:
+                events.put({'type': 'error', 'message': str(e)})
+            finally:
+                events.put(_END)
+
+    def _execute(self, job: dict, events: "queue.Queue", cold: bool, submitted: float):
+        """执行单个任务并把帧事件写入事件队列"""
+        if self.load_error:
+            raise RuntimeError(self.load_error)
+
+        started = time.perf_counter()
+        first_frame = []
+        frames = 0
+        inline = job.get('inline', False)
+        save_dir = job.get('save_dir', "./output")
+
+        def on_frame(idx, image):
+            nonlocal frames
+            frames += 1
+            now = time.perf_counter()
+            if not first_frame:
+                first_frame.append(now - submitted)
+            event = {'type': 'frame', 'index': idx, 'seconds': now - started}
+            if inline:
+                buffer = io.BytesIO()
+                image.save(buffer, format="PNG")
+                event['png'] = base64.b64encode(buffer.getvalue()).decode('ascii')
+            events.put(event)
+
+        # 常驻服务不保留整个故事的图像，帧数由回调统计
+        self.generator.movement_gen_story_slide_windows(
+            id_prompt=job['id_prompt'],
+            frame_list=job['frame_list'],
+            window_len=job.get('window_len', 3),
+            seed=job.get('seed', 42),
+            save_dir=save_dir,
+            image_format=job.get('image_format', "png"),
+            on_frame=on_frame,
+            keep_images=False
+        )
+
+        latency = {
+            'cold': cold,
+            'queue_seconds': started - submitted,
+            'first_frame_seconds': first_frame[0] if first_frame else None,
+            'total_seconds': time.perf_counter() - submitted,
+            'frames': frames,
+            'load_seconds': self.load_seconds if cold else 0.0
+        }
+        with self._lock:
+            self.latencies['cold' if cold else 'warm'].append(latency['total_seconds'])
+
+        events.put({'type': 'done', 'save_dir': save_dir, 'latency': latency})
+
+    def stats(self) -> dict:
+        """返回冷/热任务的延迟统计"""
+        with self._lock:
+            summary = {'load_seconds': self.load_seconds, 'queued': self.jobs.qsize()}
+            for kind, values in self.latencies.items():
+                summary[kind] = {
+                    'jobs': len(values),
+                    'mean_seconds': statistics.mean(values) if values else None,
+                    'max_seconds': max(values) if values else None
+                }
+        return summary
+
+
+class _StoryRequestHandler(BaseHTTPRequestHandler):
+    """HTTP 接口：POST /jobs 提交任务并流式返回事件，GET /stats 查询延迟统计"""
+
+    worker: StoryWorker = None
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self._send_json(200, self.worker.stats())
+        else:
+            self._send_json(404, {'error': f"未知路径: {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/jobs":
+            self._send_json(404, {'error': f"未知路径: {self.path}"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            job = json.loads(self.rfile.read(length))
+            if 'id_prompt' not in job or 'frame_list' not in job:
+                raise ValueError("任务缺少 id_prompt 或 frame_list")
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+            return
+
+        events = self.worker.submit(job)
+
+        # 不带 Content-Length 的流式响应，连接关闭即结束
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        while True:
+            event = events.get()
+            if event is _END:
+                break
+            self.wfile.write(json.dumps(event, ensure_ascii=False).encode('utf-8') + b"\n")
+            self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(model_name: str, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+          cache_dir: Optional[str] = None):
+    """
+    启动常驻生成服务
+
+    Args:
+        model_name: 使用的扩散模型名称
+        host: 监听地址
+        port: 监听端口
+        cache_dir: 生成结果缓存目录
+    """
+    handler = type("StoryRequestHandler", (_StoryRequestHandler,),
+                   {'worker': StoryWorker(model_name, cache_dir=cache_dir)})
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f"故事生成服务已启动: http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n服务已停止")
+    finally:
+        server.server_close()
+
+
+class StoryWorkerClient:
+    """常驻生成服务的客户端"""
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, timeout: float = 3600):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def submit(self, job: dict) -> Iterator[dict]:
+        """
+        提交任务并逐个产出服务端事件
+
+        Args:
+            job: 任务参数，见 StoryWorker.submit
+
+        Returns:
+            事件迭代器（frame / done / error）
+        """
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            body = json.dumps(job, ensure_ascii=False).encode('utf-8')
+            connection.request("POST", "/jobs", body=body,
+                               headers={"Content-Type": "application/json"})
+            response = connection.getresponse()
+            if response.status != 200:
+                raise RuntimeError(f"任务提交失败: {response.read().decode('utf-8')}")
+            for line in response:
+                if line.strip():
+                    yield json.loads(line)
+        finally:
+            connection.close()
+
+    def stats(self) -> dict:
+        """查询服务端的冷/热任务延迟统计"""
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            connection.request("GET", "/stats")
+            return json.loads(connection.getresponse().read())
+        finally:
+            connection.close()
+
+
+def demo_client(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+    """演示客户端：向常驻服务提交示例故事并打印流式返回的帧"""
+    print("=== 常驻服务故事生成演示 ===\n")
+
+    job = {
+        'id_prompt': "一个勇敢的年轻骑士",
+        'frame_list': [
+            "在森林中骑马前行",
+            "发现一座古老的城堡",
+            "进入城堡探索",
+            "遇到神秘的魔法师",
+            "与魔法师交谈",
+            "获得神秘的魔法剑",
+            "离开城堡继续冒险",
+            "在夕阳下骑马回家"
+        ],
+        'window_len': 3,
+        'seed': 42,
+        'save_dir': "./output"
+    }
+
+    client = StoryWorkerClient(host, port)
+    for event in client.submit(job):
+        if event['type'] == 'frame':
+            print(f"收到第 {event['index'] + 1} 帧 ({event['seconds']:.2f} 秒)")
+        elif event['type'] == 'done':
+            latency = event['latency']
+            kind = "冷启动" if latency['cold'] else "热启动"
+            print(f"\n任务完成（{kind}）: 共 {latency['frames']} 帧, "
+                  f"首帧 {latency['first_frame_seconds']:.2f} 秒, "
+                  f"总耗时 {latency['total_seconds']:.2f} 秒")
+        else:
+            print(f"生成过程中出现错误: {event['message']}")
+
+    print(f"\n服务统计: {client.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="常驻故事生成服务")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="启动服务")
+    serve_parser.add_argument("--model", default="runwayml/stable-diffusion-v1-5")
+    serve_parser.add_argument("--cache-dir", default=None)
+
+    subparsers.add_parser("demo", help="提交示例故事")
+
+    for sub in subparsers.choices.values():
+        sub.add_argument("--host", default=DEFAULT_HOST)
+        sub.add_argument("--port", type=int, default=DEFAULT_PORT)
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        serve(args.model, args.host, args.port, args.cache_dir)
+    else:
+        demo_client(args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+窗口长度规划器
+按 tokenizer 统计每条提示词的 token 数，用前缀和与二分查找在 O(n log n) 内求出循环滑动窗口的最大长度；
+循环滑动窗口以按下标计算的惰性视图表示，不复制提示词
+"""
+
+import re
+from bisect import bisect_right
+from collections.abc import Sequence
+from typing import Callable, Dict, List, Optional
+
+
+# CLIP 文本编码器的标准 token 上限（含起止符）
+MAX_PROMPT_TOKENS = 77
+
+# 起止符占用的 token 数
+SPECIAL_TOKENS = 2
+
+_TOKEN_PATTERN = re.compile(r"[A-Za-z0-9]+|[^\sA-Za-z0-9]")
+
+
+def estimate_token_count(text: str) -> int:
+    """
+    估算提示词 token 数（无 tokenizer 时使用）
+
+    英文单词和数字按词计数，中文等其他字符逐字计数，
+    避免无空格的中文提示词被当作一个词。
+
+    Args:
+        text: 提示词文本
+
+    Returns:
+        估算的 token 数
+    """
+    return len(_TOKEN_PATTERN.findall(text))
+
+
+class WindowLengthPlanner:
+    """窗口长度规划器，缓存每条提示词的 token 数"""
+
+    def __init__(self, tokenizer=None, max_tokens: Optional[int] = None, include_express: bool = True):
+        """
+        初始化规划器
+
+        Args:
+            tokenizer: 管线的 tokenizer，为 None 时使用 estimate_token_count 估算
+            max_tokens: token 上限，默认取 tokenizer.model_max_length 或 77
+            include_express: 最终提示词是否在末尾再追加一次强调词（窗口首条提示词）
+        """
+        self.include_express = include_express
+        if tokenizer is not None:
+            self._count: Callable[[str], int] = (
+                lambda text: len(tokenizer(text, add_special_tokens=False).input_ids)
+            )
+            max_tokens = max_tokens or tokenizer.model_max_length
+        else:
+            self._count = estimate_token_count
+
+        self.max_tokens = max_tokens or MAX_PROMPT_TOKENS
+        self.budget = self.max_tokens - SPECIAL_TOKENS
+        self._counts: Dict[str, int] = {}
+
+    def token_count(self, text: str) -> int:
+        """返回提示词的 token 数（每条文本只统计一次）"""
+        count = self._counts.get(text)
+        if count is None:
+            count = self._count(text)
+            self._counts[text] = count
+        return count
+
+    def max_window_lengths(self, id_prompt: str, frame_prompt_list: List[str]) -> List[int]:
+        """
+        计算每个起始位置可用的最大循环窗口长度
+
+        CLIP 的预分词按空白切分，用空格拼接的提示词 token 数可直接相加，
+        窗口 [i, j) 的 token 数为前缀和之差。include_express 时最终提示词为
+        "身份提示词 + 窗口 + 强调词"，强调词即窗口首条提示词，需再加上第 i 条的 token 数；
+        该附加项随起点变化，右端点不再单调，因此对每个起点在前缀和上二分查找。
+
+        Args:
+            id_prompt: 身份提示词
+            frame_prompt_list: 帧提示词列表
+
+        Returns:
+            每个起始位置的最大窗口长度列表
+        """
+        n = len(frame_prompt_list)
+        if n == 0:
+            return []
+
+        remaining = self.budget - self.token_count(id_prompt)
+        if remaining < 0:
+            return [0] * n
+
+        # 在展开两圈的列表上求前缀和，处理循环窗口
+        counts = [self.token_count(text) for text in frame_prompt_list]
+        prefix = [0] * (2 * n + 1)
+        for k in range(2 * n):
+            prefix[k + 1] = prefix[k] + counts[k % n]
+
+        lengths = []
+        for start in range(n):
+            # 最大的 end 使 prefix[end] - prefix[start] + counts[start] <= remaining
+            limit = prefix[start] + remaining - (counts[start] if self.include_express else 0)
+            end = bisect_right(prefix, limit, start, start + n + 1) - 1
+            lengths.append(max(0, end - start))
+
+        return lengths
+
+    def max_window_length(self, id_prompt: str, frame_prompt_list: List[str]) -> int:
+        """
+        计算在所有起始位置都不超出 token 上限的最大窗口长度
+
+        Args:
+            id_prompt: 身份提示词
+            frame_prompt_list: 帧提示词列表
+
+        Returns:
+            最大可用窗口长度
+        """
+        lengths = self.max_window_lengths(id_prompt, frame_prompt_list)
+        return min(lengths) if lengths else 0
+
+
+class CircularWindow(Sequence):
+    """循环窗口视图：lst[start], lst[start + 1], ... 共 size 项（下标对 len(lst) 取模）"""
+
+    __slots__ = ('_items', '_start', '_size')
+
+    def __init__(self, items: Sequence, start: int, size: int):
+        self._items = items
+        self._start = start
+        self._size = size
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._size))]
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("窗口下标越界")
+        return self._items[(self._start + index) % len(self._items)]
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Sequence) or isinstance(other, str):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+
+class CircularWindows(Sequence):
+    """
+    循环滑动窗口序列的惰性视图
+
+    第 i 个窗口为 lst[i], ..., lst[i + w - 1]（循环取模），按需构造 CircularWindow，
+    n 个窗口只占 O(1) 额外内存，不再复制 n * w 个元素。
+    """
+
+    __slots__ = ('_items', '_size')
+
+    def __init__(self, items: Sequence, size: int):
+        """
+        Args:
+            items: 输入列表
+            size: 窗口大小
+        """
+        self._items = items
+        self._size = size
+
+    @property
+    def window_size(self) -> int:
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("窗口序号越界")
+        return CircularWindow(self._items, index, self._size)
+
+    def __repr__(self) -> str:
+        return f"CircularWindows(n={len(self)}, w={self._size})"
@@ -2,5 +2,13 @@
 安全护栏示例包
 
 包含：
-- churn_detection.py: 客户流失检测安全护栏示例
+- churn_detection.py: 客户流失检测安全护栏示例（护栏并发执行、超时与触发短路）
+- keyword_automaton.py: Aho-Corasick 多模式关键词自动机
+- keywords/: 按类别划分的关键词文件
+- batch_screening.py: 限制并发的批量护栏筛查（流式产出结论、紧凑结果文件、吞吐量与延迟统计）
+- verdict_cache.py: 按规范化输入缓存护栏结论（LRU + TTL、并发请求合并、命中率统计）
+- guardrail_scheduler.py: 按成本排序、在线学习触发率的自适应护栏调度
+- guardrail_pool.py: CPU 密集型护栏的进程池（工作进程预加载状态）
+- pii_detection.py: PII 正则检测护栏（CPU 密集型护栏示例）
+- benchmark_guardrails.py: 安全护栏基准测试
 """ 
\ No newline at end of file
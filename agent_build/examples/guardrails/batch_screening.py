@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+批量护栏筛查
+对异步迭代器或消息文件中的大量消息运行同一组输入护栏，限制同时在途的消息数，
+按输入顺序或完成顺序流式产出结论并写入紧凑的结果文件，同时统计吞吐量和延迟分位数
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import math
+import time
+from array import array
+from dataclasses import dataclass
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator, Optional, Union
+
+try:
+    from .churn_detection import Agent, Guardrail, churn_detection_tripwire
+except ImportError:
+    from churn_detection import Agent, Guardrail, churn_detection_tripwire
+
+# 消息可以是纯文本，或带 id / text 字段的字典；read_messages 对格式错误的记录产出带 error 字段的字典
+Message = Union[str, dict]
+
+
+@dataclass
+class Verdict:
+    index: int
+    message_id: object
+    tripped: bool
+    output_info: str
+    latency_seconds: float
+    # 消息格式错误或筛查出错时的错误描述，此时 tripped 为 False
+    error: str = ""
+
+    def to_compact(self) -> dict:
+        """紧凑的输出记录，未触发的结论省略 info，出错的结论带 error"""
+        record = {"i": self.index, "id": self.message_id, "t": int(self.tripped),
+                  "ms": round(self.latency_seconds * 1000, 3)}
+        if self.tripped:
+            record["info"] = self.output_info
+        if self.error:
+            record["error"] = self.error
+        return record
+
+
+class BatchStats:
+    """批量筛查的吞吐量和延迟统计"""
+
+    def __init__(self):
+        self.messages = 0
+        self.tripped = 0
+        self.errors = 0
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        # 每条消息的护栏耗时（秒），百万条消息约占 8 MB
+        self.latencies = array("d")
+
+    def record(self, verdict: Verdict):
+        self.messages += 1
+        self.tripped += int(verdict.tripped)
+        self.errors += int(bool(verdict.error))
+        self.latencies.append(verdict.latency_seconds)
+
+    def finish(self):
+        self.finished = time.perf_counter()
+
+    @property
+    def seconds(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    def summary(self) -> dict:
+        """汇总吞吐量和延迟分位数（按最近秩计算）"""
+        seconds = self.seconds
+        ordered = sorted(self.latencies)
+
+        def percentile_ms(q: float) -> float:
+            if not ordered:
+                return 0.0
+            return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)] * 1000
+
+        return {
+            "messages": self.messages,
+            "tripped": self.tripped,
+            "errors": self.errors,
+            "seconds": seconds,
+            "messages_per_second": self.messages / seconds if seconds else 0.0,
+            "p50_ms": percentile_ms(50),
+            "p99_ms": percentile_ms(99),
+            "max_ms": percentile_ms(100),
+        }
+
+
+async def _as_async_iterator(messages: Union[Iterable[Message], AsyncIterable[Message]]) -> AsyncIterator[Message]:
+    if hasattr(messages, "__aiter__"):
+        async for message in messages:
+            yield message
+    else:
+        for message in messages:
+            yield message
+
+
+def _message_error(index: int, message: Message) -> Optional[str]:
+    """检查消息格式，返回错误描述；格式正确时返回 None"""
+    if isinstance(message, str):
+        return None
+    if not isinstance(message, dict):
+        return f"第 {index + 1} 条消息应为字符串或字典，实际为 {type(message).__name__}"
+    if message.get("error"):
+        return message["error"]
+    if "text" not in message:
+        return f"第 {index + 1} 条消息缺少 text 字段"
+    if not isinstance(message["text"], str):
+        return f"第 {index + 1} 条消息的 text 字段不是字符串"
+    return None
+
+
+async def _screen_one(agent: Agent, index: int, message: Message) -> Verdict:
+    """筛查一条消息；消息格式错误或筛查出错时返回带 error 的结论，不中断整批"""
+    message_id = message.get("id", index) if isinstance(message, dict) else index
+
+    start = time.perf_counter()
+    error = _message_error(index, message)
+    if error is None:
+        text = message["text"] if isinstance(message, dict) else message
+        try:
+            result = await agent.check_guardrails(text)
+        except Exception as e:
+            error = f"护栏检查出错: {type(e).__name__}: {e}"
+    if error is not None:
+        return Verdict(
+            index=index,
+            message_id=message_id,
+            tripped=False,
+            output_info="",
+            latency_seconds=time.perf_counter() - start,
+            error=error
+        )
+    return Verdict(
+        index=index,
+        message_id=message_id,
+        tripped=result is not None,
+        output_info=result.output_info if result is not None else "",
+        latency_seconds=time.perf_counter() - start
+    )
+
+
+async def screen_messages(agent: Agent, messages: Union[Iterable[Message], AsyncIterable[Message]],
+                          concurrency: int = 32, ordered: bool = True,
+                          stats: Optional[BatchStats] = None) -> AsyncIterator[Verdict]:
+    """
+    批量运行输入护栏，流式产出每条消息的结论
+
+    消息按需从 messages 中读取，不会一次全部载入内存。格式错误或筛查出错的消息产出带 error 的结论，
+    其余消息照常筛查并按序产出。ordered 为 True 时按输入顺序产出，
+    此时从最早未产出的消息起最多有 concurrency 条在途或等待产出，慢消息不会使缓冲无限增长；
+    为 False 时按完成顺序产出，始终保持 concurrency 条在途。
+
+    Args:
+        agent: 配置了输入护栏的智能体
+        messages: 消息的同步或异步可迭代对象
+        concurrency: 最大在途消息数
+        ordered: 是否按输入顺序产出
+        stats: 可选的统计对象，产出过程中持续更新
+
+    Yields:
+        每条消息的结论
+    """
+    concurrency = max(1, concurrency)
+    source = _as_async_iterator(messages)
+    pending = set()
+    buffer = {}
+    submitted = 0
+    next_index = 0
+    exhausted = False
+
+    try:
+        while True:
+            # 补满并发窗口
+            while not exhausted and (submitted - next_index if ordered else len(pending)) < concurrency:
+                try:
+                    message = await source.__anext__()
+                except StopAsyncIteration:
+                    exhausted = True
+                    break
+                pending.add(asyncio.ensure_future(_screen_one(agent, submitted, message)))
+                submitted += 1
+
+            if not pending:
+                break
+
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in sorted(done, key=lambda task: task.result().index):
+                verdict = task.result()
+                if stats is not None:
+                    stats.record(verdict)
+                if ordered:
+                    buffer[verdict.index] = verdict
+                else:
+                    yield verdict
+
+            while next_index in buffer:
+                yield buffer.pop(next_index)
+                next_index += 1
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        if stats is not None:
+            stats.finish()
+
+
+def _parse_record(line: str, line_no: int) -> dict:
+    """解析 .jsonl 消息文件中的一行，格式错误时返回带 error 字段的消息"""
+    try:
+        data = json.loads(line)
+    except ValueError:
+        return {"id": line_no, "error": f"第 {line_no} 行不是合法的 JSON"}
+    if not isinstance(data, dict):
+        return {"id": line_no, "error": f"第 {line_no} 行不是 JSON 对象"}
+    message_id = data.get("id", line_no)
+    if "text" not in data:
+        return {"id": message_id, "error": f"第 {line_no} 行缺少 text 字段"}
+    if not isinstance(data["text"], str):
+        return {"id": message_id, "error": f"第 {line_no} 行的 text 字段不是字符串"}
+    return {"id": message_id, "text": data["text"]}
+
+
+def read_messages(path: str) -> Iterator[dict]:
+    """
+    逐行读取消息文件
+
+    .jsonl 文件每行一个带 text（可选 id）字段的 JSON 对象，其他文件每行一条消息文本；
+    以 .gz 结尾的文件按 gzip 读取。未提供 id 时以行号作为 id。
+    格式错误的行产出带 error 字段（如 "第 3 行缺少 text 字段"）的消息，由筛查产出错误结论。
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    is_jsonl = path.endswith(".jsonl") or path.endswith(".jsonl.gz")
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.rstrip("\n")
+            if not line.strip():
+                continue
+            if is_jsonl:
+                yield _parse_record(line, line_no)
+            else:
+                yield {"id": line_no, "text": line}
+
+
+async def screen_file(agent: Agent, input_path: str, output_path: str, concurrency: int = 32,
+                      ordered: bool = True, only_tripped: bool = False,
+                      progress_every: int = 0) -> BatchStats:
+    """
+    筛查消息文件并把结论写入紧凑的 JSONL 结果文件
+
+    Args:
+        agent: 配置了输入护栏的智能体
+        input_path: 消息文件路径（见 read_messages）
+        output_path: 结果文件路径，以 .gz 结尾时 gzip 压缩
+        concurrency: 最大在途消息数
+        ordered: 是否按输入顺序写出
+        only_tripped: 是否只写出触发护栏或出错的消息
+        progress_every: 每处理多少条打印一次进度，0 表示不打印
+
+    Returns:
+        统计信息
+    """
+    stats = BatchStats()
+    opener = gzip.open if output_path.endswith(".gz") else open
+    with opener(output_path, "wt", encoding="utf-8") as out:
+        verdicts = screen_messages(agent, read_messages(input_path), concurrency, ordered, stats)
+        count = 0
+        async for verdict in verdicts:
+            if verdict.tripped or verdict.error or not only_tripped:
+                out.write(json.dumps(verdict.to_compact(), ensure_ascii=False, separators=(",", ":")))
+                out.write("\n")
+            count += 1
+            if progress_every and count % progress_every == 0:
+                print(f"已处理 {count} 条, {count / stats.seconds:.0f} 条/秒")
+    return stats
+
+
+def print_stats(stats: BatchStats):
+    """打印统计信息"""
+    summary = stats.summary()
+    print(f"共 {summary['messages']} 条消息, 触发 {summary['tripped']} 条, 出错 {summary['errors']} 条, "
+          f"耗时 {summary['seconds']:.2f} 秒")
+    print(f"吞吐量 {summary['messages_per_second']:.0f} 条/秒, "
+          f"延迟 p50 {summary['p50_ms']:.2f} ms, p99 {summary['p99_ms']:.2f} ms, 最大 {summary['max_ms']:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量护栏筛查")
+    parser.add_argument("input", help="消息文件（.txt 每行一条 / .jsonl 带 text 字段，可 gzip 压缩）")
+    parser.add_argument("--output", default="verdicts.jsonl.gz", help="结果文件，以 .gz 结尾时压缩")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--order", choices=["input", "completion"], default="input")
+    parser.add_argument("--only-tripped", action="store_true", help="只写出触发护栏或出错的消息")
+    parser.add_argument("--progress-every", type=int, default=100000)
+    args = parser.parse_args()
+
+    agent = Agent(
+        name="Inbox Screening Agent",
+        instructions="Screen support inbox messages.",
+        input_guardrails=[Guardrail(churn_detection_tripwire, "流失检测")]
+    )
+    stats = asyncio.run(screen_file(agent, args.input, args.output, args.concurrency,
+                                    args.order == "input", args.only_tripped, args.progress_every))
+    print_stats(stats)
+
+
+if __name__ == "__main__":
+    main()
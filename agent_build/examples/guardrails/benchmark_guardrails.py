@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+"""
+安全护栏基准测试
+- latency: 用模拟耗时的护栏测量 1 到 20 个护栏时，顺序运行与并发运行（首个触发即取消其余）的每条消息延迟
+- keywords: 对比逐个关键词子串扫描与 Aho-Corasick 自动机在不同关键词规模下的吞吐量（消息/秒）
+- batch: 批量筛查在不同并发上限、按输入顺序和按完成顺序产出时的吞吐量与 p99 延迟
+- cache: 大量重复的常见话术（大小写、空白、全角变体）下，有无结论缓存时的吞吐量、命中率和护栏调用次数
+- schedule: 耗时和触发率各异的护栏在列表顺序、按预估耗时排序、自适应调度和并发运行下的每条消息延迟
+- offload: CPU 密集型护栏在事件循环线程、线程池、进程池中运行时的吞吐量和事件循环延迟
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+
+try:
+    from .batch_screening import BatchStats, screen_messages
+    from .churn_detection import Agent, Guardrail, GuardrailFunctionOutput, churn_detection_tripwire
+    from .guardrail_pool import GuardrailProcessPool
+    from .guardrail_scheduler import AdaptiveGuardrailScheduler
+    from .keyword_automaton import KeywordAutomaton
+    from .pii_detection import compile_pii_patterns, pii_detection_tripwire
+    from .verdict_cache import VerdictCache
+except ImportError:
+    from batch_screening import BatchStats, screen_messages
+    from churn_detection import Agent, Guardrail, GuardrailFunctionOutput, churn_detection_tripwire
+    from guardrail_pool import GuardrailProcessPool
+    from guardrail_scheduler import AdaptiveGuardrailScheduler
+    from keyword_automaton import KeywordAutomaton
+    from pii_detection import compile_pii_patterns, pii_detection_tripwire
+    from verdict_cache import VerdictCache
+
+CASES = ["latency", "keywords", "batch", "cache", "schedule", "offload"]
+DEFAULT_COUNTS = [1, 2, 5, 10, 20]
+DEFAULT_KEYWORD_COUNTS = [100, 1000, 10000, 30000]
+DEFAULT_CONCURRENCY = [16, 64, 256, 1024]
+# 模拟护栏的耗时（秒），按序循环使用：关键词检查、正则、本地分类器、远程模型调用
+GUARDRAIL_COSTS = [0.001, 0.005, 0.02, 0.05, 0.1]
+
+
+def make_guardrail(index: int, cost: float, trips: bool = False) -> Guardrail:
+    """构造一个耗时为 cost 秒的模拟护栏"""
+    async def simulated_guardrail(ctx, agent, input_items):
+        await asyncio.sleep(cost)
+        return GuardrailFunctionOutput(tripwire_triggered=trips, output_info=f"模拟护栏 {index} 触发")
+
+    return Guardrail(simulated_guardrail, f"模拟护栏{index}({cost * 1000:.0f}ms)")
+
+
+def make_guardrails(count: int, trip_last: bool = False) -> list:
+    """
+    构造 count 个不同耗时的模拟护栏
+
+    trip_last 为 True 时最后一个护栏换成耗时最短且会触发的护栏，
+    顺序模式需要先跑完前面所有护栏，并发模式在它返回后即可取消其余护栏。
+    """
+    guardrails = [make_guardrail(i, GUARDRAIL_COSTS[i % len(GUARDRAIL_COSTS)])
+                  for i in range(count)]
+    if trip_last:
+        guardrails[-1] = make_guardrail(count - 1, GUARDRAIL_COSTS[0], trips=True)
+    return guardrails
+
+
+async def measure_latency(agent: Agent, repeats: int) -> float:
+    """返回每条消息检查护栏的平均耗时（毫秒）"""
+    start = time.perf_counter()
+    for _ in range(repeats):
+        await agent.check_guardrails("我想了解一下产品")
+    return (time.perf_counter() - start) * 1000 / repeats
+
+
+async def benchmark_latency(counts: list, repeats: int = 5) -> list:
+    """
+    对比顺序与并发运行护栏的延迟
+
+    场景 clean 中所有护栏都不触发；场景 trip 中列表最后一个（耗时最短的）护栏触发。
+
+    Args:
+        counts: 护栏数量列表
+        repeats: 每组重复次数
+
+    Returns:
+        各组测试结果
+    """
+    rows = []
+    for scenario in ("clean", "trip"):
+        for count in counts:
+            guardrails = make_guardrails(count, trip_last=scenario == "trip")
+            row = {'scenario': scenario, 'guardrails': count}
+            for mode, concurrent in (("sequential", False), ("concurrent", True)):
+                agent = Agent("Benchmark Agent", "", guardrails, concurrent_guardrails=concurrent)
+                row[f'{mode}_ms'] = await measure_latency(agent, repeats)
+            rows.append(row)
+    return rows
+
+
+def make_keywords(count: int, rng: random.Random) -> list:
+    """构造 count 个互不相同的中英文合成短语"""
+    chinese = "取消退订不满意投诉账号服务会员续费价格客服垃圾律师信息泄露删除数据"
+    english = ["cancel", "refund", "account", "service", "close", "delete", "data", "plan",
+               "subscription", "price", "support", "lawsuit", "breach", "scam", "switch"]
+    keywords = set()
+    while len(keywords) < count:
+        if rng.random() < 0.5:
+            keywords.add("".join(rng.choice(chinese) for _ in range(rng.randint(3, 6))))
+        else:
+            keywords.add(" ".join(rng.choice(english) for _ in range(rng.randint(2, 3))))
+    return sorted(keywords)
+
+
+def make_messages(count: int, keywords: list, rng: random.Random) -> list:
+    """构造 count 条 50 到 150 字的消息，约一半包含某个关键词"""
+    filler = "你好我想了解一下产品的使用方法以及最近的活动 hello i would like to know more about the plan "
+    messages = []
+    for _ in range(count):
+        start = rng.randrange(len(filler))
+        text = (filler * 3)[start:start + rng.randint(50, 150)]
+        if rng.random() < 0.5:
+            position = rng.randrange(len(text))
+            text = text[:position] + rng.choice(keywords) + text[position:]
+        messages.append(text)
+    return messages
+
+
+def benchmark_keywords(keyword_counts: list, messages: int = 500) -> list:
+    """
+    对比关键词匹配吞吐量
+
+    scan_any 为原护栏的写法（逐个关键词做子串查找，命中即停），scan_all 找出全部命中的关键词，
+    automaton 为 Aho-Corasick 自动机单次扫描找出全部命中短语。
+
+    Args:
+        keyword_counts: 关键词数量列表
+        messages: 每组测试的消息数
+
+    Returns:
+        各组测试结果
+    """
+    rng = random.Random(0)
+    rows = []
+    for count in keyword_counts:
+        keywords = make_keywords(count, rng)
+        texts = make_messages(messages, keywords, rng)
+
+        start = time.perf_counter()
+        automaton = KeywordAutomaton()
+        automaton.add_all(keywords)
+        automaton.build()
+        row = {'keywords': count, 'build_seconds': time.perf_counter() - start}
+
+        found = {}
+        scanners = {
+            'scan_any': lambda text: any(keyword in text.lower() for keyword in keywords),
+            'scan_all': lambda text: {keyword for keyword in keywords if keyword in text.lower()},
+            'automaton': lambda text: {match.phrase for match in automaton.find_all(text)},
+        }
+        for name, scan in scanners.items():
+            start = time.perf_counter()
+            found[name] = [scan(text) for text in texts]
+            row[f'{name}_per_second'] = len(texts) / (time.perf_counter() - start)
+
+        # 自动机与逐个扫描的命中结果必须一致
+        row['consistent'] = found['scan_all'] == found['automaton']
+        rows.append(row)
+    return rows
+
+
+def print_keyword_report(rows: list):
+    """打印关键词匹配结果表格"""
+    print(f"\n{'关键词数':>10}{'构建(秒)':>10}{'逐个扫描-任一(条/秒)':>22}{'逐个扫描-全部(条/秒)':>22}"
+          f"{'自动机(条/秒)':>16}{'结果一致':>10}")
+    for row in rows:
+        print(f"{row['keywords']:>10}{row['build_seconds']:>10.2f}{row['scan_any_per_second']:>22.0f}"
+              f"{row['scan_all_per_second']:>22.0f}{row['automaton_per_second']:>16.0f}"
+              f"{'是' if row['consistent'] else '否':>10}")
+
+
+async def benchmark_batch(concurrency_levels: list, messages: int = 2000,
+                          guardrail_count: int = 5) -> list:
+    """
+    测量批量筛查的吞吐量和延迟
+
+    每条消息经过 guardrail_count 个不同耗时的模拟护栏（并发运行，约 1/5 的消息触发耗时最短的护栏）。
+
+    Args:
+        concurrency_levels: 并发上限列表
+        messages: 每组测试的消息数
+        guardrail_count: 模拟护栏数量
+
+    Returns:
+        各组测试结果
+    """
+    guardrails = make_guardrails(guardrail_count)
+
+    async def trip_on_marker(ctx, agent, input_items):
+        await asyncio.sleep(GUARDRAIL_COSTS[0])
+        return GuardrailFunctionOutput(tripwire_triggered="取消" in input_items[0], output_info="流失风险")
+
+    agent = Agent("Benchmark Agent", "", guardrails + [Guardrail(trip_on_marker, "标记检测")])
+    texts = [f"消息 {i} {'取消' if i % 5 == 0 else ''}" for i in range(messages)]
+
+    rows = []
+    for concurrency in concurrency_levels:
+        for order, ordered in (("input", True), ("completion", False)):
+            stats = BatchStats()
+            async for _ in screen_messages(agent, texts, concurrency, ordered, stats):
+                pass
+            rows.append(dict(stats.summary(), concurrency=concurrency, order=order))
+    return rows
+
+
+def print_batch_report(rows: list):
+    """打印批量筛查结果表格"""
+    print(f"\n{'并发':>6}  {'产出顺序':<12}{'吞吐量(条/秒)':>14}{'p50(ms)':>10}{'p99(ms)':>10}")
+    for row in rows:
+        print(f"{row['concurrency']:>6}  {row['order']:<12}{row['messages_per_second']:>14.0f}"
+              f"{row['p50_ms']:>10.1f}{row['p99_ms']:>10.1f}")
+
+
+CANNED_PHRASES = ["我想取消订阅", "cancel my subscription", "怎么退款", "how do i reset my password",
+                  "你好", "谢谢", "账号登录不了", "where is my order", "我要投诉", "change my plan"]
+
+
+def make_canned_messages(count: int, unique_ratio: float, rng: random.Random) -> list:
+    """构造以常见话术为主的消息，常见话术随机改变大小写、空白并混入全角字符"""
+    def variant(text: str) -> str:
+        if rng.random() < 0.3:
+            text = text.upper()
+        if rng.random() < 0.3:
+            text = "  " + text.replace(" ", "   ") + " "
+        if rng.random() < 0.3:
+            # 半角 ASCII 转为对应的全角字符
+            text = "".join(chr(ord(c) + 0xFEE0) if "!" <= c <= "~" else c for c in text)
+        return text
+
+    return [f"独特的问题 {i}" if rng.random() < unique_ratio else variant(rng.choice(CANNED_PHRASES))
+            for i in range(count)]
+
+
+async def benchmark_cache(messages: int = 5000, concurrency: int = 64, model_latency: float = 0.02,
+                          unique_ratio: float = 0.2) -> list:
+    """
+    对比有无结论缓存时的批量筛查
+
+    护栏为一个关键词护栏和一个模拟耗时 model_latency 秒的模型护栏。
+
+    Args:
+        messages: 消息数
+        concurrency: 并发上限
+        model_latency: 模型护栏的模拟耗时（秒）
+        unique_ratio: 不重复消息的比例
+
+    Returns:
+        各组测试结果
+    """
+    texts = make_canned_messages(messages, unique_ratio, random.Random(0))
+    calls = {'count': 0}
+
+    async def model_guardrail(ctx, agent, input_items):
+        calls['count'] += 1
+        await asyncio.sleep(model_latency)
+        return GuardrailFunctionOutput(tripwire_triggered="投诉" in input_items[0], output_info="投诉风险")
+
+    rows = []
+    for mode in ("no_cache", "cache"):
+        cache = VerdictCache(max_entries=1000, ttl_seconds=600) if mode == "cache" else None
+        agent = Agent("Benchmark Agent", "", [Guardrail(churn_detection_tripwire, "流失检测"),
+                                              Guardrail(model_guardrail, "模型护栏")],
+                      verdict_cache=cache)
+        calls['count'] = 0
+        stats = BatchStats()
+        # 按完成顺序产出，命中缓存的消息不必等待前面未命中的消息
+        async for _ in screen_messages(agent, texts, concurrency, False, stats):
+            pass
+        rows.append(dict(stats.summary(), mode=mode, model_calls=calls['count'],
+                         hit_rate=cache.hit_rate if cache else 0.0))
+    return rows
+
+
+def print_cache_report(rows: list):
+    """打印结论缓存结果表格"""
+    print(f"\n{'模式':<10}{'吞吐量(条/秒)':>14}{'p99(ms)':>10}{'命中率':>8}{'模型护栏调用':>14}")
+    for row in rows:
+        print(f"{row['mode']:<10}{row['messages_per_second']:>14.0f}{row['p99_ms']:>10.1f}"
+              f"{row['hit_rate']:>8.1%}{row['model_calls']:>14}")
+
+
+# 调度测试的模拟护栏：(名称, 实际耗时, 预估耗时, 触发概率)；
+# 模型审核的预估耗时偏高、PII 检查的偏低，只按预估耗时排序时会把常触发的模型审核排在分类器之后
+SCHEDULE_GUARDRAILS = [
+    ("分类器", 0.02, 0.02, 0.02),
+    ("模型审核", 0.01, 0.03, 0.30),
+    ("正则", 0.001, 0.001, 0.01),
+    ("关键词", 0.0002, 0.0002, 0.05),
+    ("PII", 0.003, 0.001, 0.40),
+]
+
+
+async def benchmark_schedule(messages: int = 400) -> list:
+    """
+    对比护栏执行顺序对每条消息延迟的影响
+
+    每条消息预先按各护栏的触发概率决定哪些护栏会触发（各模式使用同一批消息）。
+
+    Args:
+        messages: 消息数
+
+    Returns:
+        各模式的测试结果
+    """
+    rng = random.Random(0)
+    texts = [f"消息{i}:" + "".join("1" if rng.random() < p else "0" for *_, p in SCHEDULE_GUARDRAILS)
+             for i in range(messages)]
+
+    calls = {'count': 0}
+
+    def make_scheduled_guardrail(index: int, name: str, cost: float, estimated_cost: float) -> Guardrail:
+        async def simulated_guardrail(ctx, agent, input_items):
+            calls['count'] += 1
+            await asyncio.sleep(cost)
+            return GuardrailFunctionOutput(tripwire_triggered=input_items[0].split(":")[1][index] == "1",
+                                           output_info=f"{name} 触发")
+
+        return Guardrail(simulated_guardrail, name, estimated_cost=estimated_cost)
+
+    guardrails = [make_scheduled_guardrail(i, name, cost, estimated)
+                  for i, (name, cost, estimated, _) in enumerate(SCHEDULE_GUARDRAILS)]
+
+    modes = {
+        "list_order": dict(concurrent_guardrails=False),
+        "static_cost": dict(guardrail_scheduler=AdaptiveGuardrailScheduler(learn=False)),
+        "adaptive": dict(guardrail_scheduler=AdaptiveGuardrailScheduler()),
+        "concurrent": dict(concurrent_guardrails=True),
+    }
+    rows = []
+    for mode, options in modes.items():
+        agent = Agent("Benchmark Agent", "", guardrails, **options)
+        calls['count'] = 0
+        stats = BatchStats()
+        # 逐条处理，测量单条消息的延迟
+        async for _ in screen_messages(agent, texts, 1, True, stats):
+            pass
+        # 并发模式延迟最低，但每条消息都会启动全部护栏
+        row = dict(stats.summary(), mode=mode, calls_per_message=calls['count'] / messages)
+        scheduler = options.get("guardrail_scheduler")
+        if scheduler is not None:
+            row['order'] = [guardrail.name for guardrail in scheduler.order(guardrails)]
+        rows.append(row)
+    return rows
+
+
+def print_schedule_report(rows: list):
+    """打印调度结果表格"""
+    print(f"\n{'模式':<14}{'平均(ms)':>10}{'p99(ms)':>10}{'护栏调用/条':>12}  最终顺序")
+    for row in rows:
+        mean_ms = row['seconds'] * 1000 / row['messages']
+        print(f"{row['mode']:<14}{mean_ms:>10.2f}{row['p99_ms']:>10.2f}{row['calls_per_message']:>12.2f}"
+              f"  {' > '.join(row.get('order', []))}")
+
+
+async def pii_inline(ctx, agent, input_items):
+    """直接在事件循环线程上运行 PII 检测，作为对照"""
+    return pii_detection_tripwire(ctx, agent, input_items)
+
+
+async def monitor_loop_lag(stop: asyncio.Event, interval: float = 0.001) -> list:
+    """反复休眠 interval 秒，记录每次实际醒来比预期晚了多少秒（即其他对话会感受到的调度延迟）"""
+    lags = []
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(loop.time() - start - interval)
+    return lags
+
+
+async def benchmark_offload(messages: int = 300, concurrency: int = 16, text_length: int = 20000,
+                            workers: int = None) -> list:
+    """
+    测量 CPU 密集型护栏对事件循环的阻塞
+
+    每条长消息经过流失关键词护栏和 PII 正则护栏，同时运行一个 1 毫秒的心跳协程模拟同一进程中的其他对话。
+
+    Args:
+        messages: 消息数
+        concurrency: 批量筛查的并发上限
+        text_length: 每条消息的长度（字符）
+        workers: 进程池工作进程数，默认 min(4, CPU 核数)
+
+    Returns:
+        各模式的测试结果
+    """
+    rng = random.Random(0)
+    alphabet = "你好我想咨询一下订单的问题abcdefg 0123456789@."
+    texts = ["".join(rng.choice(alphabet) for _ in range(text_length)) for _ in range(messages)]
+    workers = workers or min(4, os.cpu_count() or 1)
+
+    with GuardrailProcessPool(workers, preload={"pii_patterns": compile_pii_patterns}) as pool:
+        pool.warm_up()
+        modes = {
+            "event_loop": (Guardrail(pii_inline, "PII"), None),
+            "thread": (Guardrail(pii_detection_tripwire, "PII", cpu_bound=True), None),
+            "process": (Guardrail(pii_detection_tripwire, "PII", cpu_bound=True), pool),
+        }
+        rows = []
+        for mode, (pii_guardrail, process_pool) in modes.items():
+            agent = Agent("Benchmark Agent", "", [Guardrail(churn_detection_tripwire, "流失检测"), pii_guardrail],
+                          process_pool=process_pool)
+            stop = asyncio.Event()
+            monitor = asyncio.ensure_future(monitor_loop_lag(stop))
+            stats = BatchStats()
+            async for _ in screen_messages(agent, texts, concurrency, False, stats):
+                pass
+            stop.set()
+            lags = sorted(await monitor)
+            rows.append(dict(stats.summary(), mode=mode,
+                             loop_lag_p50_ms=lags[len(lags) // 2] * 1000,
+                             loop_lag_p99_ms=lags[min(len(lags) - 1, int(len(lags) * 0.99))] * 1000,
+                             loop_lag_max_ms=lags[-1] * 1000))
+    return rows
+
+
+def print_offload_report(rows: list):
+    """打印进程池卸载结果表格"""
+    print(f"\n{'模式':<12}{'吞吐量(条/秒)':>14}{'循环延迟p50(ms)':>18}{'循环延迟p99(ms)':>18}{'循环延迟最大(ms)':>18}")
+    for row in rows:
+        print(f"{row['mode']:<12}{row['messages_per_second']:>14.0f}{row['loop_lag_p50_ms']:>18.2f}"
+              f"{row['loop_lag_p99_ms']:>18.2f}{row['loop_lag_max_ms']:>18.2f}")
+
+
+def print_report(rows: list):
+    """打印结果表格"""
+    print(f"\n{'场景':<8}{'护栏数':>8}{'顺序(ms)':>12}{'并发(ms)':>12}{'加速比':>8}")
+    for row in rows:
+        print(f"{row['scenario']:<8}{row['guardrails']:>8}"
+              f"{row['sequential_ms']:>12.1f}{row['concurrent_ms']:>12.1f}"
+              f"{row['sequential_ms'] / row['concurrent_ms']:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="安全护栏基准测试")
+    parser.add_argument("--cases", nargs="+", default=CASES, choices=CASES)
+    parser.add_argument("--counts", nargs="+", type=int, default=DEFAULT_COUNTS)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--keyword-counts", nargs="+", type=int, default=DEFAULT_KEYWORD_COUNTS)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--concurrency", nargs="+", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--batch-messages", type=int, default=2000)
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    results = {}
+    if "latency" in args.cases:
+        results['latency'] = asyncio.run(benchmark_latency(args.counts, args.repeats))
+        print_report(results['latency'])
+    if "keywords" in args.cases:
+        results['keywords'] = benchmark_keywords(args.keyword_counts, args.messages)
+        print_keyword_report(results['keywords'])
+    if "batch" in args.cases:
+        results['batch'] = asyncio.run(benchmark_batch(args.concurrency, args.batch_messages))
+        print_batch_report(results['batch'])
+    if "cache" in args.cases:
+        results['cache'] = asyncio.run(benchmark_cache())
+        print_cache_report(results['cache'])
+    if "schedule" in args.cases:
+        results['schedule'] = asyncio.run(benchmark_schedule())
+        print_schedule_report(results['schedule'])
+    if "offload" in args.cases:
+        results['offload'] = asyncio.run(benchmark_offload())
+        print_offload_report(results['offload'])
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,21 @@
 """
 
 import asyncio
+import functools
+import time
 from dataclasses import dataclass
+from typing import Optional
+
+try:
+    from .guardrail_pool import GuardrailProcessPool
+    from .guardrail_scheduler import AdaptiveGuardrailScheduler
+    from .keyword_automaton import KeywordAutomaton
+    from .verdict_cache import VerdictCache
+except ImportError:
+    from guardrail_pool import GuardrailProcessPool
+    from guardrail_scheduler import AdaptiveGuardrailScheduler
+    from keyword_automaton import KeywordAutomaton
+    from verdict_cache import VerdictCache
 
 @dataclass
 class GuardrailFunctionOutput:
@@ -16,37 +30,133 @@ class GuardrailFunctionOutput:
 class Guardrail:
     guardrail_function: callable
     name: str = ""
+    # 单个护栏的超时（秒），为 None 时使用智能体的 guardrail_timeout
+    timeout: Optional[float] = None
+    # 结论只取决于规范化后的输入时才可缓存（智能体配置了 verdict_cache 时生效）
+    cacheable: bool = True
+    # 预估耗时（秒），供 guardrail_scheduler 在学到实际耗时前排序
+    estimated_cost: Optional[float] = None
+    # CPU 密集型护栏：guardrail_function 为同步的模块级函数，派发到进程池执行（ctx 和 agent 传 None）
+    cpu_bound: bool = False
 
 class Agent:
-    def __init__(self, name: str, instructions: str, input_guardrails: list = None):
+    def __init__(self, name: str, instructions: str, input_guardrails: list = None,
+                 guardrail_timeout: Optional[float] = None, concurrent_guardrails: bool = True,
+                 verdict_cache: Optional[VerdictCache] = None,
+                 guardrail_scheduler: Optional[AdaptiveGuardrailScheduler] = None,
+                 process_pool: Optional[GuardrailProcessPool] = None):
+        """
+        Args:
+            name: 智能体名称
+            instructions: 智能体指令
+            input_guardrails: 输入安全护栏列表
+            guardrail_timeout: 护栏默认超时（秒），None 表示不限时
+            concurrent_guardrails: 是否并发运行护栏；为 False 时按列表顺序逐个运行
+            verdict_cache: 护栏结论缓存，按护栏和规范化后的输入复用结论，可在多个智能体间共享
+            guardrail_scheduler: 自适应调度器；设置后护栏按调度器给出的顺序逐个运行（忽略 concurrent_guardrails）
+            process_pool: 运行 cpu_bound 护栏的进程池；未设置时这类护栏在默认线程池中运行
+        """
         self.name = name
         self.instructions = instructions
         self.input_guardrails = input_guardrails or []
+        self.guardrail_timeout = guardrail_timeout
+        self.concurrent_guardrails = concurrent_guardrails
+        self.verdict_cache = verdict_cache
+        self.guardrail_scheduler = guardrail_scheduler
+        self.process_pool = process_pool
+    
+    async def _run_guardrail(self, guardrail: Guardrail, user_input: str) -> Optional[GuardrailFunctionOutput]:
+        """运行单个护栏；超时或出错时记录并视为未触发"""
+        timeout = guardrail.timeout if guardrail.timeout is not None else self.guardrail_timeout
+        
+        def call():
+            if not guardrail.cpu_bound:
+                return guardrail.guardrail_function(None, self, [user_input])
+            # CPU 密集型护栏离开事件循环线程执行；超时只是不再等待，已开始的计算会继续到结束
+            if self.process_pool is not None:
+                return self.process_pool.run(guardrail.guardrail_function, None, None, [user_input])
+            return asyncio.get_running_loop().run_in_executor(
+                None, guardrail.guardrail_function, None, None, [user_input]
+            )
+        
+        try:
+            if self.verdict_cache is not None and guardrail.cacheable:
+                key = self.verdict_cache.make_key(guardrail, user_input)
+                return await asyncio.wait_for(self.verdict_cache.get_or_compute(key, call), timeout)
+            return await asyncio.wait_for(call(), timeout)
+        except asyncio.TimeoutError:
+            print(f"安全护栏超时: {guardrail.name or guardrail.guardrail_function.__name__} ({timeout} 秒)")
+        except Exception as e:
+            print(f"安全护栏错误: {e}")
+        return None
+    
+    async def check_guardrails(self, user_input: str) -> Optional[GuardrailFunctionOutput]:
+        """
+        检查全部输入护栏
+        
+        并发模式下所有护栏同时开始，总耗时取决于最慢的护栏而不是耗时之和；
+        任一护栏触发后立即取消其余仍在运行的护栏。配置了调度器时按调度顺序逐个运行，
+        并把每个护栏的耗时和是否触发反馈给调度器。
+        
+        Returns:
+            触发的护栏结果（同时完成的多个触发结果取列表中靠前的一个），都未触发时返回 None
+        """
+        scheduler = self.guardrail_scheduler
+        if scheduler is not None or not self.concurrent_guardrails:
+            guardrails = scheduler.order(self.input_guardrails) if scheduler else self.input_guardrails
+            for guardrail in guardrails:
+                start = time.perf_counter()
+                result = await self._run_guardrail(guardrail, user_input)
+                tripped = result is not None and result.tripwire_triggered
+                if scheduler is not None:
+                    scheduler.record(guardrail, time.perf_counter() - start, tripped)
+                if tripped:
+                    return result
+            return None
+        
+        tasks = [asyncio.ensure_future(self._run_guardrail(guardrail, user_input))
+                 for guardrail in self.input_guardrails]
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in tasks:
+                    if task in done and task.result() is not None and task.result().tripwire_triggered:
+                        return task.result()
+            return None
+        finally:
+            # 已触发或调用方被取消时，取消其余护栏并等待它们退出
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
     
     async def process_input(self, user_input: str) -> str:
         print(f"[{self.name}] 处理: {user_input}")
         
         # 检查安全护栏
-        for guardrail in self.input_guardrails:
-            try:
-                result = await guardrail.guardrail_function(None, self, [user_input])
-                if result.tripwire_triggered:
-                    return f"安全护栏触发: {result.output_info}"
-            except Exception as e:
-                print(f"安全护栏错误: {e}")
+        result = await self.check_guardrails(user_input)
+        if result is not None:
+            return f"安全护栏触发: {result.output_info}"
         
         return "正常处理用户请求"
 
+@functools.lru_cache(maxsize=None)
+def get_keyword_automaton() -> KeywordAutomaton:
+    """从 keywords/ 目录的关键词文件构建自动机（进程内只构建一次）"""
+    return KeywordAutomaton.from_directory()
+
 # 流失检测安全护栏
 async def churn_detection_tripwire(ctx, agent, input_items):
-    user_input = str(input_items[0]).lower()
+    user_input = str(input_items[0])
     
-    churn_keywords = ["取消", "退订", "不满意", "cancel", "unsubscribe"]
-    is_risk = any(keyword in user_input for keyword in churn_keywords)
+    # 一次扫描得到所有类别的命中短语
+    matches = get_keyword_automaton().match_categories(user_input)
+    churn_phrases = matches.get("churn", [])
     
     return GuardrailFunctionOutput(
-        tripwire_triggered=is_risk,
-        output_info="检测到客户流失风险"
+        tripwire_triggered=bool(churn_phrases),
+        output_info=f"检测到客户流失风险: {', '.join(churn_phrases)}" if churn_phrases else "检测到客户流失风险"
     )
 
 def main():
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+CPU 密集型护栏的进程池
+护栏函数虽然是 async，实际计算仍在事件循环线程上执行，大型正则集合或本地分类器会阻塞同一进程中的所有对话。
+声明为 cpu_bound 的护栏由 Agent 派发到进程池，工作进程启动时预加载编译好的正则、模型等状态
+"""
+
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Optional
+
+# 当前进程中预加载的状态：名称 -> 对象
+_WORKER_STATE: Dict[str, object] = {}
+
+
+def get_worker_state(name: str, factory: Callable[[], object]):
+    """
+    取当前进程中的预加载状态，没有时调用 factory 构建并缓存
+
+    护栏函数通过它取得编译好的正则、模型等；在工作进程中这些状态已由进程池初始化函数构建，
+    在主进程中直接调用护栏时则在首次使用时构建。
+
+    Args:
+        name: 状态名称
+        factory: 构建状态的模块级函数（需可被 pickle，以便传给工作进程）
+    """
+    state = _WORKER_STATE.get(name)
+    if state is None:
+        state = _WORKER_STATE[name] = factory()
+    return state
+
+
+def _init_worker(preload: Dict[str, Callable[[], object]]):
+    for name, factory in preload.items():
+        get_worker_state(name, factory)
+
+
+def _ping(_) -> int:
+    # 稍作停留，使任务分散到不同的工作进程（进程池按需启动工作进程）
+    time.sleep(0.05)
+    return os.getpid()
+
+
+class GuardrailProcessPool:
+    """运行 CPU 密集型护栏的进程池"""
+
+    def __init__(self, max_workers: Optional[int] = None,
+                 preload: Optional[Dict[str, Callable[[], object]]] = None,
+                 start_method: str = "spawn"):
+        """
+        Args:
+            max_workers: 工作进程数，默认为 CPU 核数
+            preload: 工作进程启动时构建的状态 {名称: 构建函数}
+            start_method: 多进程启动方式，默认 spawn，避免 fork 继承事件循环和线程状态
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.preload = dict(preload or {})
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context(start_method),
+            initializer=_init_worker,
+            initargs=(self.preload,)
+        )
+
+    def warm_up(self) -> int:
+        """提前启动工作进程并完成预加载，返回已响应的工作进程数"""
+        pids = set(self.executor.map(_ping, range(self.max_workers * 2)))
+        return len(pids)
+
+    async def run(self, function: Callable, *args):
+        """在工作进程中调用 function(*args) 并等待结果（函数和参数需可被 pickle）"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, function, *args)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+按成本排序的自适应护栏调度
+护栏声明预估耗时，调度器在线学习各护栏的实际耗时和触发率，
+按 耗时 / 触发率 从小到大排列顺序执行的护栏，使每条消息的期望延迟最小；
+没有护栏触发时仍会运行全部护栏
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+
+@dataclass
+class GuardrailStats:
+    name: str
+    runs: int = 0
+    trips: int = 0
+    # 耗时的指数滑动平均（秒），没有预估且尚未运行时为 None
+    cost: Optional[float] = None
+
+
+class AdaptiveGuardrailScheduler:
+    """
+    自适应护栏调度器
+
+    对相互独立、触发概率为 p、耗时为 c 的护栏顺序执行时，按 c / p 从小到大排列的期望总耗时最小。
+    触发率用 Beta 先验平滑：(触发次数 + prior_trips) / (运行次数 + prior_runs)，
+    初始时各护栏触发率相同，顺序即按预估耗时从低到高。
+    """
+
+    def __init__(self, default_cost: float = 0.01, cost_smoothing: float = 0.1,
+                 prior_trips: float = 1.0, prior_runs: float = 2.0, learn: bool = True):
+        """
+        Args:
+            default_cost: 未声明 estimated_cost 且尚未运行过的护栏的假定耗时（秒）
+            cost_smoothing: 耗时滑动平均中新观测值的权重
+            prior_trips: 触发率先验的触发次数
+            prior_runs: 触发率先验的运行次数
+            learn: 是否在线学习耗时和触发率；为 False 时只按预估耗时排序
+        """
+        self.default_cost = default_cost
+        self.cost_smoothing = cost_smoothing
+        self.prior_trips = prior_trips
+        self.prior_runs = prior_runs
+        self.learn = learn
+        # 以护栏对象的 id 为键，同时保存护栏引用避免 id 被复用
+        self._stats: Dict[int, GuardrailStats] = {}
+        self._guardrails: Dict[int, object] = {}
+
+    def _get_stats(self, guardrail) -> GuardrailStats:
+        stats = self._stats.get(id(guardrail))
+        if stats is None:
+            stats = GuardrailStats(
+                name=guardrail.name or guardrail.guardrail_function.__name__,
+                cost=getattr(guardrail, "estimated_cost", None)
+            )
+            self._stats[id(guardrail)] = stats
+            self._guardrails[id(guardrail)] = guardrail
+        return stats
+
+    def trip_rate(self, guardrail) -> float:
+        stats = self._get_stats(guardrail)
+        return (stats.trips + self.prior_trips) / (stats.runs + self.prior_runs)
+
+    def expected_cost(self, guardrail) -> float:
+        stats = self._get_stats(guardrail)
+        return stats.cost if stats.cost is not None else self.default_cost
+
+    def order(self, guardrails: List) -> List:
+        """返回期望延迟最小的执行顺序（排序稳定，得分相同时保持原顺序）"""
+        return sorted(guardrails,
+                      key=lambda guardrail: self.expected_cost(guardrail) / self.trip_rate(guardrail))
+
+    def record(self, guardrail, seconds: float, tripped: bool):
+        """
+        记录一次护栏运行
+
+        Args:
+            guardrail: 护栏
+            seconds: 本次耗时（秒）
+            tripped: 是否触发
+        """
+        if not self.learn:
+            return
+        stats = self._get_stats(guardrail)
+        stats.runs += 1
+        stats.trips += int(tripped)
+        if stats.cost is None:
+            stats.cost = seconds
+        else:
+            stats.cost += self.cost_smoothing * (seconds - stats.cost)
+
+    def stats(self) -> List[dict]:
+        """各护栏的运行次数、触发次数、平滑后的触发率和耗时"""
+        return [{
+            "name": stats.name,
+            "runs": stats.runs,
+            "trips": stats.trips,
+            "trip_rate": self.trip_rate(self._guardrails[key]),
+            "cost_ms": self.expected_cost(self._guardrails[key]) * 1000,
+        } for key, stats in self._stats.items()]
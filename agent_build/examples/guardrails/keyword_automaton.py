@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+多模式关键词自动机
+基于 Aho-Corasick 算法，一次构建后对每条消息只扫描一遍即可找出全部命中的短语及其类别，
+耗时与关键词数量无关，适合上万条中英文流失、辱骂、合规短语
+"""
+
+import os
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Set, Tuple
+
+KEYWORDS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "keywords")
+
+
+@dataclass
+class KeywordMatch:
+    phrase: str
+    category: str
+    # 命中位置（小写化后文本中的下标，end 不含）
+    start: int
+    end: int
+
+
+class KeywordAutomaton:
+    """Aho-Corasick 关键词自动机，匹配不区分大小写"""
+
+    def __init__(self):
+        # 每个状态的转移表、失败链接、以该状态结尾的短语编号，以及合并失败链后的输出
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._terminal: List[Tuple[int, ...]] = [()]
+        self._output: List[Tuple[int, ...]] = [()]
+        self._phrases: List[Tuple[str, str]] = []
+        self._index: Dict[Tuple[str, str], int] = {}
+        self._built = False
+
+    def __len__(self) -> int:
+        return len(self._phrases)
+
+    @property
+    def categories(self) -> Set[str]:
+        return {category for _, category in self._phrases}
+
+    def add(self, phrase: str, category: str = "default"):
+        """
+        添加一个短语，添加后需重新 build()
+
+        Args:
+            phrase: 关键词短语
+            category: 短语所属类别
+        """
+        phrase = phrase.strip().lower()
+        if not phrase or (phrase, category) in self._index:
+            return
+
+        pattern_id = len(self._phrases)
+        self._index[(phrase, category)] = pattern_id
+        self._phrases.append((phrase, category))
+
+        state = 0
+        for char in phrase:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._terminal.append(())
+            state = next_state
+        self._terminal[state] += (pattern_id,)
+        self._built = False
+
+    def add_all(self, phrases: Iterable[str], category: str = "default"):
+        """批量添加同一类别的短语"""
+        for phrase in phrases:
+            self.add(phrase, category)
+
+    def build(self) -> "KeywordAutomaton":
+        """按广度优先计算失败链接，并把失败链上的输出合并到每个状态"""
+        self._output = list(self._terminal)
+        queue = deque()
+        for state in self._goto[0].values():
+            self._fail[state] = 0
+            queue.append(state)
+
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(char, 0)
+                self._fail[next_state] = fail
+                self._output[next_state] += self._output[fail]
+
+        self._built = True
+        return self
+
+    def find_all(self, text: str) -> List[KeywordMatch]:
+        """
+        单次扫描找出文本中命中的全部短语（含相互重叠的短语）
+
+        Args:
+            text: 待检查的文本
+
+        Returns:
+            按结束位置排序的命中列表
+        """
+        if not self._built:
+            self.build()
+
+        goto, fail, output, phrases = self._goto, self._fail, self._output, self._phrases
+        matches = []
+        state = 0
+        for position, char in enumerate(text.lower()):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for pattern_id in output[state]:
+                phrase, category = phrases[pattern_id]
+                matches.append(KeywordMatch(phrase, category, position + 1 - len(phrase), position + 1))
+        return matches
+
+    def match_categories(self, text: str) -> Dict[str, List[str]]:
+        """返回 {类别: 命中的短语列表}，同一短语只计一次"""
+        result: Dict[str, List[str]] = {}
+        for match in self.find_all(text):
+            phrases = result.setdefault(match.category, [])
+            if match.phrase not in phrases:
+                phrases.append(match.phrase)
+        return result
+
+    @classmethod
+    def from_files(cls, paths: Iterable[str]) -> "KeywordAutomaton":
+        """
+        从关键词文件构建自动机
+
+        每个文件一行一个短语，# 开头的行为注释；类别取文件名（不含扩展名）。
+
+        Args:
+            paths: 关键词文件路径
+
+        Returns:
+            构建好的自动机
+        """
+        automaton = cls()
+        for path in paths:
+            category = os.path.splitext(os.path.basename(path))[0]
+            automaton.add_all(load_keyword_file(path), category)
+        return automaton.build()
+
+    @classmethod
+    def from_directory(cls, directory: str = KEYWORDS_DIR) -> "KeywordAutomaton":
+        """从目录下全部 .txt 关键词文件构建自动机"""
+        paths = sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                       if name.endswith(".txt"))
+        return cls.from_files(paths)
+
+
+def load_keyword_file(path: str) -> List[str]:
+    """读取关键词文件，忽略空行和注释"""
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+PII 检测护栏
+用一组正则检测手机号、身份证号、银行卡号和邮箱等个人身份信息，是 CPU 密集型护栏的示例：
+同步函数，可通过 Guardrail(pii_detection_tripwire, cpu_bound=True) 派发到进程池
+"""
+
+import re
+from typing import Dict
+
+try:
+    from .churn_detection import GuardrailFunctionOutput
+    from .guardrail_pool import get_worker_state
+except ImportError:
+    from churn_detection import GuardrailFunctionOutput
+    from guardrail_pool import get_worker_state
+
+PII_PATTERNS = {
+    "手机号": r"(?<!\d)1[3-9]\d{9}(?!\d)",
+    "身份证号": r"(?<!\d)\d{6}(?:19|20)\d{2}(?:0[1-9]|1[0-2])(?:0[1-9]|[12]\d|3[01])\d{3}[\dXx](?!\d)",
+    "银行卡号": r"(?<!\d)(?:62|4\d|5[1-5])\d{14,17}(?!\d)",
+    "邮箱": r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}",
+    "IP地址": r"(?<!\d)(?:(?:25[0-5]|2[0-4]\d|1?\d?\d)\.){3}(?:25[0-5]|2[0-4]\d|1?\d?\d)(?!\d)",
+}
+
+
+def compile_pii_patterns() -> Dict[str, "re.Pattern"]:
+    """编译 PII 正则（在工作进程启动时预加载）"""
+    return {name: re.compile(pattern) for name, pattern in PII_PATTERNS.items()}
+
+
+def find_pii(text: str) -> Dict[str, int]:
+    """返回 {PII 类型: 命中次数}"""
+    patterns = get_worker_state("pii_patterns", compile_pii_patterns)
+    found = {}
+    for name, pattern in patterns.items():
+        count = sum(1 for _ in pattern.finditer(text))
+        if count:
+            found[name] = count
+    return found
+
+
+def pii_detection_tripwire(ctx, agent, input_items):
+    """同步的 PII 检测护栏，在进程池中调用时 ctx 和 agent 为 None"""
+    found = find_pii(str(input_items[0]))
+    return GuardrailFunctionOutput(
+        tripwire_triggered=bool(found),
+        output_info="检测到个人信息: " + ", ".join(f"{name}×{count}" for name, count in found.items())
+        if found else "未检测到个人信息"
+    )
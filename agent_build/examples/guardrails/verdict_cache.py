@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+护栏结论缓存
+按护栏和规范化后的输入（大小写、空白、全角/半角）缓存护栏结论，LRU + TTL 淘汰，
+同一输入并发到达时只调用一次护栏，适合开销大的模型护栏
+"""
+
+import asyncio
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+def normalize_input(text: str) -> str:
+    """
+    规范化护栏输入
+
+    NFKC 把全角字母、数字、标点折叠为半角，casefold 忽略大小写，连续空白合并为一个空格。
+    """
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+class VerdictCache:
+    """护栏结论的 LRU + TTL 缓存（在同一事件循环内并发安全）"""
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: Optional[float] = 3600,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            max_entries: 最多缓存的结论数，超出时淘汰最久未使用的
+            ttl_seconds: 结论的有效期（秒），None 表示不过期
+            clock: 计时函数
+        """
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+
+        self._entries: "OrderedDict[Hashable, Tuple[Optional[float], object]]" = OrderedDict()
+        # 正在计算的键 -> 计算任务，同一输入的并发请求共享一次护栏调用
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def make_key(guardrail, text: str) -> Hashable:
+        """由护栏身份（函数的模块、限定名和护栏名称）和规范化输入组成缓存键"""
+        function = guardrail.guardrail_function
+        identity = (getattr(function, "__module__", None),
+                    getattr(function, "__qualname__", repr(function)),
+                    guardrail.name)
+        return identity + (normalize_input(text),)
+
+    def get(self, key: Hashable):
+        """返回未过期的缓存结论，没有时返回 None（不计入命中率）"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and self.clock() >= expires_at:
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value):
+        """写入结论，超出容量时淘汰最久未使用的条目"""
+        expires_at = self.clock() + self.ttl_seconds if self.ttl_seconds is not None else None
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_compute(self, key: Hashable, compute: Callable[[], Awaitable]):
+        """
+        命中缓存时直接返回，否则调用 compute 计算并缓存
+
+        同一键已在计算中时等待同一个任务而不重复调用护栏。计算在独立任务中进行，
+        某个调用方被取消（如其他护栏先触发、超时）时计算仍会完成并写入缓存，不影响其他等待者；
+        计算出错时不缓存，异常传给所有等待者。
+
+        Args:
+            key: 缓存键（见 make_key）
+            compute: 返回护栏结论的协程函数
+
+        Returns:
+            护栏结论
+        """
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.shared += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(compute())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._on_computed(key, done))
+
+        return await asyncio.shield(task)
+
+    def _on_computed(self, key: Hashable, task: asyncio.Future):
+        self._inflight.pop(key, None)
+        if not task.cancelled() and task.exception() is None and task.result() is not None:
+            self.put(key, task.result())
+
+    def clear(self):
+        self._entries.clear()
+
+    @property
+    def hit_rate(self) -> float:
+        """命中率：直接命中或共享在途计算的请求占全部请求的比例"""
+        total = self.hits + self.shared + self.misses
+        return (self.hits + self.shared) / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "shared": self.shared,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": self.hit_rate,
+        }
@@ -2,5 +2,6 @@
 多智能体系统示例包
 
 包含：
-- translation_manager.py: 翻译管理器示例
+- translation_manager.py: 翻译管理器示例（并发调用翻译工具、并发上限与单工具超时）
+- benchmark_translation.py: 翻译扇出基准测试
 """ 
\ No newline at end of file
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+翻译扇出基准测试
+用模拟耗时的翻译智能体测量管理器在不同语言数量下，逐个调用、限制并发和不限并发的请求延迟
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import time
+
+try:
+    from .translation_manager import Agent, ManagerAgent
+except ImportError:
+    from translation_manager import Agent, ManagerAgent
+
+DEFAULT_COUNTS = [1, 2, 5, 10, 20]
+# 模式名称 -> 并发上限（None 表示不限）
+MODES = {"sequential": 1, "cap_4": 4, "unbounded": None}
+
+
+class SlowTranslator(Agent):
+    """模拟远程调用耗时的翻译智能体"""
+
+    def __init__(self, name: str, latency: float):
+        super().__init__(name, f"You translate text to {name}.")
+        self.latency = latency
+
+    async def translate(self, text: str, target_language: str) -> str:
+        await asyncio.sleep(self.latency)
+        return await super().translate(text, target_language)
+
+
+def make_manager(count: int, latency: float, jitter: float, max_concurrency, tool_timeout: float = None,
+                 seed: int = 0) -> tuple:
+    """构造带 count 个模拟翻译工具的管理器，返回 (管理器, 语言列表)"""
+    rng = random.Random(seed)
+    languages = [f"Language{i:02d}" for i in range(count)]
+    tools = [SlowTranslator(language, latency + rng.uniform(0, jitter)).as_tool(
+        tool_name=f"translate_to_{language.lower()}",
+        tool_description=f"Translate the user's message to {language}"
+    ) for language in languages]
+    manager = ManagerAgent("Translation Manager", "", tools,
+                           max_concurrency=max_concurrency, tool_timeout=tool_timeout)
+    return manager, languages
+
+
+async def benchmark_translation(counts: list, latency: float = 0.1, jitter: float = 0.05,
+                                repeats: int = 3) -> list:
+    """
+    测量一次翻译请求的延迟
+
+    Args:
+        counts: 目标语言数量列表
+        latency: 每个翻译工具的基础耗时（秒）
+        jitter: 每个工具额外的随机耗时上限（秒）
+        repeats: 每组重复次数
+
+    Returns:
+        各组测试结果
+    """
+    rows = []
+    for count in counts:
+        row = {'languages': count}
+        for mode, max_concurrency in MODES.items():
+            manager, languages = make_manager(count, latency, jitter, max_concurrency)
+            start = time.perf_counter()
+            for _ in range(repeats):
+                results = await manager.translate_all("hello", languages)
+            row[f'{mode}_ms'] = (time.perf_counter() - start) * 1000 / repeats
+            # 结果顺序与请求的语言顺序一致
+            row['ordered'] = row.get('ordered', True) and \
+                [result.split(":")[0] for result in results] == languages
+        rows.append(row)
+    return rows
+
+
+def print_report(rows: list):
+    """打印结果表格"""
+    print(f"\n{'语言数':>8}" + "".join(f"{mode + '(ms)':>16}" for mode in MODES) + f"{'顺序稳定':>10}")
+    for row in rows:
+        print(f"{row['languages']:>8}" + "".join(f"{row[f'{mode}_ms']:>16.1f}" for mode in MODES)
+              + f"{'是' if row['ordered'] else '否':>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="翻译扇出基准测试")
+    parser.add_argument("--counts", nargs="+", type=int, default=DEFAULT_COUNTS)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    # 翻译智能体每次调用都会打印日志，测试期间屏蔽
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        rows = asyncio.run(benchmark_translation(args.counts, args.latency, args.jitter, args.repeats))
+    print_report(rows)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,7 @@
 """
 
 import asyncio
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 # 模拟智能体框架
 class Agent:
@@ -16,12 +16,13 @@ class Agent:
         self.instructions = instructions
         self.tools = tools or []
     
-    def as_tool(self, tool_name: str, tool_description: str):
-        """将智能体转换为工具"""
+    def as_tool(self, tool_name: str, tool_description: str, timeout: Optional[float] = None):
+        """将智能体转换为工具，timeout 为该工具单次调用的超时（秒），None 时使用管理器的默认值"""
         return {
             "name": tool_name,
             "description": tool_description,
-            "agent": self
+            "agent": self,
+            "timeout": timeout
         }
     
     async def translate(self, text: str, target_language: str) -> str:
@@ -61,10 +62,23 @@ class Agent:
 class ManagerAgent:
     """管理器智能体"""
     
-    def __init__(self, name: str, instructions: str, tools: List[Dict]):
+    def __init__(self, name: str, instructions: str, tools: List[Dict],
+                 max_concurrency: Optional[int] = None, tool_timeout: Optional[float] = None):
+        """
+        Args:
+            name: 智能体名称
+            instructions: 智能体指令
+            tools: 工具列表（Agent.as_tool 的返回值）
+            max_concurrency: 同时调用的翻译工具数上限，None 表示不限，1 即逐个调用
+            tool_timeout: 工具调用的默认超时（秒），None 表示不限时
+        """
+        if max_concurrency is not None and max_concurrency <= 0:
+            raise ValueError(f"max_concurrency 必须为正整数或 None，实际为 {max_concurrency}")
         self.name = name
         self.instructions = instructions
         self.tools = tools
+        self.max_concurrency = max_concurrency
+        self.tool_timeout = tool_timeout
     
     async def process_request(self, user_input: str) -> List[str]:
         """处理用户请求"""
@@ -78,19 +92,52 @@ class ManagerAgent:
             text, languages = self._parse_translation_request(user_input)
             
             if text and languages:
-                for language in languages:
-                    # 找到对应的翻译工具
-                    tool = self._find_translation_tool(language)
-                    if tool:
-                        translation = await tool["agent"].translate(text, language)
-                        results.append(f"{language}: {translation}")
-                    else:
-                        results.append(f"不支持翻译到 {language}")
+                results.extend(await self.translate_all(text, languages))
             else:
                 results.append("请提供要翻译的文本和目标语言")
         
         return results
     
+    async def translate_all(self, text: str, languages: List[str]) -> List[str]:
+        """
+        并发调用各语言的翻译工具
+        
+        同时进行的调用数不超过 max_concurrency，单个工具超时或出错不影响其他语言；
+        结果顺序与 languages 一致，与完成先后无关。
+        
+        Args:
+            text: 要翻译的文本
+            languages: 目标语言列表
+            
+        Returns:
+            每种语言一条结果
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency) if self.max_concurrency is not None else None
+        return list(await asyncio.gather(
+            *(self._translate_one(text, language, semaphore) for language in languages)
+        ))
+    
+    async def _translate_one(self, text: str, language: str,
+                             semaphore: Optional[asyncio.Semaphore]) -> str:
+        """调用单个语言的翻译工具"""
+        # 找到对应的翻译工具
+        tool = self._find_translation_tool(language)
+        if not tool:
+            return f"不支持翻译到 {language}"
+        
+        timeout = tool.get("timeout") if tool.get("timeout") is not None else self.tool_timeout
+        try:
+            if semaphore is None:
+                translation = await asyncio.wait_for(tool["agent"].translate(text, language), timeout)
+            else:
+                async with semaphore:
+                    translation = await asyncio.wait_for(tool["agent"].translate(text, language), timeout)
+        except asyncio.TimeoutError:
+            return f"{language}: 翻译超时 ({timeout} 秒)"
+        except Exception as e:
+            return f"{language}: 翻译失败 ({e})"
+        return f"{language}: {translation}"
+    
     def _parse_translation_request(self, user_input: str) -> tuple:
         """解析翻译请求"""
         # 简化的解析逻辑
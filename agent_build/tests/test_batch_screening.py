@@ -0,0 +1,77 @@
+"""批量筛查测试：按序产出、错误结论不中断整批"""
+
+import asyncio
+import json
+
+from examples.guardrails.batch_screening import BatchStats, read_messages, screen_file, screen_messages
+from examples.guardrails.churn_detection import Agent, Guardrail, churn_detection_tripwire
+
+
+class FlakyAgent(Agent):
+    """遇到含 boom 的消息时护栏检查抛出异常"""
+
+    async def check_guardrails(self, user_input):
+        if "boom" in user_input:
+            raise RuntimeError("guardrail crashed")
+        return await super().check_guardrails(user_input)
+
+
+def make_agent(agent_class=Agent):
+    return agent_class("a", "", [Guardrail(churn_detection_tripwire, "流失检测")])
+
+
+async def collect(agent, messages, **options):
+    return [verdict async for verdict in screen_messages(agent, messages, **options)]
+
+
+def test_ordered_output_and_trips():
+    messages = ["你好", "我想取消订阅", "谢谢", "please unsubscribe me"] * 5
+    verdicts = asyncio.run(collect(make_agent(), messages, concurrency=3))
+    assert [verdict.index for verdict in verdicts] == list(range(len(messages)))
+    assert [verdict.tripped for verdict in verdicts] == [False, True, False, True] * 5
+
+
+def test_errors_become_verdicts_without_aborting_batch():
+    messages = ["hi", {"id": "x"}, "我要取消", {"id": 7, "text": None}, "boom", 42, "fine"]
+    for ordered in (True, False):
+        stats = BatchStats()
+        verdicts = asyncio.run(collect(make_agent(FlakyAgent), messages, concurrency=2,
+                                       ordered=ordered, stats=stats))
+        by_index = {verdict.index: verdict for verdict in verdicts}
+        assert sorted(by_index) == list(range(len(messages)))
+        assert by_index[1].error == "第 2 条消息缺少 text 字段"
+        assert by_index[1].message_id == "x"
+        assert by_index[3].error == "第 4 条消息的 text 字段不是字符串"
+        assert by_index[4].error.startswith("护栏检查出错")
+        assert by_index[5].error == "第 6 条消息应为字符串或字典，实际为 int"
+        assert by_index[2].tripped and not by_index[2].error
+        assert not by_index[6].error
+        assert stats.summary()["errors"] == 4
+
+
+def test_read_messages_reports_malformed_lines(tmp_path):
+    path = tmp_path / "inbox.jsonl"
+    path.write_text('{"text": "cancel"}\nnot json\n{"id": 3}\n[1]\n{"text": 5}\n\n{"id": "m", "text": "ok"}\n',
+                    encoding="utf-8")
+    messages = list(read_messages(str(path)))
+    assert messages == [
+        {"id": 1, "text": "cancel"},
+        {"id": 2, "error": "第 2 行不是合法的 JSON"},
+        {"id": 3, "error": "第 3 行缺少 text 字段"},
+        {"id": 4, "error": "第 4 行不是 JSON 对象"},
+        {"id": 5, "error": "第 5 行的 text 字段不是字符串"},
+        {"id": "m", "text": "ok"},
+    ]
+
+
+def test_screen_file_writes_error_records(tmp_path):
+    source = tmp_path / "inbox.jsonl"
+    source.write_text('{"text": "cancel"}\n{"id": 9}\n{"text": "hello"}\n', encoding="utf-8")
+    output = tmp_path / "verdicts.jsonl"
+    stats = asyncio.run(screen_file(make_agent(), str(source), str(output), only_tripped=True))
+
+    records = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+    assert [record["i"] for record in records] == [0, 1]
+    assert records[0]["t"] == 1
+    assert records[1] == dict(records[1], id=9, t=0, error="第 2 行缺少 text 字段")
+    assert stats.summary()["messages"] == 3 and stats.summary()["errors"] == 1
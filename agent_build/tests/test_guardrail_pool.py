@@ -0,0 +1,50 @@
+"""GuardrailProcessPool 测试：CPU 密集型护栏派发到工作进程"""
+
+import asyncio
+import os
+
+from examples.guardrails.churn_detection import Agent, Guardrail
+from examples.guardrails.guardrail_pool import GuardrailProcessPool, get_worker_state
+from examples.guardrails.pii_detection import compile_pii_patterns, find_pii, pii_detection_tripwire
+
+
+def test_get_worker_state_builds_once():
+    built = []
+
+    def factory():
+        built.append(1)
+        return object()
+
+    first = get_worker_state("test_state", factory)
+    assert get_worker_state("test_state", factory) is first
+    assert len(built) == 1
+
+
+def test_find_pii():
+    found = find_pii("手机 13812345678，邮箱 a.b@example.com")
+    assert found == {"手机号": 1, "邮箱": 1}
+    assert find_pii("没有个人信息") == {}
+
+
+def test_cpu_bound_guardrail_runs_in_worker_process():
+    with GuardrailProcessPool(max_workers=1, preload={"pii_patterns": compile_pii_patterns}) as pool:
+        assert pool.warm_up() == 1
+        # 护栏在工作进程中执行
+        assert asyncio.run(pool.run(os.getpid)) != os.getpid()
+
+        agent = Agent("a", "", [Guardrail(pii_detection_tripwire, "PII", cpu_bound=True)],
+                      process_pool=pool)
+
+        async def run():
+            return await asyncio.gather(agent.check_guardrails("我的手机号是 13812345678"),
+                                        agent.check_guardrails("你好"))
+
+        tripped, clean = asyncio.run(run())
+    assert tripped is not None and "手机号" in tripped.output_info
+    assert clean is None
+
+
+def test_cpu_bound_guardrail_without_pool_uses_thread():
+    agent = Agent("a", "", [Guardrail(pii_detection_tripwire, "PII", cpu_bound=True)])
+    result = asyncio.run(agent.check_guardrails("联系 a@example.com"))
+    assert result is not None and "邮箱" in result.output_info
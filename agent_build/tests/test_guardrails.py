@@ -0,0 +1,141 @@
+"""Agent 护栏执行测试：并发执行、触发短路、超时、出错和自适应调度"""
+
+import asyncio
+
+from examples.guardrails.churn_detection import Agent, Guardrail, GuardrailFunctionOutput
+from examples.guardrails.guardrail_scheduler import AdaptiveGuardrailScheduler
+
+
+def make_guardrail(name, delay=0.0, tripped=False, events=None, error=None, **options):
+    """构造延迟 delay 秒后给出结论的护栏，events 记录 start / done / cancelled"""
+    async def guardrail_function(ctx, agent, input_items):
+        if events is not None:
+            events.append((name, "start"))
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            if events is not None:
+                events.append((name, "cancelled"))
+            raise
+        if error is not None:
+            raise error
+        if events is not None:
+            events.append((name, "done"))
+        return GuardrailFunctionOutput(tripwire_triggered=tripped, output_info=name)
+
+    guardrail_function.__qualname__ = f"guardrail_{name}"
+    return Guardrail(guardrail_function, name, **options)
+
+
+def test_tripping_guardrail_cancels_slower_ones():
+    events = []
+    agent = Agent("a", "", [
+        make_guardrail("slow", delay=5, events=events),
+        make_guardrail("fast", delay=0.01, tripped=True, events=events),
+    ])
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        result = await agent.check_guardrails("hello")
+        return result, loop.time() - start
+
+    result, seconds = asyncio.run(run())
+    assert result.output_info == "fast"
+    assert seconds < 1
+    assert ("slow", "cancelled") in events
+    assert ("slow", "done") not in events
+
+
+def test_concurrent_guardrails_overlap():
+    agent = Agent("a", "", [make_guardrail(f"g{i}", delay=0.2) for i in range(5)])
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        result = await agent.check_guardrails("hello")
+        return result, loop.time() - start
+
+    result, seconds = asyncio.run(run())
+    assert result is None
+    # 并发时总耗时接近最慢的护栏，而不是五个护栏之和
+    assert seconds < 0.6
+
+
+def test_timeout_returns_no_verdict_instead_of_aborting():
+    agent = Agent("a", "", [
+        make_guardrail("hang", delay=5, tripped=True, timeout=0.05),
+        make_guardrail("ok", delay=0.01),
+    ])
+    assert asyncio.run(agent.check_guardrails("hello")) is None
+
+    # 超时的护栏不影响其他护栏触发
+    agent = Agent("a", "", [
+        make_guardrail("hang", delay=5, tripped=True),
+        make_guardrail("trip", delay=0.1, tripped=True),
+    ], guardrail_timeout=0.05)
+    assert asyncio.run(agent.check_guardrails("hello")) is None
+
+    agent = Agent("a", "", [
+        make_guardrail("hang", delay=5, tripped=True, timeout=0.05),
+        make_guardrail("trip", delay=0.1, tripped=True),
+    ])
+    assert asyncio.run(agent.check_guardrails("hello")).output_info == "trip"
+
+
+def test_failing_guardrail_is_treated_as_not_tripped():
+    agent = Agent("a", "", [
+        make_guardrail("broken", error=RuntimeError("boom")),
+        make_guardrail("trip", delay=0.01, tripped=True),
+    ])
+    assert asyncio.run(agent.check_guardrails("hello")).output_info == "trip"
+
+
+def test_sequential_mode_stops_at_first_trip():
+    events = []
+    agent = Agent("a", "", [
+        make_guardrail("first", events=events),
+        make_guardrail("second", tripped=True, events=events),
+        make_guardrail("third", events=events),
+    ], concurrent_guardrails=False)
+    assert asyncio.run(agent.check_guardrails("hello")).output_info == "second"
+    assert [name for name, event in events if event == "start"] == ["first", "second"]
+
+
+def test_scheduler_orders_by_estimated_cost_then_learns_trip_rate():
+    cheap = make_guardrail("cheap", estimated_cost=0.001)
+    expensive = make_guardrail("expensive", estimated_cost=0.1)
+    scheduler = AdaptiveGuardrailScheduler()
+    assert scheduler.order([expensive, cheap]) == [cheap, expensive]
+
+    # 昂贵但几乎总是触发的护栏应排到很少触发的便宜护栏前面
+    never = make_guardrail("never", estimated_cost=0.01)
+    always = make_guardrail("always", estimated_cost=0.02)
+    for _ in range(50):
+        scheduler.record(never, 0.01, tripped=False)
+        scheduler.record(always, 0.02, tripped=True)
+    assert scheduler.order([never, always]) == [always, never]
+
+
+def test_scheduler_without_learning_keeps_estimated_order():
+    cheap = make_guardrail("cheap", estimated_cost=0.001)
+    expensive = make_guardrail("expensive", estimated_cost=0.1)
+    scheduler = AdaptiveGuardrailScheduler(learn=False)
+    for _ in range(20):
+        scheduler.record(expensive, 0.1, tripped=True)
+    assert scheduler.order([expensive, cheap]) == [cheap, expensive]
+
+
+def test_agent_feeds_scheduler_and_runs_in_its_order():
+    events = []
+    slow = make_guardrail("slow", delay=0.02, events=events, estimated_cost=0.5)
+    fast = make_guardrail("fast", events=events, tripped=True, estimated_cost=0.001)
+    scheduler = AdaptiveGuardrailScheduler()
+    agent = Agent("a", "", [slow, fast], guardrail_scheduler=scheduler)
+
+    assert asyncio.run(agent.check_guardrails("hello")).output_info == "fast"
+    # 便宜的护栏先运行并触发，昂贵的护栏没有运行
+    assert [name for name, event in events if event == "start"] == ["fast"]
+    stats = {row["name"]: row for row in scheduler.stats()}
+    assert stats["fast"]["runs"] == 1 and stats["fast"]["trips"] == 1
+    assert stats["slow"]["runs"] == 0
@@ -0,0 +1,106 @@
+"""KeywordAutomaton 多模式关键词匹配测试"""
+
+import asyncio
+import os
+import random
+
+from examples.guardrails.churn_detection import churn_detection_tripwire
+from examples.guardrails.keyword_automaton import KEYWORDS_DIR, KeywordAutomaton, load_keyword_file
+
+
+def linear_scan(keywords, text):
+    """原护栏的写法：逐个关键词做子串查找，这里找出每个关键词的全部出现位置"""
+    text = text.lower()
+    found = set()
+    for keyword in keywords:
+        phrase = keyword.lower()
+        start = text.find(phrase)
+        while start != -1:
+            found.add((phrase, start, start + len(phrase)))
+            start = text.find(phrase, start + 1)
+    return found
+
+
+def build(keywords, category="default"):
+    automaton = KeywordAutomaton()
+    automaton.add_all(keywords, category)
+    return automaton.build()
+
+
+def test_overlapping_matches():
+    automaton = build(["he", "she", "his", "hers"])
+    matches = {(m.phrase, m.start, m.end) for m in automaton.find_all("ushers")}
+    assert matches == {("she", 1, 4), ("he", 2, 4), ("hers", 2, 6)}
+
+
+def test_overlapping_cjk_matches():
+    automaton = build(["不满", "满意", "不满意"])
+    matches = automaton.find_all("我很不满意")
+    assert {(m.phrase, m.start, m.end) for m in matches} == {
+        ("不满", 2, 4), ("满意", 3, 5), ("不满意", 2, 5)
+    }
+    # 按结束位置排序
+    assert [m.end for m in matches] == sorted(m.end for m in matches)
+
+
+def test_repeated_occurrences():
+    automaton = build(["aa"])
+    assert [(m.start, m.end) for m in automaton.find_all("aaaa")] == [(0, 2), (1, 3), (2, 4)]
+
+
+def test_case_folding_ascii_and_cjk():
+    automaton = build(["Cancel", "unsubscribe", "取消"], "churn")
+    matches = automaton.match_categories("我要取消 CANCEL my plan, please UnSubscribe")
+    assert matches == {"churn": ["取消", "cancel", "unsubscribe"]}
+    # 大写字母与中文相邻时同样能匹配
+    assert automaton.match_categories("取消Cancel") == {"churn": ["取消", "cancel"]}
+    assert automaton.match_categories("你好 hello") == {}
+
+
+def test_match_categories_deduplicates_phrases():
+    automaton = KeywordAutomaton()
+    automaton.add("取消", "churn")
+    automaton.add("律师", "compliance")
+    automaton.build()
+    assert automaton.match_categories("取消，取消，我要找律师") == {
+        "churn": ["取消"], "compliance": ["律师"]
+    }
+
+
+def test_rebuild_does_not_duplicate_outputs():
+    automaton = build(["he", "she"])
+    before = [(m.phrase, m.start) for m in automaton.find_all("she")]
+    automaton.add("e")
+    automaton.build()
+    automaton.build()
+    after = [(m.phrase, m.start) for m in automaton.find_all("she")]
+    assert sorted(after) == sorted(before + [("e", 2)])
+
+
+def test_agrees_with_linear_scan():
+    rng = random.Random(0)
+    # 小字母表使短语大量重叠、互为前后缀
+    alphabet = "ab取消Cc"
+    for _ in range(200):
+        keywords = {"".join(rng.choice(alphabet) for _ in range(rng.randint(1, 4)))
+                    for _ in range(rng.randint(1, 12))}
+        text = "".join(rng.choice(alphabet + " ") for _ in range(rng.randint(0, 40)))
+        automaton = build(keywords)
+        found = {(m.phrase, m.start, m.end) for m in automaton.find_all(text)}
+        assert found == linear_scan(keywords, text)
+
+
+def test_keyword_files():
+    automaton = KeywordAutomaton.from_directory()
+    assert {"churn", "abuse", "compliance"} <= automaton.categories
+    churn = load_keyword_file(os.path.join(KEYWORDS_DIR, "churn.txt"))
+    assert churn == ["取消", "退订", "不满意", "cancel", "unsubscribe"]
+
+
+def test_churn_tripwire():
+    result = asyncio.run(churn_detection_tripwire(None, None, ["对服务不满意，想 Unsubscribe"]))
+    assert result.tripwire_triggered
+    assert "不满意" in result.output_info and "unsubscribe" in result.output_info
+
+    result = asyncio.run(churn_detection_tripwire(None, None, ["谢谢你的帮助"]))
+    assert not result.tripwire_triggered
@@ -0,0 +1,127 @@
+"""VerdictCache 测试：输入规范化、TTL、LRU 淘汰和并发请求合并"""
+
+import asyncio
+
+from examples.guardrails.churn_detection import Agent, Guardrail, GuardrailFunctionOutput
+from examples.guardrails.verdict_cache import VerdictCache, normalize_input
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def counting_guardrail(calls, delay=0.0, name="model"):
+    async def guardrail_function(ctx, agent, input_items):
+        calls.append(input_items[0])
+        await asyncio.sleep(delay)
+        return GuardrailFunctionOutput(tripwire_triggered=False, output_info="ok")
+    return Guardrail(guardrail_function, name)
+
+
+def test_normalize_input_folds_case_width_and_whitespace():
+    assert normalize_input("  Cancel\tMY\n  Plan ") == "cancel my plan"
+    assert normalize_input("ＣＡＮＣＥＬ　１２３") == "cancel 123"
+    assert normalize_input("我想取消") == "我想取消"
+
+
+def test_equivalent_inputs_share_one_verdict():
+    calls = []
+    guardrail = counting_guardrail(calls)
+    agent = Agent("a", "", [guardrail], verdict_cache=VerdictCache())
+
+    async def run():
+        for text in ("Cancel my plan", "cancel  MY plan", "ＣＡＮＣＥＬ my plan"):
+            await agent.check_guardrails(text)
+
+    asyncio.run(run())
+    assert len(calls) == 1
+    stats = agent.verdict_cache.stats()
+    assert stats["misses"] == 1 and stats["hits"] == 2
+
+
+def test_different_guardrails_do_not_share_entries():
+    cache = VerdictCache()
+    first = counting_guardrail([], name="first")
+    second = counting_guardrail([], name="second")
+    assert cache.make_key(first, "hello") != cache.make_key(second, "hello")
+
+
+def test_ttl_expiry():
+    clock = FakeClock()
+    cache = VerdictCache(ttl_seconds=10, clock=clock)
+    cache.put("k", "verdict")
+    clock.now = 9.9
+    assert cache.get("k") == "verdict"
+    clock.now = 10.0
+    assert cache.get("k") is None
+    assert cache.expirations == 1 and len(cache) == 0
+
+
+def test_lru_eviction():
+    cache = VerdictCache(max_entries=2, ttl_seconds=None)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.evictions == 1
+
+
+def test_concurrent_requests_share_inflight_computation():
+    calls = []
+    guardrail = counting_guardrail(calls, delay=0.05)
+    cache = VerdictCache()
+    agent = Agent("a", "", [guardrail], verdict_cache=cache)
+
+    async def run():
+        await asyncio.gather(*(agent.check_guardrails("Hello") for _ in range(10)))
+
+    asyncio.run(run())
+    assert len(calls) == 1
+    assert cache.misses == 1 and cache.shared == 9
+
+
+def test_cancelled_caller_still_caches_result():
+    calls = []
+    cache = VerdictCache()
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "verdict"
+
+    async def run():
+        waiter = asyncio.ensure_future(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.sleep(0.1)
+        return await cache.get_or_compute("k", compute)
+
+    assert asyncio.run(run()) == "verdict"
+    assert len(calls) == 1 and cache.hits == 1
+
+
+def test_errors_are_not_cached():
+    cache = VerdictCache()
+    attempts = []
+
+    async def compute():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("boom")
+        return "verdict"
+
+    async def run():
+        try:
+            await cache.get_or_compute("k", compute)
+        except RuntimeError:
+            pass
+        return await cache.get_or_compute("k", compute)
+
+    assert asyncio.run(run()) == "verdict"
+    assert len(attempts) == 2